@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+''' benchmark the image ingest pipeline (process_image, save_image, save_thumbnail and archive ingest) over a deterministic corpus of test images '''
+# pylint: disable=invalid-name
+
+import argparse
+from datetime import datetime
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Optional
+import uuid
+import zipfile
+
+from PIL import Image, ImageDraw, __version__ as pillow_version
+
+# (format, file extension, save options): roughly what uploads look like
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 90}),
+    'png': ('png', {}),
+    'webp': ('webp', {'quality': 85}),
+    'gif': ('gif', {'save_all': True, 'duration': 80, 'loop': 0}),
+}
+OPERATIONS = ('process_image', 'save_image', 'save_thumbnail', 'archive_ingest')
+
+def parse_size(size: str) -> tuple[int, int]:
+    ''' Parse a WIDTHxHEIGHT size '''
+
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+def render_frame(width: int, height: int, rng: random.Random) -> Image.Image:
+    ''' Render a photo-like frame: smooth gradients, hard-edged shapes and a little grain, so that codecs have realistic work to do '''
+
+    gradient = Image.linear_gradient('L')
+    base = Image.merge('RGB', (
+        gradient.resize((width, height)),
+        gradient.rotate(90).resize((width, height)),
+        Image.radial_gradient('L').resize((width, height)),
+    ))
+
+    draw = ImageDraw.Draw(base)
+    for _ in range(200):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randint(4, max(width // 6, 5)), rng.randint(4, max(height // 6, 5))
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if rng.random() < 0.5:
+            draw.ellipse((x, y, x + w, y + h), fill=color)
+        else:
+            draw.rectangle((x, y, x + w, y + h), fill=color)
+
+    grain = Image.frombytes('L', (width, height), rng.randbytes(width * height)).convert('RGB')
+    return Image.blend(base, grain, 0.08)
+
+def generate_image(path: Path, file_format: str, width: int, height: int, frames: int, seed: int) -> None:
+    ''' Write one corpus image; the same arguments always produce the same pixels '''
+
+    rng = random.Random(f'{seed}/{file_format}/{width}x{height}/{frames}')
+    _, options = FORMATS[file_format]
+
+    if file_format == 'gif':
+        first = render_frame(width, height, rng).quantize(256)
+        rest = [render_frame(width, height, rng).quantize(palette=first) for _ in range(frames - 1)]
+        first.save(path, format='GIF', append_images=rest, **options)
+    else:
+        render_frame(width, height, rng).save(path, format=file_format.upper(), **options)
+
+def build_corpus(corpus_dir: Path, formats: list[str], sizes: list[str], gif_sizes: list[str], frames: list[int], seed: int) -> list[dict[str, Any]]:
+    ''' Generate the test images missing from the corpus directory, returning every case to benchmark '''
+
+    cases: list[dict[str, Any]] = []
+    for file_format in formats:
+        extension, _ = FORMATS[file_format]
+        for size in (gif_sizes if file_format == 'gif' else sizes):
+            width, height = parse_size(size)
+            for frame_count in (frames if file_format == 'gif' else [1]):
+                path = corpus_dir / f'{file_format}-{width}x{height}-{frame_count}f-s{seed}.{extension}'
+                if not path.exists():
+                    print(f'  generating {path.name}', flush=True)
+                    generate_image(path, file_format, width, height, frame_count, seed)
+
+                cases.append({
+                    'name': path.stem.rsplit('-', 1)[0],
+                    'format': file_format,
+                    'width': width,
+                    'height': height,
+                    'frames': frame_count,
+                    'megapixels': round(width * height * frame_count / 1_000_000, 3),
+                    'file_bytes': path.stat().st_size,
+                    'path': str(path),
+                })
+
+    return cases
+
+def build_archive(case: dict[str, Any], archive_dir: Path, images: int) -> Path:
+    ''' Zip copies of a case's image, as an uploaded album archive would hold its pages '''
+
+    extension, _ = FORMATS[case['format']]
+    archive = archive_dir / f'{case["name"]}.zip'
+    if not archive.exists():
+        # stored, like most cbz files: the images are compressed already
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zfd:
+            for n in range(images):
+                zfd.write(case['path'], f'{n + 1:04}.{extension}')
+
+    return archive
+
+def peak_rss_mb() -> float:
+    ''' Peak resident set size of this process so far '''
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_case(case: dict[str, Any], operation: str, iterations: int, archive: Optional[str], workdir: str) -> dict[str, Any]:
+    ''' Time one operation on one case (in a fresh worker process, so its peak RSS is its own) '''
+
+    # the IMAGE_* paths are set in the environment before minori is first imported, here in the worker
+    import shortuuid # pylint: disable=import-outside-toplevel
+    from minori.metrics import PIPELINE_STAGE_DURATION # pylint: disable=import-outside-toplevel
+    from minori.util import extract_zip, process_image, save_image, save_thumbnail # pylint: disable=import-outside-toplevel
+
+    source = Path(case['path'])
+    image_uuid = shortuuid.encode(uuid.UUID(int=1))
+    filename = f'{image_uuid[0:3]}/{shortuuid.decode(image_uuid)}.{FORMATS[case["format"]][0]}'
+
+    def ingest_archive() -> None:
+        ''' Extract the archive and process every image in it, like the archive upload endpoint '''
+
+        extracted = Path(tempfile.mkdtemp(dir=workdir))
+        try:
+            for n, _file in enumerate(extract_zip(Path(archive or ''), extracted)):
+                process_image(_file, shortuuid.encode(uuid.UUID(int=n + 1)), raise_on_nonimage=False)
+        finally:
+            shutil.rmtree(extracted)
+
+    run = {
+        'process_image': lambda: process_image(source, image_uuid),
+        'save_image': lambda: save_image(source, image_uuid[0:3], filename),
+        'save_thumbnail': lambda: save_thumbnail(source, image_uuid[0:3], filename),
+        'archive_ingest': ingest_archive,
+    }[operation]
+
+    # the interpreter and its imports, before any image is touched
+    baseline_rss = peak_rss_mb()
+    # the first run loads codecs and plugins and creates directories, which no later upload pays for
+    run()
+    PIPELINE_STAGE_DURATION.values.clear()
+
+    wall: list[float] = []
+    cpu: list[float] = []
+    for _ in range(iterations):
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        run()
+        wall.append(time.perf_counter() - wall_started)
+        cpu.append(time.process_time() - cpu_started)
+
+    return {
+        'wall_ms': statistics.median(wall) * 1000,
+        'cpu_ms': statistics.median(cpu) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - baseline_rss,
+        # the pipeline's own stage timings, per iteration
+        'stages_ms': {labels[0]: total[0] / iterations * 1000 for labels, (_, total) in sorted(PIPELINE_STAGE_DURATION.values.items())},
+    }
+
+def compare(results: list[dict[str, Any]], previous_path: str) -> None:
+    ''' Print the change of every case against a previous run '''
+
+    with open(previous_path, 'r', encoding='utf-8') as fd:
+        previous = {(result['case'], result['operation']): result for result in json.load(fd)['results']}
+
+    print(f'\nChange against {previous_path}:')
+    for result in results:
+        before = previous.get((result['case'], result['operation']))
+        if before is None:
+            continue
+        changes = []
+        for key in ('wall_ms', 'cpu_ms', 'peak_rss_mb'):
+            old, new = before[key], result[key]
+            changes.append(f'{key} {(new - old) / old * 100:+6.1f}%' if old else f'{key}      n/a')
+        print(f'  {result["case"]:<26} {result["operation"]:<15} {"   ".join(changes)}')
+
+def main(args: argparse.Namespace) -> int:
+    ''' main method '''
+
+    # not at the top: spawned workers import this module again, and have no use for httpx
+    from load_test import git_commit # pylint: disable=import-outside-toplevel
+
+    workdir = Path(tempfile.mkdtemp(prefix='minori-bench-pipeline-'))
+    corpus_dir = Path(args.corpus) if args.corpus else workdir / 'corpus'
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    # set before any worker imports minori, which reads them on import
+    os.environ['IMAGE_UPLOAD_PATH'] = str(workdir / 'images')
+    os.environ['IMAGE_THUMBNAIL_PATH'] = str(workdir / 'thumbs')
+    (workdir / 'images').mkdir()
+    (workdir / 'thumbs').mkdir()
+
+    try:
+        print(f'Corpus ({corpus_dir}):')
+        cases = build_corpus(corpus_dir, args.formats, args.sizes, args.gif_sizes, args.frames, args.seed)
+
+        results: list[dict[str, Any]] = []
+        # spawned rather than forked, and one task per worker: every measurement starts from a clean interpreter
+        with multiprocessing.get_context('spawn').Pool(processes=1, maxtasksperchild=1) as pool:
+            for case in cases:
+                for operation in args.operations:
+                    archive = str(build_archive(case, workdir, args.archive_images)) if operation == 'archive_ingest' else None
+                    megapixels = case['megapixels'] * (args.archive_images if archive else 1)
+                    timing = pool.apply(run_case, (case, operation, args.iterations, archive, str(workdir)))
+
+                    result = {
+                        'case': case['name'],
+                        'operation': operation,
+                        'images': args.archive_images if archive else 1,
+                        'megapixels': round(megapixels, 3),
+                        **timing,
+                        'wall_ms_per_mp': timing['wall_ms'] / megapixels,
+                        'cpu_ms_per_mp': timing['cpu_ms'] / megapixels,
+                    }
+                    results.append(result)
+                    print(
+                        f'  {case["name"]:<26} {operation:<15} {result["wall_ms"]:>9.1f} ms wall {result["cpu_ms"]:>9.1f} ms cpu   '
+                        f'{result["wall_ms_per_mp"]:>7.1f} ms/MP   peak {result["peak_rss_mb"]:>7.1f} MB (+{result["rss_growth_mb"]:.1f})', flush=True
+                    )
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'pillow': pillow_version,
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'archive_images': args.archive_images,
+            'seed': args.seed,
+        },
+        'cases': [{key: value for key, value in case.items() if key != 'path'} for case in cases],
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fd:
+            json.dump(report, fd, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the image ingest pipeline per format, size and frame count (run from the api directory).')
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=list(FORMATS), help='Formats to generate and benchmark.')
+    parser.add_argument('--sizes', nargs='+', default=['800x600', '1920x1080', '4000x3000'], help='Image sizes (WIDTHxHEIGHT) for still formats.')
+    parser.add_argument('--gif-sizes', nargs='+', default=['480x270', '960x540'], help='Image sizes (WIDTHxHEIGHT) for animated gifs.')
+    parser.add_argument('--frames', nargs='+', type=int, default=[8, 32], help='Frame counts for animated gifs.')
+    parser.add_argument('--operations', nargs='+', default=list(OPERATIONS), choices=OPERATIONS, help='Pipeline operations to time.')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs per case and operation (after one warmup run); the median is reported.')
+    parser.add_argument('--archive-images', type=int, default=8, help='Copies of the case\'s image in each archive_ingest archive.')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated corpus.')
+    parser.add_argument('--corpus', type=str, default=None, help='Directory to keep the generated corpus in and reuse it from (default: a temporary directory).')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this path.')
+    parser.add_argument('--compare', type=str, default=None, help='A previous --output file to print the change against.')
+    sys.exit(main(parser.parse_args()))
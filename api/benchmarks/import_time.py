@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+''' measure startup import time with python -X importtime, failing when it regresses against a baseline or a deferred dependency is imported eagerly again '''
+# pylint: disable=invalid-name
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any
+
+# what the api process and the migration job (alembic's env.py) import on start
+TARGETS = ('minori.api', 'minori.db.connection', 'minori.db.models')
+
+# dependencies only needed once their feature is used, which must stay out of a target's import graph
+DEFERRED = {
+    'minori.api': ('PIL', 'natsort', 'shortuuid'),
+    'minori.db.connection': ('PIL', 'natsort', 'aiofiles', 'shortuuid'),
+    'minori.db.models': ('PIL', 'natsort', 'aiofiles', 'shortuuid'),
+}
+
+def import_times(module: str) -> dict[str, tuple[int, int, int]]:
+    ''' Import a module in a fresh interpreter, returning (self us, cumulative us, depth) per imported module '''
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True, env={**os.environ, 'PYTHONWARNINGS': 'ignore'}
+    )
+
+    times: dict[str, tuple[int, int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2)
+
+    return times
+
+def measure(module: str, runs: int, top: int) -> dict[str, Any]:
+    ''' Measure a target over several runs, with the slowest direct imports of the median run '''
+
+    import_times(module) # warm the bytecode cache, so the first run doesn't pay for compilation
+    samples = [import_times(module) for _ in range(runs)]
+    totals = [sample[module][1] / 1000 for sample in samples]
+    median = statistics.median(totals)
+    median_sample = samples[totals.index(min(totals, key=lambda total: abs(total - median)))]
+
+    target_depth = median_sample[module][2]
+    children = sorted(
+        ((name, cumulative / 1000) for name, (_, cumulative, depth) in median_sample.items() if depth == target_depth + 1),
+        key=lambda child: child[1], reverse=True
+    )
+
+    return {
+        'module': module,
+        'median_ms': round(median, 1),
+        'min_ms': round(min(totals), 1),
+        'max_ms': round(max(totals), 1),
+        'slowest_imports': [{'module': name, 'ms': round(ms, 1)} for name, ms in children[:top]],
+        'deferred_loaded': [name for name in DEFERRED.get(module, ()) if name in median_sample],
+    }
+
+def main(modules: list[str], runs: int, top: int, baseline: str | None, update_baseline: bool, tolerance: float, slack: float, output: str | None) -> int:
+    ''' main method '''
+
+    results = [measure(module, runs, top) for module in modules]
+
+    expected: dict[str, float] = {}
+    if baseline and not update_baseline and os.path.exists(baseline):
+        with open(baseline, 'r', encoding='utf-8') as fd:
+            expected = json.load(fd)
+
+    failures: list[str] = []
+    for result in results:
+        module = result['module']
+        budget = expected[module] * (1 + tolerance) + slack if module in expected else None
+        print(f'{module}: {result["median_ms"]:.1f} ms median ({result["min_ms"]:.1f} - {result["max_ms"]:.1f} over {runs} runs)' + (
+            f', budget {budget:.1f} ms' if budget is not None else ''
+        ))
+        for child in result['slowest_imports']:
+            print(f'  {child["ms"]:>8.1f} ms  {child["module"]}')
+
+        if budget is not None and result['median_ms'] > budget:
+            failures.append(f'{module} imports in {result["median_ms"]:.1f} ms, over its {budget:.1f} ms budget (baseline {expected[module]:.1f} ms)')
+        if result['deferred_loaded']:
+            failures.append(f'{module} imports {", ".join(result["deferred_loaded"])} eagerly; import them where they are used instead')
+
+    if update_baseline and baseline:
+        with open(baseline, 'w', encoding='utf-8') as fd:
+            json.dump({result['module']: result['median_ms'] for result in results}, fd, indent=4)
+        print(f'Baseline written to {baseline}')
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as fd:
+            json.dump({'results': results, 'failures': failures}, fd, indent=4)
+
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the import time of the api and migration entry points (run from the api directory).')
+    parser.add_argument('--modules', nargs='+', default=list(TARGETS), help='Modules to measure.')
+    parser.add_argument('--runs', type=int, default=7, help='Fresh interpreters per module; the median is compared.')
+    parser.add_argument('--top', type=int, default=10, help='Slowest direct imports to list per module.')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON file of median import times (ms) per module to compare against.')
+    parser.add_argument('--update-baseline', action='store_true', help='Write this run\'s medians to the baseline file instead of comparing.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression over the baseline.')
+    parser.add_argument('--slack', type=float, default=20, help='Allowed absolute regression over the baseline (ms), absorbing noise on fast imports.')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this path.')
+    args = parser.parse_args()
+    sys.exit(main(**args.__dict__))
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+''' HTTP load test of the read endpoints against a synthetic library - latency percentiles and throughput per endpoint, in-process or over uvicorn '''
+# pylint: disable=invalid-name
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Optional
+
+import httpx
+
+# (name, path); {page}, {album}, {albums}, {image} and {author} are sampled from the library for every request
+ENDPOINTS = [
+    ('album listing', '/api/albums?page={page}'),
+    ('album listing, projected', '/api/albums?page={page}&fields=id,title,cover'),
+    ('album', '/api/albums/{album}'),
+    ('albums batch', '/api/albums/-/batch?ids={albums}'),
+    ('album images', '/api/albums/{album}/images'),
+    ('album images, projected', '/api/albums/{album}/images?fields=id,filename'),
+    ('reader', '/api/albums/{album}/reader?image_id={image}'),
+    ('image', '/api/albums/{album}/images/{image}'),
+    ('author albums', '/api/authors/{author}/albums'),
+    ('album stats', '/api/albums/{album}/stats'),
+    ('library stats', '/api/stats'),
+    ('health', '/api/health'),
+]
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    ''' Nearest-rank percentile of an ascending list '''
+
+    if not ordered:
+        return 0.0
+    return ordered[min(max(int(round(fraction * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)]
+
+class Sampler:
+    ''' ids picked from the library, filling in endpoint paths '''
+
+    def __init__(self, rng: random.Random, pages: int, albums: list[dict[str, Any]]) -> None:
+        ''' Constructor '''
+
+        self.rng = rng
+        self.pages = pages
+        # album id, author id, sampled image ids
+        self.albums = albums
+
+    @classmethod
+    async def from_api(cls, client: httpx.AsyncClient, rng: random.Random, sample_pages: int) -> 'Sampler':
+        ''' Sample albums (with their authors and some of their images) from random pages of the listing '''
+
+        pagination = (await client.get('/api/albums')).json()['pagination']
+        pages = max(pagination['last_page'], 1)
+
+        albums: list[dict[str, Any]] = []
+        for page in rng.sample(range(1, pages + 1), min(sample_pages, pages)):
+            for album in (await client.get(f'/api/albums?page={page}')).json()['albums']:
+                images = (await client.get(f'/api/albums/{album["id"]}/images?fields=id')).json()['images']
+                if images:
+                    albums.append({
+                        'album': album['id'],
+                        'author': album['author_alias']['author']['id'],
+                        'images': [image['id'] for image in rng.sample(images, min(len(images), 20))]
+                    })
+
+        if not albums:
+            raise RuntimeError('No albums with images found; generate a library first.')
+
+        return cls(rng, pages, albums)
+
+    def path(self, template: str) -> str:
+        ''' Fill in a path template with random ids '''
+
+        album = self.rng.choice(self.albums)
+        return template.format(
+            page=self.rng.randint(1, self.pages),
+            album=album['album'],
+            albums=','.join(entry['album'] for entry in self.rng.sample(self.albums, min(len(self.albums), 8))),
+            image=self.rng.choice(album['images']),
+            author=album['author']
+        )
+
+async def run_endpoint(client: httpx.AsyncClient, make_path: Callable[[], str], concurrency: int, duration: float, warmup: float) -> dict[str, Any]:
+    ''' Drive one endpoint with a fixed number of concurrent clients (closed loop), measuring after the warmup '''
+
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker() -> None:
+        while (sent := time.perf_counter()) < deadline:
+            try:
+                status = str((await client.get(make_path())).status_code)
+            except httpx.HTTPError as err:
+                status = type(err).__name__
+            if sent >= measure_from:
+                latencies.append(time.perf_counter() - sent)
+                statuses[status] += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if not status.startswith('2')),
+        'statuses': dict(statuses),
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'max': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+    }
+
+def free_port() -> int:
+    ''' Find a free local port for the uvicorn server '''
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def wait_for_server(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60) -> None:
+    ''' Wait until the spawned server answers its health check '''
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'uvicorn exited with code {server.returncode}')
+        try:
+            if (await client.get('/api/health')).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+
+    raise RuntimeError('uvicorn did not become healthy in time')
+
+def git_commit() -> Optional[str]:
+    ''' The commit being benchmarked, when run from a checkout '''
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list[dict[str, Any]], previous_path: str) -> None:
+    ''' Print the change of every endpoint against a previous run '''
+
+    with open(previous_path, 'r', encoding='utf-8') as fd:
+        previous = {result['endpoint']: result for result in json.load(fd)['results']}
+
+    print(f'\nChange against {previous_path}:')
+    for result in results:
+        before = previous.get(result['endpoint'])
+        if before is None:
+            continue
+        changes = []
+        for key in ('p50', 'p95', 'p99'):
+            old, new = before['latency_ms'][key], result['latency_ms'][key]
+            changes.append(f'{key} {(new - old) / old * 100:+6.1f}%' if old else f'{key}      n/a')
+        old, new = before['throughput_rps'], result['throughput_rps']
+        changes.append(f'rps {(new - old) / old * 100:+6.1f}%' if old else 'rps n/a')
+        print(f'  {result["endpoint"]:<28} {"   ".join(changes)}')
+
+async def run(args: argparse.Namespace, database: str) -> dict[str, Any]:
+    ''' Generate the library if needed, then load test each endpoint in turn '''
+
+    from synthetic_library import seed # pylint: disable=import-outside-toplevel
+
+    print(f'Library ({database}):')
+    library = await seed(args.albums, args.images, args.seed)
+
+    rng = random.Random(args.seed)
+    endpoints = [(name, path) for name, path in ENDPOINTS if not args.endpoints or name in args.endpoints]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    server: Optional[subprocess.Popen] = None
+    lifespan = None
+    if args.uvicorn:
+        port = free_port()
+        server = subprocess.Popen([
+            sys.executable, '-m', 'uvicorn', 'minori.api:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log'
+        ], env=os.environ.copy())
+        client = httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=60)
+    else:
+        from minori.api import app # pylint: disable=import-outside-toplevel
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__() # pylint: disable=no-member,unnecessary-dunder-call
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://minori', timeout=60) # type: ignore
+
+    results: list[dict[str, Any]] = []
+    try:
+        if server is not None:
+            await wait_for_server(client, server)
+
+        sampler = await Sampler.from_api(client, rng, args.sample_pages)
+        for name, path in endpoints:
+            result = await run_endpoint(client, lambda path=path: sampler.path(path), args.concurrency, args.duration, args.warmup)
+            results.append({'endpoint': name, 'path': path, **result})
+            latency = result['latency_ms']
+            print(
+                f'  {name:<28} {result["throughput_rps"]:>8.1f} req/s   p50 {latency["p50"]:>8.2f}   p95 {latency["p95"]:>8.2f}   '
+                f'p99 {latency["p99"]:>8.2f} ms   {result["errors"]} errors', flush=True
+            )
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None) # pylint: disable=no-member,unnecessary-dunder-call
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database,
+            'library': library,
+            'mode': f'uvicorn ({args.workers} workers)' if args.uvicorn else 'in-process',
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'seed': args.seed,
+        },
+        'results': results
+    }
+
+def main(args: argparse.Namespace) -> int:
+    ''' main method '''
+
+    if args.database_from_env:
+        database = f'{os.environ.get("DB_BACKEND", "mariadb")} (DB_* environment)'
+    else:
+        # hermetic by default: a sqlite library, kept at --sqlite-path to reuse it across runs
+        sqlite_path = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix='minori-bench-'), 'library.db')
+        os.environ['DB_BACKEND'] = 'sqlite'
+        os.environ['DB_SQLITE_PATH'] = sqlite_path
+        database = f'sqlite ({sqlite_path})'
+    # the library only has database rows, there are no files behind them
+    os.environ.setdefault('IMAGE_UPLOAD_PATH', tempfile.mkdtemp(prefix='minori-bench-images-'))
+    os.environ.setdefault('IMAGE_THUMBNAIL_PATH', tempfile.mkdtemp(prefix='minori-bench-thumbs-'))
+    os.environ.setdefault('REAPER_INTERVAL', '3600')
+
+    report = asyncio.run(run(args, database))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fd:
+            json.dump(report, fd, indent=4)
+    if args.compare:
+        compare(report['results'], args.compare)
+
+    return 1 if any(result['errors'] for result in report['results']) else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load tests the read endpoints against a synthetic library (run from the api directory).')
+    parser.add_argument('--albums', type=int, default=2000, help='Albums in the generated library (e.g. 50000).')
+    parser.add_argument('--images', type=int, default=200000, help='Images in the generated library (e.g. 5000000).')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the library and the request mix.')
+    parser.add_argument('--sqlite-path', type=str, default=None, help='SQLite file for the library; an existing library there is reused (default: a fresh temporary file).')
+    parser.add_argument('--database-from-env', action='store_true', help='Use the DB_* environment configuration (e.g. a MariaDB instance) instead of SQLite; generates into it if empty.')
+    parser.add_argument('--uvicorn', action='store_true', help='Load test a spawned uvicorn server over HTTP instead of the app in-process.')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes (with --uvicorn).')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients per endpoint.')
+    parser.add_argument('--duration', type=float, default=10, help='Measured seconds per endpoint.')
+    parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds of load before each endpoint\'s measurement.')
+    parser.add_argument('--sample-pages', type=int, default=20, help='Listing pages to sample album, image and author ids from.')
+    parser.add_argument('--endpoints', nargs='+', default=None, help='Only load test these endpoints (by name).')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this path.')
+    parser.add_argument('--compare', type=str, default=None, help='A previous --output file to print the change against.')
+    sys.exit(main(parser.parse_args()))
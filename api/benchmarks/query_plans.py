@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+''' check the query plans of the hot read paths, failing when one falls back to a full table scan or a filesort '''
+# pylint: disable=invalid-name
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import random
+import sys
+from typing import Any
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+import shortuuid
+
+from minori.db.connection import dbconn
+from minori.db.models import Album, Author, AuthorAlias, Image
+
+# the tables that grow with the library; scanning the small lookup tables is fine
+WATCHED_TABLES = ('album', 'album_summary', 'image')
+
+# (name, path) of each hot read path; {album}, {image} and {author} are filled in from the library
+HOT_PATHS = [
+    ('album listing', '/api/albums'),
+    ('album listing, page 3', '/api/albums?page=3'),
+    ('album listing, with disabled', '/api/albums?include_disabled=true'),
+    ('album listing, projected', '/api/albums?fields=id,title,cover'),
+    ('album', '/api/albums/{album}'),
+    ('album images', '/api/albums/{album}/images'),
+    ('album images, projected', '/api/albums/{album}/images?fields=id,filename'),
+    ('reader', '/api/albums/{album}/reader?image_id={image}'),
+    ('image', '/api/albums/{album}/images/{image}'),
+    ('author albums', '/api/authors/{author}/albums'),
+    ('album stats', '/api/albums/{album}/stats'),
+]
+
+def seed_library(session: Session, albums: int, images: int) -> None:
+    ''' Fill the database with a synthetic library (synchronous) '''
+
+    rng = random.Random(1)
+    authors = [Author(name=f'Seed author {shortuuid.uuid()}') for _ in range(max(albums // 8, 1))]
+    aliases = [AuthorAlias(name=author.name, author=author) for author in authors]
+    session.add_all(authors + aliases)
+
+    start = datetime.now() - timedelta(days=albums)
+    for i in range(albums):
+        album = Album(
+            title=f'Seed album {i}',
+            disabled=rng.random() < 0.1,
+            created_at=start + timedelta(days=i),
+            author_alias=rng.choice(aliases)
+        )
+        session.add(album)
+        session.add_all([
+            Image(
+                filename=f'{shortuuid.uuid()[0:3]}/{shortuuid.uuid()}.jpg',
+                original_filename=f'{n:04}.jpg',
+                file_format='jpg',
+                uploaded=True,
+                created_at=album.created_at,
+                uploaded_at=album.created_at,
+                album=album,
+                album_order_key=0 if rng.random() < 0.5 else n
+            ) for n in range(images)
+        ])
+
+    session.commit()
+
+def explain(session: Session, statement: str, parameters: Any) -> list[str]:
+    ''' EXPLAIN a captured statement, returning a description of each problem found in its plan (synchronous) '''
+
+    dialect = session.get_bind().dialect.name
+    conn = session.connection()
+    problems: list[str] = []
+
+    if dialect == 'sqlite':
+        for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).mappings():
+            detail: str = row['detail']
+            words = detail.split()
+            if words[0] == 'SCAN' and words[1] in WATCHED_TABLES and 'INDEX' not in detail:
+                problems.append(f'full scan: {detail}')
+            if 'TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append(f'filesort: {detail}')
+    else:
+        for row in conn.exec_driver_sql(f'EXPLAIN {statement}', parameters).mappings():
+            table = row['table']
+            extra = row['Extra'] or ''
+            if table in WATCHED_TABLES and row['type'] == 'ALL':
+                problems.append(f'full scan: {table} ({row["rows"]} rows)')
+            if 'Using filesort' in extra:
+                problems.append(f'filesort: {table} ({extra})')
+
+    return problems
+
+def main(database_url: str | None, seed_albums: int, seed_images: int, output: str | None) -> int:
+    ''' main method '''
+
+    if database_url:
+        dbconn.connection_string = database_url
+
+    from minori.api import app # pylint: disable=import-outside-toplevel
+
+    captured: list[tuple[str, Any]] = []
+    def capture(conn, cursor, statement, parameters, context, executemany): # pylint: disable=unused-argument,too-many-arguments
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            captured.append((statement, parameters))
+
+    results: list[dict[str, Any]] = []
+    with TestClient(app) as client:
+        assert dbconn.engine is not None and dbconn.session is not None
+        sessionmaker = dbconn.session
+
+        async def run_sync(fn, *args):
+            async with sessionmaker() as session:
+                return await session.run_sync(fn, *args)
+
+        if seed_albums:
+            client.portal.call(run_sync, seed_library, seed_albums, seed_images)
+
+        # refresh the planner statistics, so plans reflect the real data distribution
+        async def analyze():
+            async with dbconn.engine.begin() as conn: # type: ignore
+                if conn.dialect.name == 'sqlite':
+                    await conn.execute(text('ANALYZE'))
+                else:
+                    await conn.execute(text(f'ANALYZE TABLE {", ".join(WATCHED_TABLES)}'))
+        client.portal.call(analyze)
+
+        album = client.get('/api/albums').json()['albums'][0]
+        image = client.get(f'/api/albums/{album["id"]}/images').json()['images'][0]
+        ids = {'album': album['id'], 'image': image['id'], 'author': album['author_alias']['author']['id']}
+
+        # reads are routed to the replicas (or sqlite's reader connections) when there are any, so listen on every engine
+        engines = [dbconn.engine, *dbconn.replica_engines]
+        for engine in engines:
+            event.listen(engine.sync_engine, 'before_cursor_execute', capture)
+        for name, path in HOT_PATHS:
+            captured.clear()
+            response = client.get(path.format(**ids))
+            if response.status_code != 200:
+                results.append({'path': name, 'problems': [f'HTTP {response.status_code}'], 'statements': 0})
+                continue
+
+            statements = list(captured)
+            # a path that ran nothing we saw wasn't checked at all
+            problems: list[str] = [] if statements else ['no statements captured']
+            for statement, parameters in statements:
+                problems.extend(client.portal.call(run_sync, explain, statement, parameters))
+
+            results.append({'path': name, 'problems': problems, 'statements': len(statements)})
+        for engine in engines:
+            event.remove(engine.sync_engine, 'before_cursor_execute', capture)
+
+    for result in results:
+        status = 'FAIL' if result['problems'] else 'ok'
+        print(f'{status:<5} {result["path"]:<32} {result["statements"]:>3} queries')
+        for problem in result['problems']:
+            print(f'        {problem}')
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as fd:
+            json.dump(results, fd, indent=4)
+
+    return 1 if any(result['problems'] for result in results) else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAINs every query issued by the hot read paths, failing on full scans and filesorts.')
+    parser.add_argument('--database-url', type=str, default=None, help='SQLAlchemy URL of the database to check (defaults to the DB_* environment configuration).')
+    parser.add_argument('--seed-albums', type=int, default=0, help='Seed this many synthetic albums first (writes to the database!).')
+    parser.add_argument('--seed-images', type=int, default=40, help='Images per seeded album.')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this path.')
+    args = parser.parse_args()
+    sys.exit(main(**args.__dict__))
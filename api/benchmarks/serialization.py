@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+''' benchmark the album/image listing serialization paths and response compression '''
+# pylint: disable=invalid-name
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import time
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+import shortuuid
+
+import minori.api_models as models
+from minori.compression import available_encodings
+from minori.db.models import Album, Author, AuthorAlias, Image, Tag
+from minori.projection import IMAGE_FIELDS, ListFormat, project
+from minori.responses import FastJSONResponse
+
+def build_albums(count: int) -> list[Album]:
+    ''' Build transient Album objects shaped like a /api/albums page '''
+
+    albums: list[Album] = []
+    for i in range(count):
+        author = Author(uuid=shortuuid.uuid(), name=f'Author {i}')
+        cover = Image(
+            uuid=shortuuid.uuid(),
+            filename=f'abc/{shortuuid.uuid()}.jpg',
+            original_filename=f'{i:04}.jpg',
+            uploaded=True,
+            created_at=datetime.now(),
+            uploaded_at=datetime.now(),
+            album_order_key=0
+        )
+        albums.append(Album(
+            uuid=shortuuid.uuid(),
+            disabled=False,
+            title=f'Some album title number {i}',
+            description='A brief explanation of the purpose or overall contents of the album.',
+            url='https://example.com/where-the/album/came-from',
+            created_at=datetime.now(),
+            author_alias=AuthorAlias(uuid=shortuuid.uuid(), name=f'Author {i}', author=author),
+            album_cover=cover,
+            tags=[Tag(uuid=shortuuid.uuid(), namespace='genre', name=f'tag {n}') for n in range(4)]
+        ))
+
+    return albums
+
+def build_images(count: int) -> list[Image]:
+    ''' Build transient Image objects shaped like a large album's image listing '''
+
+    return [
+        Image(
+            uuid=shortuuid.uuid(),
+            filename=f'abc/{shortuuid.uuid()}.jpg',
+            original_filename=f'{i:05}.jpg',
+            uploaded=True,
+            created_at=datetime.now(),
+            uploaded_at=datetime.now(),
+            album_order_key=i
+        ) for i in range(count)
+    ]
+
+def time_it(fn: Callable[[], bytes], iterations: int) -> tuple[float, bytes]:
+    ''' Time a rendering callable, returning the mean CPU seconds per call and the rendered body '''
+
+    body = fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+
+    return (time.process_time() - start) / iterations, body
+
+def compressed_sizes(body: bytes) -> dict[str, int]:
+    ''' Size of the body under each available encoding '''
+
+    sizes: dict[str, int] = {'identity': len(body)}
+    for encoding, compressor_factory in available_encodings().items():
+        compressor = compressor_factory()
+        sizes[encoding] = len(compressor.compress(body) + compressor.finish())
+
+    return sizes
+
+def run_case(name: str, response_model: Any, build: Callable[[], Any], iterations: int, extra: dict[str, Callable[[], bytes]]) -> dict[str, Any]:
+    ''' Compare the default fastapi rendering path with the fast path for one response shape '''
+
+    field = create_response_field(name='response', type_=response_model)
+    loop = asyncio.new_event_loop()
+
+    def default_path() -> bytes:
+        # the old path: validated model construction, fastapi response validation + serialization, then json.dumps
+        model = response_model.model_validate(build().model_dump())
+        content = loop.run_until_complete(serialize_response(field=field, response_content=model))
+        return JSONResponse(content).body
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(build()).body
+
+    results: dict[str, Any] = {'case': name, 'paths': {}}
+    for path_name, fn in {'default': default_path, 'fast': fast_path, **extra}.items():
+        cpu, body = time_it(fn, iterations)
+        results['paths'][path_name] = {
+            'cpu_ms': round(cpu * 1000, 3),
+            'bytes': compressed_sizes(body)
+        }
+
+    loop.close()
+    return results
+
+def main(albums: int, images: int, iterations: int, output: str | None) -> None:
+    ''' main method '''
+
+    album_rows = build_albums(albums)
+    image_rows = build_images(images)
+
+    results = [
+        run_case(
+            f'/api/albums ({albums} albums)',
+            models.FullAlbumsResponseModel,
+            lambda: models.FullAlbumsResponseModel.model_construct(albums=[album.to_full_model() for album in album_rows]),
+            iterations,
+            {}
+        ),
+        run_case(
+            f'/api/albums/{{album_id}}/images ({images} images)',
+            models.ImagesResponseModel,
+            lambda: models.ImagesResponseModel.model_construct(images=[image.to_model() for image in image_rows]),
+            iterations,
+            {
+                'fast, fields=id,filename': lambda: FastJSONResponse({
+                    'images': project(image_rows, ['id', 'filename'], IMAGE_FIELDS)
+                }).body,
+                'fast, fields=id,filename, columnar': lambda: FastJSONResponse({
+                    'images': project(image_rows, ['id', 'filename'], IMAGE_FIELDS, ListFormat.COLUMNAR)
+                }).body,
+            }
+        )
+    ]
+
+    for case in results:
+        print(case['case'])
+        for path_name, path in case['paths'].items():
+            sizes = ', '.join(f'{encoding}={size}' for encoding, size in path['bytes'].items())
+            print(f'  {path_name:<36} {path["cpu_ms"]:>9.3f} ms cpu   {sizes}')
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as fd:
+            json.dump(results, fd, indent=4)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks response serialization and compression for listing endpoints.')
+    parser.add_argument('--albums', type=int, default=16, help='Number of albums in the album listing (a page is 16).')
+    parser.add_argument('--images', type=int, default=5000, help='Number of images in the image listing.')
+    parser.add_argument('--iterations', type=int, default=20, help='Iterations per measurement.')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this path.')
+    args = parser.parse_args()
+    main(**args.__dict__)
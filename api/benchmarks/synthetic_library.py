@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+''' generate a deterministic synthetic library at scale - authors, aliases, tags and albums with skewed (zipf-like) popularity '''
+# pylint: disable=invalid-name
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import math
+import random
+import time
+from typing import Any, Sequence
+import uuid
+
+import shortuuid
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from minori.db.models import album_tag_xref_table, Album, Author, AuthorAlias, Image, Tag
+from minori.db.summary import rebuild_album_summaries
+
+TAG_NAMESPACES = ('genre', 'series', 'character', 'artist', 'language')
+TITLE_WORDS = (
+    'summer', 'night', 'city', 'garden', 'river', 'winter', 'collection', 'sketches', 'archive', 'journey', 'harbor',
+    'festival', 'portraits', 'studies', 'volume', 'lights', 'morning', 'station', 'forest', 'selected', 'works', 'notes'
+)
+# (format, share of images, median original size in bytes)
+FORMATS = (('jpg', 0.70, 900_000), ('png', 0.18, 2_400_000), ('webp', 0.09, 450_000), ('gif', 0.03, 3_000_000))
+BATCH_ALBUMS = 500
+
+def zipf_weights(count: int, exponent: float = 1.1) -> list[float]:
+    ''' Popularity weights for a ranked population, a few entries taking most of the picks '''
+
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def new_uuid(rng: random.Random) -> str:
+    ''' Generate a public id from the seeded generator, so the same seed always yields the same library '''
+
+    return shortuuid.encode(uuid.UUID(int=rng.getrandbits(128)))
+
+def count_library(session: Session) -> dict[str, int]:
+    ''' Count the rows of the library tables (synchronous) '''
+
+    return {
+        name: session.execute(select(func.count()).select_from(model)).scalar_one() # pylint: disable=not-callable
+        for name, model in (('authors', Author), ('aliases', AuthorAlias), ('tags', Tag), ('albums', Album), ('images', Image))
+    }
+
+def generate_library(session: Session, albums: int, images: int, seed: int = 1, progress: bool = True) -> dict[str, int]:
+    ''' Fill an empty database with a synthetic library, committing in batches (synchronous, writes to the database!) '''
+
+    rng = random.Random(seed)
+    started = time.monotonic()
+
+    author_count = max(albums // 10, 1)
+    author_rows = [{'id': i, 'uuid': new_uuid(rng), 'name': f'Author {i:06}'} for i in range(1, author_count + 1)]
+    # most authors go by one name, some by a few
+    alias_rows: list[dict[str, Any]] = []
+    for author in author_rows:
+        for n in range(1 if rng.random() < 0.7 else rng.randint(2, 4)):
+            alias_rows.append({
+                'id': len(alias_rows) + 1,
+                'uuid': new_uuid(rng),
+                'name': author['name'] if n == 0 else f'{author["name"]} ({n})',
+                'author_id': author['id']
+            })
+    tag_rows = [
+        {'id': i, 'uuid': new_uuid(rng), 'namespace': rng.choice(TAG_NAMESPACES), 'name': f'tag {i:05}'}
+        for i in range(1, max(albums // 25, 50) + 1)
+    ]
+
+    session.execute(insert(Author.__table__), author_rows)
+    session.execute(insert(AuthorAlias.__table__), alias_rows)
+    session.execute(insert(Tag.__table__), tag_rows)
+    session.commit()
+
+    # milder for authors than for tags: prolific authors exist, but don't own most of the library
+    alias_weights = zipf_weights(len(alias_rows), 0.9)
+    tag_weights = zipf_weights(len(tag_rows))
+    alias_ids = [alias['id'] for alias in alias_rows]
+    tag_ids = [tag['id'] for tag in tag_rows]
+    format_names = [name for name, _, _ in FORMATS]
+    format_weights = [share for _, share, _ in FORMATS]
+    format_sizes = {name: size for name, _, size in FORMATS}
+
+    # image counts per album are log-normal around the requested mean: mostly short albums, with a long tail of huge ones
+    sigma = 0.9
+    mu = math.log(max(images / max(albums, 1), 1)) - sigma ** 2 / 2
+
+    first_created = datetime.now() - timedelta(days=3 * 365)
+    album_id = 0
+    image_id = 0
+    for batch_start in range(0, albums, BATCH_ALBUMS):
+        album_rows: list[dict[str, Any]] = []
+        image_rows: list[dict[str, Any]] = []
+        xref_rows: list[dict[str, Any]] = []
+        covers: list[dict[str, Any]] = []
+
+        for _ in range(min(BATCH_ALBUMS, albums - batch_start)):
+            album_id += 1
+            created_at = first_created + timedelta(seconds=album_id * 3 * 365 * 86400 // max(albums, 1))
+            alias_id = rng.choices(alias_ids, weights=alias_weights)[0]
+            album_rows.append({
+                'id': album_id,
+                'uuid': new_uuid(rng),
+                'disabled': rng.random() < 0.05,
+                'title': f'{" ".join(rng.sample(TITLE_WORDS, rng.randint(1, 4))).title()} {rng.randint(1, 40)}',
+                'author': alias_rows[alias_id - 1]['name'],
+                'author_alias_id': alias_id,
+                'description': 'A synthetic album.' if rng.random() < 0.3 else None,
+                'url': f'https://example.com/albums/{album_id}' if rng.random() < 0.5 else None,
+                'created_at': created_at,
+                'album_cover_id': None
+            })
+            xref_rows.extend(
+                {'album_id': album_id, 'tag_id': tag_id}
+                for tag_id in set(rng.choices(tag_ids, weights=tag_weights, k=min(int(rng.expovariate(1 / 4)), 20)))
+            )
+
+            first_image_id = image_id + 1
+            for n in range(max(int(rng.lognormvariate(mu, sigma)), 1)):
+                image_id += 1
+                image_uuid = new_uuid(rng)
+                file_format = rng.choices(format_names, weights=format_weights)[0]
+                image_rows.append({
+                    'id': image_id,
+                    'uuid': image_uuid,
+                    'filename': f'{image_uuid[0:3]}/{image_uuid}.{file_format}',
+                    'original_filename': f'{n + 1:04}.{file_format}',
+                    'uploaded': True,
+                    'created_at': created_at,
+                    'uploaded_at': created_at,
+                    'album_id': album_id,
+                    'album_order_key': (n + 1) * 1024,
+                    'file_format': file_format,
+                    'file_size': int(rng.lognormvariate(math.log(format_sizes[file_format]), 0.5)),
+                    'thumbnail_size': int(rng.lognormvariate(math.log(40_000), 0.3)),
+                })
+            covers.append({'id': album_id, 'album_cover_id': first_image_id})
+
+        session.execute(insert(Album.__table__), album_rows)
+        for chunk in chunked(image_rows, 10_000):
+            session.execute(insert(Image.__table__), chunk)
+        if xref_rows:
+            session.execute(insert(album_tag_xref_table), xref_rows)
+        session.execute(update(Album), covers)
+        rebuild_album_summaries(session, [album['id'] for album in album_rows])
+        session.commit()
+        session.expunge_all()
+
+        if progress:
+            elapsed = time.monotonic() - started
+            print(f'  {album_id}/{albums} albums, {image_id} images ({elapsed:.0f}s)', flush=True)
+
+    return count_library(session)
+
+def chunked(rows: Sequence[Any], size: int) -> list[Sequence[Any]]:
+    ''' Split rows into consecutive chunks of at most size rows '''
+
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+async def seed(albums: int, images: int, seed_value: int) -> dict[str, int]:
+    ''' Generate the library through the configured database connection, unless it already holds one '''
+
+    from minori.db.connection import dbconn # pylint: disable=import-outside-toplevel
+
+    await dbconn.start()
+    try:
+        assert dbconn.session is not None
+        async with dbconn.session() as session:
+            counts = await session.run_sync(count_library)
+            if counts['albums']:
+                print(f'Library already populated, reusing it: {counts}')
+                return counts
+            return await session.run_sync(generate_library, albums, images, seed_value)
+    finally:
+        await dbconn.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic library into the database configured through the DB_* environment (writes to it!).')
+    parser.add_argument('--albums', type=int, default=2000, help='Albums to generate.')
+    parser.add_argument('--images', type=int, default=200000, help='Images to generate in total, spread log-normally over the albums.')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed and sizes always generate the same library.')
+    args = parser.parse_args()
+    print(asyncio.run(seed(args.albums, args.images, args.seed)))
@@ -7,6 +7,7 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
+from alembic.script import ScriptDirectory
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -46,6 +47,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=dbconn.connection_string.startswith('sqlite'),
     )
 
     with context.begin_transaction():
@@ -53,7 +55,18 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    is_sqlite = connection.dialect.name == 'sqlite'
+
+    # sqlite can't alter most things in place; batch mode copies the table over instead
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=is_sqlite)
+
+    if is_sqlite and context.get_context().get_current_revision() is None:
+        # the migration history starts from a pre-existing mariadb schema (and uses mariadb-only statements along the way),
+        # so an unversioned sqlite database is created at the current schema and stamped instead
+        target_metadata.create_all(connection)
+        context.get_context().stamp(ScriptDirectory.from_config(config), 'head')
+        connection.commit()
+        return
 
     with context.begin_transaction():
         context.run_migrations()
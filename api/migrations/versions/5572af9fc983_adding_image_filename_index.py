@@ -0,0 +1,32 @@
+# pylint: skip-file
+"""Adding an index on stored image filenames for the storage reconciler
+
+Revision ID: 5572af9fc983
+Revises: 693cf99951e2
+Create Date: 2026-10-19 05:02:17.349108
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5572af9fc983'
+down_revision: Union[str, None] = '693cf99951e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # filename has to shrink to fit in an index in full (utf8mb4 keys cap out at 3072 bytes);
+    # it's generated by the api as '<shard>/<decoded uuid>.<format>', so it never comes close to 255
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.alter_column('filename', existing_type=sa.String(length=1024), type_=sa.String(length=255), existing_nullable=True)
+
+    op.create_index('ix_image_filename', 'image', ['filename'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_image_filename', table_name='image')
+
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.alter_column('filename', existing_type=sa.String(length=255), type_=sa.String(length=1024), existing_nullable=True)
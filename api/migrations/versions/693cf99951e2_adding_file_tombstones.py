@@ -0,0 +1,36 @@
+# pylint: skip-file
+"""Adding file tombstones for deferred file removal
+
+Revision ID: 693cf99951e2
+Revises: 8817e1c4dc0a
+Create Date: 2026-10-19 04:11:08.620593
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '693cf99951e2'
+down_revision: Union[str, None] = '8817e1c4dc0a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table('file_tombstone',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=1024), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.String(length=1024), nullable=True),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_file_tombstone')),
+        mysql_charset='utf8mb4',
+        mysql_collate='utf8mb4_bin'
+    )
+    op.create_index('ix_file_tombstone_next_attempt_at', 'file_tombstone', ['next_attempt_at'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_file_tombstone_next_attempt_at', table_name='file_tombstone')
+    op.drop_table('file_tombstone')
@@ -0,0 +1,46 @@
+# pylint: skip-file
+"""Adding indexes for the album and image listing query shapes
+
+Revision ID: 8817e1c4dc0a
+Revises: e8f1ac628799
+Create Date: 2026-10-19 03:02:51.774130
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8817e1c4dc0a'
+down_revision: Union[str, None] = 'e8f1ac628799'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # original_filename has to shrink to fit in an index in full (utf8mb4 keys cap out at 3072 bytes);
+    # it only ever holds a single path component, so nothing legitimate is longer than 255
+    image = sa.table('image', sa.column('original_filename', sa.String))
+    op.execute(
+        image.update()
+            .where(sa.func.char_length(image.c.original_filename) > 255)
+            .values(original_filename=sa.func.substr(image.c.original_filename, 1, 255))
+    )
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.alter_column('original_filename', existing_type=sa.String(length=1024), type_=sa.String(length=255), existing_nullable=True)
+
+    op.create_index('ix_album_disabled_created_at', 'album', ['disabled', 'created_at'], unique=False)
+    op.create_index('ix_image_album_id_album_order_key_original_filename', 'image', ['album_id', 'album_order_key', 'original_filename'], unique=False)
+    op.create_index('ix_album_summary_album_uuid', 'album_summary', ['album_uuid'], unique=True)
+    op.create_index('ix_album_summary_created_at', 'album_summary', ['created_at'], unique=False)
+
+def downgrade() -> None:
+    # innodb drops the implicit album_id fk index once the composite index covers it, so put one back before removing the composite
+    op.create_index('ix_image_album_id', 'image', ['album_id'], unique=False)
+    op.drop_index('ix_album_summary_created_at', table_name='album_summary')
+    op.drop_index('ix_album_summary_album_uuid', table_name='album_summary')
+    op.drop_index('ix_image_album_id_album_order_key_original_filename', table_name='image')
+    op.drop_index('ix_album_disabled_created_at', table_name='album')
+
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.alter_column('original_filename', existing_type=sa.String(length=255), type_=sa.String(length=1024), existing_nullable=True)
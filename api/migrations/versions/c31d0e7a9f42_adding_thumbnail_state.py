@@ -0,0 +1,29 @@
+# pylint: skip-file
+"""Adding the build parameters of image thumbnails, for staleness tracking
+
+Revision ID: c31d0e7a9f42
+Revises: 5572af9fc983
+Create Date: 2026-10-19 05:41:53.018274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c31d0e7a9f42'
+down_revision: Union[str, None] = '5572af9fc983'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # existing thumbnails have no recorded state, so the next rebuild treats them all as stale
+    op.add_column('image', sa.Column('thumbnail_signature', sa.String(length=64), nullable=True))
+    op.add_column('image', sa.Column('thumbnail_source_mtime', sa.BigInteger(), nullable=True))
+    op.add_column('image', sa.Column('thumbnail_source_size', sa.BigInteger(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('image', 'thumbnail_source_size')
+    op.drop_column('image', 'thumbnail_source_mtime')
+    op.drop_column('image', 'thumbnail_signature')
@@ -0,0 +1,60 @@
+# pylint: skip-file
+"""Adding per-author stats aggregates, image formats and thumbnail sizes
+
+Revision ID: e8f1ac628799
+Revises: bcb4deae84f8
+Create Date: 2026-10-19 02:14:37.208416
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f1ac628799'
+down_revision: Union[str, None] = 'bcb4deae84f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('image', sa.Column('file_format', sa.String(length=16), nullable=True))
+    op.add_column('image', sa.Column('thumbnail_size', sa.BigInteger(), nullable=True))
+    op.add_column('album_summary', sa.Column('derivative_bytes', sa.BigInteger(), nullable=False, server_default='0'))
+    op.add_column('album_summary', sa.Column('formats', sa.Text(), nullable=True))
+    op.create_table('stat_aggregate',
+        sa.Column('scope', sa.String(length=16), nullable=False),
+        sa.Column('scope_key', sa.String(length=32), nullable=False),
+        sa.Column('album_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.Column('original_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('derivative_bytes', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'scope_key', name=op.f('pk_stat_aggregate')),
+        mysql_charset='utf8mb4',
+        mysql_collate='utf8mb4_bin'
+    )
+
+    # the format is already encoded in the stored filename; thumbnail sizes need the image volume, so those come from
+    # POST /api/stats/-/rebuild - the aggregates (per author only: library and per-format totals are summed from
+    # album_summary when read) follow album_summary as the api fills it, see bcb4deae84f8
+    image = sa.table('image', sa.column('id', sa.Integer), sa.column('filename', sa.String), sa.column('file_format', sa.String))
+    conn = op.get_bind()
+    formats = [
+        {'image_id': image_id, 'file_format': os.path.splitext(filename)[1][1:].lower()}
+        for image_id, filename in conn.execute(sa.select(image.c.id, image.c.filename).where(image.c.filename != None)).all()
+    ]
+    if formats:
+        conn.execute(image.update().where(image.c.id == sa.bindparam('image_id')).values(file_format=sa.bindparam('file_format')), formats)
+
+    # any summaries present are rebuilt by the api along with the aggregates; until then they count no formats
+    op.execute(sa.text("UPDATE album_summary SET formats = '{}' WHERE formats IS NULL"))
+    with op.batch_alter_table('album_summary') as batch_op:
+        batch_op.alter_column('formats', existing_type=sa.Text(), nullable=False)
+
+def downgrade() -> None:
+    op.drop_table('stat_aggregate')
+    op.drop_column('album_summary', 'formats')
+    op.drop_column('album_summary', 'derivative_bytes')
+    op.drop_column('image', 'thumbnail_size')
+    op.drop_column('image', 'file_format')
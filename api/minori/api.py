@@ -5,24 +5,38 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy import text
 
 import minori.api_models as models
-from minori.core_config import CORS_DOMAINS_ALLOWED, MINORI_VERSION
+from minori.compression import CompressionMiddleware
+from minori.core_config import COMPRESSION_MINIMUM_SIZE, CORS_DOMAINS_ALLOWED, METRICS_ENABLED, MINORI_VERSION
 from minori.db.connection import dbconn, AsyncSessionDbInjectorMiddleware, AsyncSession
+from minori.db.querycount import QueryCountMiddleware
+from minori.db.slowquery import slow_query_log
 from minori.logger import logger
+from minori.metrics import MetricsMiddleware, render_metrics
+from minori.responses import TimedORJSONResponse
+from minori.timing import ServerTimingMiddleware
+from minori.reaper import reaper
+from minori.summary_backfill import summary_backfill
 
-from minori.routers import albums, authors, authoraliases, images
+from minori.routers import admin, albums, authors, authoraliases, images, stats
 
 @asynccontextmanager
 async def lifespan(app: FastAPI): # pylint: disable=redefined-outer-name,unused-argument
     ''' Initialize the application '''
 
     await dbconn.start()
+    await summary_backfill.start()
+    reaper.start()
+    slow_query_log.start()
 
     yield
 
+    await slow_query_log.stop()
+    await reaper.stop()
+    await summary_backfill.stop()
     await dbconn.stop()
 
 app = FastAPI(
@@ -33,21 +47,31 @@ app = FastAPI(
         'url': 'https://opensource.org/license/mit/'
     },
     version=MINORI_VERSION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedORJSONResponse
 )
 
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_DOMAINS_ALLOWED,
     allow_methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'],
-    allow_headers=['Content-Type'],
+    allow_headers=['Content-Type', AsyncSessionDbInjectorMiddleware.PRIMARY_STICKY_HEADER],
+    expose_headers=[AsyncSessionDbInjectorMiddleware.PRIMARY_STICKY_HEADER, 'Server-Timing'],
     max_age=86400
 )
 app.add_middleware(AsyncSessionDbInjectorMiddleware)
+app.add_middleware(QueryCountMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+# outermost, so latency and bytes sent cover everything (compression included)
+app.add_middleware(MetricsMiddleware)
 app.include_router(albums.router)
 app.include_router(images.router)
 app.include_router(authors.router)
 app.include_router(authoraliases.router)
+app.include_router(stats.router)
+app.include_router(admin.router)
 
 @app.get('/api/health', include_in_schema=False)
 async def app_healthcheck(db: AsyncSession) -> models.HealthCheckResponseModel:
@@ -63,6 +87,13 @@ async def app_healthcheck(db: AsyncSession) -> models.HealthCheckResponseModel:
         healthy=True
     )
 
+if METRICS_ENABLED:
+    @app.get('/metrics', include_in_schema=False)
+    async def app_metrics() -> Response:
+        ''' Prometheus metrics, in the text exposition format '''
+
+        return Response(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.exception_handler(Exception)
 async def error_handler(request: Request, err: Exception): # pylint: disable=unused-argument
     ''' error handler '''
@@ -90,6 +90,32 @@ class UpdateImageOrderRequestModel(BaseModel):
         description='The new order value for the image.'
     )
 
+class ReorderImagesRequestModel(BaseModel):
+    ''' Request body model for reordering an album's images '''
+
+    image_ids: list[str] = Field(
+        description=(
+            'Reference IDs of images in their new order. '
+            'When only some of the album\'s images are given, they are rearranged among the positions they already occupy.'
+        ),
+        min_length=1
+    )
+
+class MoveImageRequestModel(BaseModel):
+    ''' Request body model for moving an image between two others in an album '''
+
+    after_id: Optional[str] = Field(
+        description=(
+            'Reference ID of the image to place this one right after '
+            '(at least one of after_id and before_id is required; given both, they must be adjacent).'
+        ),
+        default=None
+    )
+    before_id: Optional[str] = Field(
+        description='Reference ID of the image to place this one right before (pass the first image without after_id to move it to the start).',
+        default=None
+    )
+
 class UpdateAuthorRequestModel(BaseModel):
     ''' Request body model for updating an Author '''
 
@@ -229,6 +255,36 @@ class FullAuthorAliasModel(AuthorAliasModel):
 
     author: Optional[AuthorModel] = Field(description='The canonical author reference.')
 
+class StatsModel(BaseModel):
+    ''' api model for aggregate storage statistics '''
+
+    album_count: int = Field(description='The number of albums.')
+    image_count: int = Field(description='The number of images.')
+    original_bytes: int = Field(description='Total size of the original image files, in bytes.')
+    derivative_bytes: int = Field(description='Total size of derived files (thumbnails), in bytes.')
+
+class FormatStatsModel(BaseModel):
+    ''' api model for per-format storage statistics '''
+
+    format: str = Field(description='The image format (file extension).')
+    image_count: int = Field(description='The number of images in this format.')
+    original_bytes: int = Field(description='Total size of the original image files in this format, in bytes.')
+
+class SlowQueryModel(BaseModel):
+    ''' api model for a slow statement fingerprint '''
+
+    fingerprint: str = Field(description='The normalized statement (whitespace and expanded IN lists collapsed).')
+    statement: str = Field(description='The statement text as first seen.')
+    parameters: str = Field(description='The types of the bound parameters as first seen (values are never recorded).')
+    count: int = Field(description='How often the statement ran past the threshold.')
+    total_time: float = Field(description='Total time spent in slow runs of the statement, in seconds.')
+    max_time: float = Field(description='Slowest run of the statement, in seconds.')
+    mean_time: float = Field(description='Mean time of the slow runs of the statement, in seconds.')
+    last_seen: datetime = Field(description='When the statement last ran past the threshold.')
+    routes: dict[str, int] = Field(description='Slow runs per originating route (up to ten, "background" for work outside a request).')
+    plan: Optional[list[dict]] = Field(description='The most recently sampled query plan, if any was captured.')
+    plan_captured_at: Optional[datetime] = Field(description='When the query plan was captured.')
+
 class PaginationModel(BaseModel):
     ''' api model for pagination information '''
 
@@ -240,6 +296,16 @@ class PaginationModel(BaseModel):
 
     total_records: int = Field(description='The number of records available in total.')
 
+class ReaderPositionModel(BaseModel):
+    ''' api model for an image's position within an album, plus the ids of the images around it '''
+
+    position: int = Field(description='The 1-based position of the image within the album.')
+    total_images: int = Field(description='The number of images in the album.')
+    first_id: Literal[False] | str = Field(description='Reference ID of the first image in the album.')
+    previous_id: Literal[False] | str = Field(description='Reference ID of the previous image in the album.')
+    next_id: Literal[False] | str = Field(description='Reference ID of the next image in the album.')
+    last_id: Literal[False] | str = Field(description='Reference ID of the last image in the album.')
+
 class AlbumResponseModel(BaseModel):
     ''' response model for Album-centric endpoints '''
     album: AlbumModel
@@ -276,6 +342,13 @@ class ImagesResponseModel(BaseModel):
     ''' response model for multi-Image-centric endpoints '''
     images: list[ImageModel]
 
+class ReaderResponseModel(BaseModel):
+    ''' response model for the reader endpoint; the album, the current image, its position and its neighbors '''
+    album: AlbumModel
+    image: ImageModel
+    position: ReaderPositionModel
+    neighbors: list[ImageModel]
+
 class AuthorResponseModel(BaseModel):
     ''' response model for multi-Author-centric endpoints '''
     author: AuthorModel
@@ -312,6 +385,19 @@ class PaginatedAuthorAliasesResponseModel(AuthorAliasesResponseModel):
     ''' response model for multi-AuthorAlias endpoints that also provides pagination information '''
     pagination: PaginationModel
 
+class StatsResponseModel(BaseModel):
+    ''' response model for statistics endpoints '''
+    stats: StatsModel
+
+class FullStatsResponseModel(StatsResponseModel):
+    ''' response model for statistics endpoints that also provide a per-format breakdown '''
+    formats: list[FormatStatsModel]
+
+class SlowQueriesResponseModel(BaseModel):
+    ''' response model for the slow query log endpoint '''
+    threshold: float
+    queries: list[SlowQueryModel]
+
 class OperationResultModel(BaseModel):
     ''' Response model for true/false operation results being returned by endpoints '''
     success: bool
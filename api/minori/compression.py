@@ -0,0 +1,202 @@
+''' response compression, negotiated against the client's Accept-Encoding (zstd, brotli or gzip) '''
+
+import zlib
+from typing import Callable, Optional, Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli and zstd are optional - when the modules aren't installed, those encodings are simply never offered
+try:
+    import brotli # type: ignore
+except ImportError: # pragma: no cover
+    brotli = None # pylint: disable=invalid-name
+
+try:
+    import zstandard # type: ignore
+except ImportError: # pragma: no cover
+    zstandard = None # pylint: disable=invalid-name
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    'application/json',
+    'text/',
+)
+
+class Compressor(Protocol):
+    ''' streaming compressor interface shared by all encodings '''
+
+    def compress(self, data: bytes) -> bytes:
+        ''' compress a chunk, returning whatever output is available so far '''
+
+    def finish(self) -> bytes:
+        ''' flush and finalize the compressed stream '''
+
+class GzipCompressor:
+    ''' gzip compressor (stdlib zlib, gzip container) '''
+
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        ''' compress a chunk '''
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        ''' finalize the stream '''
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliCompressor:
+    ''' brotli compressor (requires the brotli module) '''
+
+    def __init__(self, quality: int = 4):
+        self._compressor = brotli.Compressor(quality=quality) # type: ignore
+
+    def compress(self, data: bytes) -> bytes:
+        ''' compress a chunk '''
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        ''' finalize the stream '''
+        return self._compressor.finish()
+
+class ZstdCompressor:
+    ''' zstd compressor (requires the zstandard module) '''
+
+    def __init__(self, level: int = 3):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj() # type: ignore
+
+    def compress(self, data: bytes) -> bytes:
+        ''' compress a chunk '''
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        ''' finalize the stream '''
+        return self._compressor.flush()
+
+def available_encodings() -> dict[str, Callable[[], Compressor]]:
+    ''' Get the supported encodings, in order of server preference '''
+
+    encodings: dict[str, Callable[[], Compressor]] = {}
+    if zstandard is not None:
+        encodings['zstd'] = ZstdCompressor
+    if brotli is not None:
+        encodings['br'] = BrotliCompressor
+    encodings['gzip'] = GzipCompressor
+
+    return encodings
+
+def negotiate_encoding(accept_encoding: str, encodings: dict[str, Callable[[], Compressor]]) -> Optional[str]:
+    ''' Pick the best supported encoding the client accepts (q=0 excludes an encoding), or None '''
+
+    accepted: dict[str, float] = {}
+    for entry in accept_encoding.split(','):
+        coding, _, params = entry.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    candidates = [
+        (accepted.get(encoding, accepted.get('*', 0.0)), -i, encoding)
+        for i, encoding in enumerate(encodings)
+    ]
+    quality, _, encoding = max(candidates)
+
+    return encoding if quality > 0 else None
+
+class CompressionMiddleware:
+    ''' middleware that compresses compressible responses over a size threshold '''
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        ''' middleware init '''
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        ''' negotiates an encoding and wraps the response in a compressing responder '''
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate_encoding(Headers(scope=scope).get('Accept-Encoding', ''), self.encodings)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        responder = CompressionResponder(self.app, self.minimum_size, encoding, self.encodings[encoding])
+        await responder(scope, receive, send)
+
+class CompressionResponder: # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    ''' compresses a single response (buffers the start message until the first body chunk is seen) '''
+
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str, compressor_factory: Callable[[], Compressor]) -> None:
+        ''' responder init '''
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.compressor_factory = compressor_factory
+        self.compressor: Optional[Compressor] = None
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        ''' run the app with our compressing send '''
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        ''' compress the outgoing response body as appropriate '''
+        assert self.send is not None
+
+        if message['type'] == 'http.response.start':
+            # hold on to the start message until we know whether the body is getting compressed
+            self.initial_message = message
+            headers = Headers(raw=message['headers'])
+            content_type = headers.get('Content-Type', '')
+            self.passthrough = 'content-encoding' in headers or not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+            return
+
+        if message['type'] != 'http.response.body' or self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        body: bytes = message.get('body', b'')
+        more_body: bool = message.get('more_body', False)
+
+        if not self.started:
+            self.started = True
+
+            if len(body) < self.minimum_size and not more_body:
+                # not worth compressing
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            self.compressor = self.compressor_factory()
+            headers = MutableHeaders(raw=self.initial_message['headers'])
+            headers['Content-Encoding'] = self.encoding
+            headers.add_vary_header('Accept-Encoding')
+
+            if more_body:
+                del headers['Content-Length']
+                message['body'] = self.compressor.compress(body)
+            else:
+                message['body'] = self.compressor.compress(body) + self.compressor.finish()
+                headers['Content-Length'] = str(len(message['body']))
+
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        # remaining chunks of a streamed response
+        assert self.compressor is not None
+        message['body'] = self.compressor.compress(body) + (self.compressor.finish() if not more_body else b'')
+        await self.send(message)
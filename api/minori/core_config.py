@@ -10,6 +10,7 @@ CORS_DOMAINS_ALLOWED = os.environ.get('CORS_DOMAIN_ALLOW', '*').split(',')
 IMAGE_UPLOAD_PATH=Path(os.environ.get('IMAGE_UPLOAD_PATH', '/srv/images'))
 IMAGE_THUMBNAIL_PATH=Path(os.environ.get('IMAGE_THUMBNAIL_PATH', '/srv/thumbs'))
 IMAGE_THUMBNAIL_SIZE=int(os.environ.get('IMAGE_THUMBNAIL_SIZE', 500))
+IMAGE_THUMBNAIL_QUALITY=int(os.environ.get('IMAGE_THUMBNAIL_QUALITY', 75))
 ALLOWED_FILE_TYPES = (
     'png',
     'jpg',
@@ -18,3 +19,26 @@ ALLOWED_FILE_TYPES = (
     'webp',
 )
 TEMP_PATH = Path('/tmp')
+BATCH_MAX_IDS = int(os.environ.get('BATCH_MAX_IDS', 200))
+READER_MAX_WINDOW = int(os.environ.get('READER_MAX_WINDOW', 10))
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', 1024))
+IMAGE_ORDER_KEY_GAP = int(os.environ.get('IMAGE_ORDER_KEY_GAP', 1024))
+REAPER_INTERVAL = float(os.environ.get('REAPER_INTERVAL', 30))
+REAPER_BATCH_SIZE = int(os.environ.get('REAPER_BATCH_SIZE', 200))
+REAPER_CONCURRENCY = int(os.environ.get('REAPER_CONCURRENCY', 16))
+REAPER_MAX_BACKOFF = float(os.environ.get('REAPER_MAX_BACKOFF', 3600))
+# albums missing from the album_summary projection (e.g. right after the migration adding it) are summarized this many per transaction on start
+SUMMARY_BACKFILL_BATCH_SIZE = int(os.environ.get('SUMMARY_BACKFILL_BATCH_SIZE', 100))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+# log the timing breakdown of requests slower than this many seconds (0 to never log)
+SERVER_TIMING_LOG_THRESHOLD = float(os.environ.get('SERVER_TIMING_LOG_THRESHOLD', 0))
+# per-request statement tracking: log requests over these, and (in debug mode, by default) fail ones repeating a statement shape too often
+QUERY_COUNT_WARN_THRESHOLD = int(os.environ.get('QUERY_COUNT_WARN_THRESHOLD', 50))
+QUERY_TIME_WARN_THRESHOLD = float(os.environ.get('QUERY_TIME_WARN_THRESHOLD', 1))
+QUERY_REPEAT_LIMIT = int(os.environ.get('QUERY_REPEAT_LIMIT', 10))
+QUERY_REPEAT_RAISE = os.environ.get('QUERY_REPEAT_RAISE', os.environ.get('DEBUG_MODE', 'false')).lower() == 'true'
+# slow query log: statements taking at least this many seconds are logged and aggregated (0 to disable), a sample of them EXPLAINed
+SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.5))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+SLOW_QUERY_MAX_FINGERPRINTS = int(os.environ.get('SLOW_QUERY_MAX_FINGERPRINTS', 200))
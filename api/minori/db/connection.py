@@ -1,18 +1,42 @@
 ''' database connection management '''
 
 from contextlib import asynccontextmanager
+from itertools import cycle
 import os
-from typing import Annotated, Optional
+from pathlib import Path
+import time
+from typing import Annotated, Any, AsyncIterator, Iterator, Optional
 
 from fastapi import Depends, Request
-from sqlalchemy import inspect, Connection
+from sqlalchemy import event, inspect, Connection
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession as _AsyncSession
-from starlette.types import ASGIApp, Receive, Scope, Send
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from minori.db.models import Base
+from minori.metrics import TimedQueuePool
+import minori.db.summary # pylint: disable=unused-import # registers the album summary maintenance hooks
 from minori.util import get_env_secret
-
-class DbConnection:
+from minori.logger import logger
+
+MIGRATIONS_PATH = Path(__file__).resolve().parents[2] / 'migrations'
+
+# applied to every sqlite connection
+SQLITE_PRAGMAS = {
+    # readers and the writer no longer block each other
+    'journal_mode': 'WAL',
+    # in WAL mode this only risks the last commits on power loss (not corruption), and skips an fsync per commit
+    'synchronous': 'NORMAL',
+    # enforced like on mariadb
+    'foreign_keys': 'ON',
+    # 64 MiB page cache, temp tables and indexes in memory, and reads through a 256 MiB memory map
+    'cache_size': '-65536',
+    'temp_store': 'MEMORY',
+    'mmap_size': '268435456',
+}
+
+class DbConnection: # pylint: disable=too-many-instance-attributes
     ''' Database connection management '''
 
     def __init__(self):
@@ -20,14 +44,47 @@ class DbConnection:
 
         self.engine: Optional[AsyncEngine] = None
         self.session: Optional[async_sessionmaker[_AsyncSession]] = None
+        self.replica_engines: list[AsyncEngine] = []
+        self.replica_sessions: Optional[Iterator[async_sessionmaker[_AsyncSession]]] = None
+
+        # how long a client's reads stay on the primary after it writes something, to ride out replication lag
+        self.replica_sticky_seconds: float = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+        # whether to look for (and create a missing) schema on start; deployments migrating through alembic can skip the round trip
+        self.schema_check: bool = os.environ.get('DB_SCHEMA_CHECK', 'true').lower() == 'true'
+
+        # how long a sqlite connection waits for the write lock before giving up
+        self.sqlite_busy_timeout: float = float(os.environ.get('DB_SQLITE_BUSY_TIMEOUT', 30))
+
+        # embedded database for single-node deployments, in place of a mariadb server
+        if os.environ.get('DB_BACKEND', 'mariadb').lower() == 'sqlite':
+            self.connection_string: str = self._build_sqlite_connection_string(Path(os.environ.get('DB_SQLITE_PATH', '/srv/minori.db')))
+            self.replica_connection_strings = []
+            self.replica_isolation_level: str = 'SERIALIZABLE'
+            return
+
+        db_username = os.environ.get('DB_USERNAME', 'minori')
+        db_password = get_env_secret('DB_PASSWORD', '') # type: ignore
+        db_name = os.environ.get('DB_NAME', 'minori')
 
-        self.connection_string: str = self._build_connection_string(
-            db_username=os.environ.get('DB_USERNAME', 'minori'),
-            db_password=get_env_secret('DB_PASSWORD', ''), # type: ignore
+        self.connection_string = self._build_connection_string(
+            db_username=db_username,
+            db_password=db_password, # type: ignore
             db_host=os.environ.get('DB_HOST', 'localhost'),
-            db_name=os.environ.get('DB_NAME', 'minori')
+            db_name=db_name
         )
 
+        # optional read replicas (comma separated hosts) - safe (GET/HEAD) requests are spread across these
+        self.replica_connection_strings: list[str] = [
+            self._build_connection_string(
+                db_username=db_username,
+                db_password=db_password, # type: ignore
+                db_host=db_host.strip(),
+                db_name=db_name
+            ) for db_host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if db_host.strip()
+        ]
+        self.replica_isolation_level = os.environ.get('DB_REPLICA_ISOLATION_LEVEL', 'READ COMMITTED')
+
     def _build_connection_string(self, db_username: str, db_password: str, db_host: str, db_name: str) -> str:
         ''' Build a connection string for a MySQL / MariaDB instance'''
 
@@ -37,6 +94,11 @@ class DbConnection:
 
         return f'{dialect}+{driver}://{db_username}:{db_password}@{db_host}/{db_name}?charset={charset}'
 
+    def _build_sqlite_connection_string(self, db_path: Path) -> str:
+        ''' Build a connection string for a SQLite database file '''
+
+        return f'sqlite+aiosqlite:///{db_path}'
+
     def check_if_created(self, conn: Connection) -> bool:
         ''' Check if the database been initially created (at the very least) '''
 
@@ -51,40 +113,154 @@ class DbConnection:
 
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all, checkfirst=True)
+            await conn.run_sync(self.stamp_head)
+
+    def stamp_head(self, conn: Connection) -> None:
+        ''' Mark a freshly created schema as up to date with the newest migration, so alembic doesn't replay the history over it (synchronous) '''
+
+        if not MIGRATIONS_PATH.is_dir():
+            logger.warning(f'Migrations not found at {MIGRATIONS_PATH}, the new schema is unversioned; run "alembic stamp head" before migrating it')
+            return
+
+        # only needed when creating a database, so kept out of startup
+        from alembic.runtime.migration import MigrationContext # pylint: disable=import-outside-toplevel
+        from alembic.script import ScriptDirectory # pylint: disable=import-outside-toplevel
+
+        MigrationContext.configure(conn).stamp(ScriptDirectory(str(MIGRATIONS_PATH)), 'head')
 
     async def start(self) -> async_sessionmaker[_AsyncSession]:
         ''' Start the DB connection for the application '''
 
+        pool_options: dict[str, Any] = {}
+        if self.connection_string.startswith('sqlite'):
+            # sqlite allows a single writer anyway; queueing for it in the pool hands it over the moment it's released,
+            # where sqlite's own busy handler polls with sleeps (the busy timeout still covers other processes, like the cli tools)
+            pool_options = {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': self.sqlite_busy_timeout}
+
         self.engine = create_async_engine(
             self.connection_string,
             # echo=True,
             future=True,
+            poolclass=TimedQueuePool,
             pool_recycle=3600,
-            pool_pre_ping=True
+            pool_pre_ping=True,
+            **pool_options
         )
+        if self.engine.dialect.name == 'sqlite':
+            self._setup_sqlite(self.engine, writer=True)
 
-        async with self.engine.connect() as conn:
-            created = await conn.run_sync(self.check_if_created)
+        if self.schema_check:
+            async with self.engine.connect() as conn:
+                created = await conn.run_sync(self.check_if_created)
 
-        if not created:
-            await self.create_all()
+            if not created:
+                await self.create_all()
 
         self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False) # pylint: disable=invalid-name
 
+        replica_sessions: list[async_sessionmaker[_AsyncSession]] = []
+        for connection_string in self.replica_connection_strings:
+            replica_engine = create_async_engine(
+                connection_string,
+                future=True,
+                poolclass=TimedQueuePool,
+                pool_recycle=3600,
+                pool_pre_ping=True,
+                isolation_level=self.replica_isolation_level
+            )
+            replica_engine.sync_engine.pool.metrics_name = f'replica{len(self.replica_engines)}' # type: ignore
+            if replica_engine.dialect.name in ('mysql', 'mariadb'):
+                event.listen(replica_engine.sync_engine, 'connect', self._set_read_only)
+
+            self.replica_engines.append(replica_engine)
+            replica_sessions.append(async_sessionmaker(bind=replica_engine, expire_on_commit=False, info={'read_only': True}))
+
+        if self.engine.dialect.name == 'sqlite' and self.engine.url.database not in (None, '', ':memory:'):
+            # a separate pool of reader connections on the same file stands in for the replicas: reads never wait on the
+            # writer, and see its commits immediately (so there's no lag for clients to stick to the primary over)
+            reader_engine = create_async_engine(
+                self.engine.url,
+                future=True,
+                poolclass=TimedQueuePool,
+                pool_recycle=3600,
+                pool_pre_ping=True
+            )
+            reader_engine.sync_engine.pool.metrics_name = 'reader' # type: ignore
+            self._setup_sqlite(reader_engine, writer=False)
+
+            self.replica_engines.append(reader_engine)
+            replica_sessions.append(async_sessionmaker(bind=reader_engine, expire_on_commit=False, info={'read_only': True}))
+            self.replica_sticky_seconds = 0
+
+        if replica_sessions:
+            self.replica_sessions = cycle(replica_sessions)
+
         return self.session
 
-    @asynccontextmanager
-    async def get_session(self):
-        ''' Gets a new database session for use (made for the db injector middleware) '''
+    def _setup_sqlite(self, engine: AsyncEngine, writer: bool) -> None:
+        ''' Tune the connections of a sqlite engine, and have writers take the write lock as their transaction begins '''
+
+        pragmas = {**SQLITE_PRAGMAS, 'busy_timeout': str(int(self.sqlite_busy_timeout * 1000))}
+        if not writer:
+            pragmas['query_only'] = 'ON'
+
+        def on_connect(dbapi_connection: Any, connection_record: Any) -> None: # pylint: disable=unused-argument
+            # leave transactions to the begin hook below, rather than the driver's own implicit (and partial) handling
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+            cursor.close()
+
+        def on_begin(conn: Connection) -> None:
+            # a deferred transaction that reads before writing can't wait for the write lock (it fails with SQLITE_BUSY
+            # when another writer got in first), so writers queue for it up front, within the busy timeout
+            conn.exec_driver_sql('BEGIN IMMEDIATE' if writer else 'BEGIN')
+
+        event.listen(engine.sync_engine, 'connect', on_connect)
+        event.listen(engine.sync_engine, 'begin', on_begin)
+
+    @staticmethod
+    def _set_read_only(dbapi_connection: Any, connection_record: Any) -> None: # pylint: disable=unused-argument
+        ''' Make every transaction on a new replica connection read-only '''
+
+        cursor = dbapi_connection.cursor()
+        cursor.execute('SET SESSION TRANSACTION READ ONLY')
+        cursor.close()
+
+    @property
+    def has_replicas(self) -> bool:
+        ''' Whether any read replicas (or sqlite reader connections) are configured and started '''
+
+        return self.replica_sessions is not None
+
+    def primary_sticky_until(self) -> float:
+        ''' Get the time until which a client that just wrote something should keep reading from the primary '''
+
+        return time.time() + self.replica_sticky_seconds
+
+    def _pick_session_factory(self, read_only: bool = False) -> async_sessionmaker[_AsyncSession]:
+        ''' Pick the primary's session factory, or the next replica's (round robin) if read_only and any are available '''
         if not self.session:
             raise RuntimeError('Engine not yet started, cannot retrieve session.')
 
-        async with self.session() as session:
+        return next(self.replica_sessions) if read_only and self.replica_sessions is not None else self.session
+
+    @asynccontextmanager
+    async def get_session(self, read_only: bool = False):
+        ''' Gets a new database session for use (made for the per-request session dependency), from a replica if read_only and available '''
+        session_factory = self._pick_session_factory(read_only)
+        async with session_factory() as session:
             yield session
 
     async def stop(self):
         ''' Stop the DB connection '''
 
+        for replica_engine in self.replica_engines:
+            await replica_engine.dispose(close=True)
+        self.replica_engines = []
+        self.replica_sessions = None
+
         if not self.engine:
             return
 
@@ -92,30 +268,64 @@ class DbConnection:
         self.engine = None
         self.session = None
 
+@event.listens_for(Session, 'before_flush')
+def _reject_replica_writes(session: Session, flush_context: Any, instances: Any) -> None: # pylint: disable=unused-argument
+    ''' Refuse to flush changes through a read replica session '''
+
+    if session.info.get('read_only') and (session.new or session.dirty or session.deleted):
+        raise RuntimeError('Attempted to write through a read-only replica session.')
+
 class AsyncSessionDbInjectorMiddleware:
-    ''' middleware that injects the db session into the request state '''
-    _ASYNC_SESSION_REQUEST_STATE_KEY = 'dbsession'
+    ''' middleware that picks the database a request's session will use (routing safe requests to read replicas, when configured) '''
+    _READ_ONLY_REQUEST_STATE_KEY = 'db_read_only'
+    PRIMARY_STICKY_HEADER = 'X-Minori-Primary-Until'
+    READ_ONLY_METHODS = ('GET', 'HEAD')
 
     def __init__(self, app: ASGIApp) -> None:
         ''' middleware init '''
         self.app = app
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        ''' injects a db session into the request state '''
+        ''' records the routing decision in the request state; the session itself is only opened by handlers that ask for one '''
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
 
-        async with dbconn.get_session() as session:
-            request = Request(scope=scope, receive=receive, send=send)
-            setattr(request.state, self._ASYNC_SESSION_REQUEST_STATE_KEY, session)
+        read_only = False
+        if dbconn.has_replicas:
+            if scope['method'] in self.READ_ONLY_METHODS:
+                read_only = not self.is_sticky(Headers(scope=scope))
+            elif scope['method'] != 'OPTIONS' and dbconn.replica_sticky_seconds > 0:
+                send = self.mark_sticky(send)
+
+        request = Request(scope=scope, receive=receive, send=send)
+        setattr(request.state, self._READ_ONLY_REQUEST_STATE_KEY, read_only)
 
-            await self.app(scope, receive, send)
+        await self.app(scope, receive, send)
+
+    def is_sticky(self, headers: Headers) -> bool:
+        ''' Whether the client wrote something recently enough that it must read from the primary (read-your-writes) '''
+        try:
+            return float(headers.get(self.PRIMARY_STICKY_HEADER, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def mark_sticky(self, send: Send) -> Send:
+        ''' Wrap send, telling the client how long to keep its reads on the primary (echoed back in the same header) '''
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                headers[self.PRIMARY_STICKY_HEADER] = f'{dbconn.primary_sticky_until():.3f}'
+            await send(message)
+
+        return send_wrapper
 
 class AsyncSessionDependency:
     ''' async session dependency injector '''
-    def __call__(self, request: Request) -> _AsyncSession:
-        ''' retrieve the async session from request state '''
-        return getattr(request.state, AsyncSessionDbInjectorMiddleware._ASYNC_SESSION_REQUEST_STATE_KEY)
+    async def __call__(self, request: Request) -> AsyncIterator[_AsyncSession]:
+        ''' open a session for the request on first use, closing it once the handler is done (before any response body streams) '''
+        read_only = getattr(request.state, AsyncSessionDbInjectorMiddleware._READ_ONLY_REQUEST_STATE_KEY, False)
+        async with dbconn.get_session(read_only=read_only) as session:
+            yield session
 
 dbconn = DbConnection()
 _async_session_dep = AsyncSessionDependency() # pylint: disable=invalid-name
@@ -3,16 +3,21 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
-import shortuuid
 from sqlalchemy import MetaData
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Table
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Table, Text
 from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
 import minori.api_models as models
 
+def generate_uuid() -> str:
+    ''' Generate a new public id (shortuuid is imported on first use, keeping it out of the migration job) '''
+
+    import shortuuid # pylint: disable=import-outside-toplevel
+    return shortuuid.uuid()
+
 class Base(AsyncAttrs, DeclarativeBase):
     ''' base class for tables '''
 
@@ -42,15 +47,15 @@ class Author(Base):
     __tablename__ = 'author'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    uuid: Mapped[str] = mapped_column(String(32), default=lambda : shortuuid.uuid(), unique=True) # pylint: disable=unnecessary-lambda
+    uuid: Mapped[str] = mapped_column(String(32), default=generate_uuid, unique=True)
     name: Mapped[str] = mapped_column(String(128), nullable=False, unique=True)
 
     author_aliases: Mapped[list['AuthorAlias']] = relationship(back_populates='author', foreign_keys='AuthorAlias.author_id')
 
     def to_model(self) -> models.AuthorModel:
-        ''' Convert DB object to API model '''
+        ''' Convert DB object to API model (values come straight from the DB, so pydantic validation is skipped) '''
 
-        return models.AuthorModel(
+        return models.AuthorModel.model_construct(
             id=self.uuid,
             name=self.name
         )
@@ -58,7 +63,7 @@ class Author(Base):
     def to_full_model(self) -> models.FullAuthorModel:
         ''' Convert DB object to API model '''
 
-        return models.FullAuthorModel(
+        return models.FullAuthorModel.model_construct(
             id=self.uuid,
             name=self.name,
             author_aliases=[author_alias.to_model() for author_alias in self.author_aliases]
@@ -70,7 +75,7 @@ class AuthorAlias(Base):
     __tablename__ = 'authoralias'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    uuid: Mapped[str] = mapped_column(String(32), default=lambda : shortuuid.uuid(), unique=True) # pylint: disable=unnecessary-lambda
+    uuid: Mapped[str] = mapped_column(String(32), default=generate_uuid, unique=True)
     name: Mapped[str] = mapped_column(String(128), nullable=False, unique=True)
     author_id: Mapped[int] = mapped_column(ForeignKey('author.id'), nullable=False)
 
@@ -80,7 +85,7 @@ class AuthorAlias(Base):
     def to_model(self) -> models.AuthorAliasModel:
         ''' Convert DB object to API model '''
 
-        return models.AuthorAliasModel(
+        return models.AuthorAliasModel.model_construct(
             id=self.uuid,
             name=self.name
         )
@@ -88,7 +93,7 @@ class AuthorAlias(Base):
     def to_full_model(self) -> models.FullAuthorAliasModel:
         ''' Convert DB object to API model '''
 
-        return models.FullAuthorAliasModel(
+        return models.FullAuthorAliasModel.model_construct(
             id=self.uuid,
             name=self.name,
             author=self.author.to_model() if self.author is not None else None
@@ -98,9 +103,13 @@ class Album(Base):
     ''' DB model for Album elements '''
 
     __tablename__ = 'album'
+    __table_args__ = (
+        Index('ix_album_disabled_created_at', 'disabled', 'created_at'),
+        Base.__table_args__
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    uuid: Mapped[str] = mapped_column(String(32), default=lambda : shortuuid.uuid(), unique=True) # pylint: disable=unnecessary-lambda
+    uuid: Mapped[str] = mapped_column(String(32), default=generate_uuid, unique=True)
     disabled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
 
     title: Mapped[str] = mapped_column(String(256), nullable=False, default='Untitled album')
@@ -125,7 +134,7 @@ class Album(Base):
     def to_model(self, include_author_alias = False) -> models.AlbumModel:
         ''' Convert DB object to API model '''
 
-        return models.AlbumModel(
+        return models.AlbumModel.model_construct(
             id=self.uuid,
             disabled=self.disabled,
             title=self.title,
@@ -138,7 +147,7 @@ class Album(Base):
     def to_full_model(self) -> models.FullAlbumModel:
         ''' Convert DB object to API model (including cover entry and tags) '''
 
-        return models.FullAlbumModel(
+        return models.FullAlbumModel.model_construct(
             id=self.uuid,
             disabled=self.disabled,
             title=self.title,
@@ -154,11 +163,18 @@ class Image(Base):
     ''' DB model for Image elements '''
 
     __tablename__ = 'image'
+    __table_args__ = (
+        Index('ix_image_album_id_album_order_key_original_filename', 'album_id', 'album_order_key', 'original_filename'),
+        Index('ix_image_filename', 'filename'),
+        Base.__table_args__
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    uuid: Mapped[str] = mapped_column(String(32), default=lambda : shortuuid.uuid(), unique=True) # pylint: disable=unnecessary-lambda
-    filename: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
-    original_filename: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
+    uuid: Mapped[str] = mapped_column(String(32), default=generate_uuid, unique=True)
+    # generated as '<shard>/<decoded uuid>.<format>' (well under 64 characters); indexed for the storage reconciler's ordered walk
+    filename: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # a single path component, so 255 is plenty - and keeps the column indexable in full (utf8mb4 keys cap out at 3072 bytes)
+    original_filename: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
 
     uploaded: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
 
@@ -168,11 +184,26 @@ class Image(Base):
     album_id: Mapped[int] = mapped_column(ForeignKey('album.id'))
     album: Mapped['Album'] = relationship(back_populates='images', foreign_keys=[album_id])
     album_order_key: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    file_format: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    file_size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    thumbnail_size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # what the thumbnail was built with and from, so rebuilds can skip the ones that are still current
+    thumbnail_signature: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    thumbnail_source_mtime: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    thumbnail_source_size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+
+    def set_thumbnail_state(self, state: dict[str, Any]) -> None:
+        ''' Record a freshly rendered thumbnail (as returned by util.save_thumbnail / util.get_thumbnail_state) '''
+
+        self.thumbnail_size = state['thumbnail_size']
+        self.thumbnail_signature = state['thumbnail_signature']
+        self.thumbnail_source_mtime = state['thumbnail_source_mtime']
+        self.thumbnail_source_size = state['thumbnail_source_size']
 
     def to_model(self) -> models.ImageModel:
         ''' Convert object to dict representation (for API serialization) '''
 
-        return models.ImageModel(
+        return models.ImageModel.model_construct(
             id=self.uuid,
             filename=self.filename,
             original_filename=self.original_filename,
@@ -190,7 +221,7 @@ class Tag(Base):
     __tablename__ = 'tag'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    uuid: Mapped[str] = mapped_column(String(32), default=lambda : shortuuid.uuid(), unique=True) # pylint: disable=unnecessary-lambda
+    uuid: Mapped[str] = mapped_column(String(32), default=generate_uuid, unique=True)
 
     namespace: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
     name: Mapped[str] = mapped_column(String(128), nullable=False)
@@ -204,7 +235,7 @@ class Tag(Base):
     def to_model(self) -> models.TagModel:
         ''' Convert DB object to API model '''
 
-        return models.TagModel(
+        return models.TagModel.model_construct(
             id=self.uuid,
             namespace=self.namespace,
             name=self.name
@@ -214,3 +245,76 @@ class Tag(Base):
         ''' Converts tag to string form '''
 
         return f'{self.namespace}:{self.name}' if self.namespace else self.name
+
+class AlbumSummary(Base):
+    ''' DB model for the denormalized album listing projection (maintained by minori.db.summary, never written directly) '''
+
+    __tablename__ = 'album_summary'
+    __table_args__ = (
+        Index('ix_album_summary_album_uuid', 'album_uuid', unique=True),
+        Index('ix_album_summary_created_at', 'created_at'),
+        Index('ix_album_summary_disabled_created_at', 'disabled', 'created_at'),
+        Index('ix_album_summary_author_id_disabled_created_at', 'author_id', 'disabled', 'created_at'),
+        Base.__table_args__
+    )
+
+    album_id: Mapped[int] = mapped_column(ForeignKey('album.id', ondelete='CASCADE'), primary_key=True)
+    album_uuid: Mapped[str] = mapped_column(String(32), nullable=False)
+    disabled: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    title: Mapped[str] = mapped_column(String(256), nullable=False)
+    author_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    author_name: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    cover_filename: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
+    tags: Mapped[str] = mapped_column(Text, nullable=False, default='[]')
+
+    image_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    derivative_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    formats: Mapped[str] = mapped_column(Text, nullable=False, default='{}')
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    # the pre-rendered FullAlbumModel json, spliced directly into listing responses
+    album_json: Mapped[str] = mapped_column(Text, nullable=False)
+
+class StatAggregate(Base):
+    ''' DB model for incrementally maintained library statistics (maintained by minori.db.stats, never written directly) '''
+
+    __tablename__ = 'stat_aggregate'
+
+    # scope is 'author' (keyed by author id); the library and per-format totals are summed from album_summary when read
+    scope: Mapped[str] = mapped_column(String(16), primary_key=True)
+    scope_key: Mapped[str] = mapped_column(String(32), primary_key=True)
+
+    album_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    image_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    original_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    derivative_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    def to_model(self) -> models.StatsModel:
+        ''' Convert DB object to API model '''
+
+        return models.StatsModel.model_construct(
+            album_count=self.album_count,
+            image_count=self.image_count,
+            original_bytes=self.original_bytes,
+            derivative_bytes=self.derivative_bytes
+        )
+
+class FileTombstone(Base):
+    ''' DB model for stored image files whose rows are gone, awaiting removal from disk (by minori.reaper) '''
+
+    __tablename__ = 'file_tombstone'
+    __table_args__ = (
+        Index('ix_file_tombstone_next_attempt_at', 'next_attempt_at'),
+        Base.__table_args__
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # relative to both the upload and thumbnail paths, like Image.filename
+    filename: Mapped[str] = mapped_column(String(1024), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
@@ -0,0 +1,107 @@
+''' per-request SQL statement counting, flagging heavy requests and repeated statement shapes (N+1 queries) '''
+
+from collections import Counter
+from contextvars import ContextVar
+import re
+from typing import Any, Optional
+
+from sqlalchemy.engine import Connection
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from minori.core_config import QUERY_COUNT_WARN_THRESHOLD, QUERY_REPEAT_LIMIT, QUERY_REPEAT_RAISE, QUERY_TIME_WARN_THRESHOLD
+from minori.db.statement_timing import on_statement_finished, on_statement_started
+from minori.logger import logger
+
+# expanded IN lists vary in length with their input, but are the same statement shape
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+class RepeatedQueryError(RuntimeError):
+    ''' raised (in debug/test mode) when one request runs the same statement shape too often - usually a missed eager load '''
+
+def statement_shape(statement: str) -> str:
+    ''' Normalize a statement to its shape, collapsing whitespace and expanded IN lists '''
+
+    return _IN_LIST.sub('(?...)', _WHITESPACE.sub(' ', statement).strip())
+
+class RequestQueries:
+    ''' statements run on behalf of one request '''
+
+    def __init__(self, scope: Scope) -> None:
+        ''' Constructor '''
+
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str) -> None:
+        ''' Count a statement about to run, raising once its shape passes the repeat limit (when enabled) '''
+
+        self.count += 1
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+
+        if QUERY_REPEAT_RAISE and self.shapes[shape] > QUERY_REPEAT_LIMIT:
+            raise RepeatedQueryError(f'Statement ran more than {QUERY_REPEAT_LIMIT} times in one request (N+1 queries?): {shape}')
+
+    def repeated(self) -> list[tuple[str, int]]:
+        ''' Get the statement shapes run more often than the repeat limit, most repeated first '''
+
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > QUERY_REPEAT_LIMIT]
+
+    @property
+    def route(self) -> str:
+        ''' The route template handling the request (its raw path until routing has happened) '''
+
+        return getattr(self.scope.get('route'), 'path', self.scope['path'])
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar('request_queries', default=None)
+
+def current_route() -> Optional[str]:
+    ''' Get the route of the request being handled, if any '''
+
+    queries = _request_queries.get()
+    return f'{queries.scope["method"]} {queries.route}' if queries is not None else None
+
+@on_statement_started
+def _count_statement(conn: Connection, statement: str, parameters: Any, executemany: bool) -> None: # pylint: disable=unused-argument
+    ''' Count a statement against the current request '''
+
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.record(statement)
+
+@on_statement_finished
+def _time_statement(conn: Connection, statement: str, parameters: Any, executemany: bool, duration: float) -> None: # pylint: disable=unused-argument
+    ''' Add a statement's duration to the current request's total '''
+
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.duration += duration
+
+class QueryCountMiddleware:
+    ''' middleware that counts each request's SQL statements, logging requests over the thresholds '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        ''' middleware init '''
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        ''' count statements for the duration of the request '''
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        queries = RequestQueries(scope)
+        token = _request_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+
+            repeated = queries.repeated()
+            if queries.count > QUERY_COUNT_WARN_THRESHOLD or queries.duration > QUERY_TIME_WARN_THRESHOLD or repeated:
+                message = f'{scope["method"]} {queries.route} ran {queries.count} statements in {queries.duration * 1000:.1f}ms'
+                for shape, count in repeated:
+                    message += f'\n  {count}x {shape}'
+                logger.warning(message)
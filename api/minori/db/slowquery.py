@@ -0,0 +1,169 @@
+''' slow query log - statements over a threshold are logged and aggregated by fingerprint, with sampled EXPLAIN plans '''
+
+import asyncio
+from collections import Counter
+from datetime import datetime
+import random
+from typing import Any, Optional
+
+from sqlalchemy.engine import Connection, Engine
+
+import minori.api_models as models
+from minori.core_config import SLOW_QUERY_EXPLAIN_SAMPLE_RATE, SLOW_QUERY_MAX_FINGERPRINTS, SLOW_QUERY_THRESHOLD
+from minori.db.querycount import current_route, statement_shape
+from minori.db.statement_timing import on_statement_finished
+from minori.logger import logger
+
+# only reads are explained; EXPLAIN of a write is harmless on mariadb, but not worth the risk elsewhere
+EXPLAINABLE = ('SELECT', 'WITH')
+
+def parameter_shape(parameters: Any) -> str:
+    ''' Describe bound parameters by type only, so that no values end up in logs or the admin endpoint '''
+
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+class SlowQuery: # pylint: disable=too-many-instance-attributes
+    ''' aggregated occurrences of one statement fingerprint '''
+
+    def __init__(self, fingerprint: str, statement: str, parameters: str) -> None:
+        ''' Constructor '''
+
+        self.fingerprint = fingerprint
+        self.statement = statement
+        self.parameters = parameters
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_seen = datetime.now()
+        self.routes: Counter[str] = Counter()
+        self.plan: Optional[list[dict[str, Any]]] = None
+        self.plan_captured_at: Optional[datetime] = None
+
+    def to_model(self) -> models.SlowQueryModel:
+        ''' Convert object to dict representation (for API serialization) '''
+
+        return models.SlowQueryModel(
+            fingerprint=self.fingerprint,
+            statement=self.statement,
+            parameters=self.parameters,
+            count=self.count,
+            total_time=self.total_time,
+            max_time=self.max_time,
+            mean_time=self.total_time / self.count if self.count else 0,
+            last_seen=self.last_seen,
+            routes=dict(self.routes.most_common(10)),
+            plan=self.plan,
+            plan_captured_at=self.plan_captured_at
+        )
+
+class SlowQueryLog:
+    ''' records slow statements through engine events; EXPLAINs sampled ones on a separate connection in the background '''
+
+    def __init__(self) -> None:
+        ''' Constructor '''
+
+        self.queries: dict[str, SlowQuery] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.pending: asyncio.Queue[tuple[Engine, str, Any, SlowQuery]] = asyncio.Queue(maxsize=100)
+
+    def start(self) -> None:
+        ''' Start explaining sampled statements in the background '''
+
+        self.pending = asyncio.Queue(maxsize=100)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        ''' Stop explaining statements '''
+
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def reset(self) -> None:
+        ''' Forget everything recorded so far '''
+
+        self.queries.clear()
+
+    def record(self, engine: Engine, statement: str, parameters: Any, executemany: bool, duration: float) -> None:
+        ''' Record a statement that took longer than the threshold '''
+
+        if statement.lstrip().upper().startswith('EXPLAIN'):
+            # our own sampled plans
+            return
+
+        fingerprint = statement_shape(statement)
+        route = current_route() or 'background'
+        shape = 'executemany' if executemany else parameter_shape(parameters)
+
+        query = self.queries.get(fingerprint)
+        if query is None:
+            if len(self.queries) >= SLOW_QUERY_MAX_FINGERPRINTS:
+                # make room by dropping whatever has cost the least overall
+                del self.queries[min(self.queries.values(), key=lambda query: query.total_time).fingerprint]
+            query = self.queries[fingerprint] = SlowQuery(fingerprint, statement, shape)
+
+        query.count += 1
+        query.total_time += duration
+        query.max_time = max(query.max_time, duration)
+        query.last_seen = datetime.now()
+        query.routes[route] += 1
+
+        logger.warning(f'Slow query ({duration * 1000:.1f}ms) on {route}: {fingerprint} {shape}')
+
+        sampled = query.plan is None or random.random() < SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+        if sampled and self.task is not None and not executemany and statement.lstrip().upper().startswith(EXPLAINABLE):
+            try:
+                self.pending.put_nowait((engine, statement, parameters, query))
+            except asyncio.QueueFull:
+                pass
+
+    async def run(self) -> None:
+        ''' Explain queued statements until cancelled '''
+
+        from minori.db.connection import dbconn # pylint: disable=import-outside-toplevel,cyclic-import
+
+        while True:
+            engine, statement, parameters, query = await self.pending.get()
+            # explain on whichever engine (primary or replica) actually ran the statement
+            async_engine = next(
+                (candidate for candidate in (dbconn.engine, *dbconn.replica_engines) if candidate is not None and candidate.sync_engine is engine),
+                None
+            )
+            if async_engine is None:
+                continue
+
+            try:
+                async with async_engine.connect() as conn:
+                    prefix = 'EXPLAIN QUERY PLAN' if conn.dialect.name == 'sqlite' else 'EXPLAIN'
+                    result = await conn.exec_driver_sql(f'{prefix} {statement}', parameters)
+                    query.plan = [dict(row) for row in result.mappings()]
+                    query.plan_captured_at = datetime.now()
+            except Exception as err: # pylint: disable=broad-except
+                logger.warning(f'Failed to explain slow query {query.fingerprint}: {err}')
+
+    def to_model(self) -> models.SlowQueriesResponseModel:
+        ''' Convert the log to its dict representation, most costly fingerprints first (for API serialization) '''
+
+        return models.SlowQueriesResponseModel(
+            threshold=SLOW_QUERY_THRESHOLD,
+            queries=[query.to_model() for query in sorted(self.queries.values(), key=lambda query: query.total_time, reverse=True)]
+        )
+
+slow_query_log = SlowQueryLog()
+
+@on_statement_finished
+def _check_statement_time(conn: Connection, statement: str, parameters: Any, executemany: bool, duration: float) -> None:
+    ''' Record the statement if it ran past the threshold '''
+
+    if 0 < SLOW_QUERY_THRESHOLD <= duration:
+        slow_query_log.record(conn.engine, statement, parameters, executemany, duration)
@@ -0,0 +1,50 @@
+''' the one timer around every SQL statement, shared by the server timing breakdown, query counting and the slow query log '''
+
+import time
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+# called with (conn, statement, parameters, executemany) before a statement is sent
+StatementStartedHook = Callable[[Connection, str, Any, bool], None]
+# called with (conn, statement, parameters, executemany, duration) once it has run
+StatementFinishedHook = Callable[[Connection, str, Any, bool, float], None]
+
+_started_hooks: list[StatementStartedHook] = []
+_finished_hooks: list[StatementFinishedHook] = []
+
+def on_statement_started(hook: StatementStartedHook) -> StatementStartedHook:
+    ''' Register a function to call before each statement is sent (decorator) '''
+
+    _started_hooks.append(hook)
+    return hook
+
+def on_statement_finished(hook: StatementFinishedHook) -> StatementFinishedHook:
+    ''' Register a function to call with each statement's duration once it has run (decorator) '''
+
+    _finished_hooks.append(hook)
+    return hook
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None: # pylint: disable=unused-argument,too-many-arguments,too-many-positional-arguments
+    ''' Note when a statement was sent '''
+
+    for hook in _started_hooks:
+        hook(conn, statement, parameters, executemany)
+
+    # stamped after the hooks, so that their own work isn't billed to the statement
+    if context is not None:
+        context.minori_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_statement(conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None: # pylint: disable=unused-argument,too-many-arguments,too-many-positional-arguments
+    ''' Hand the statement's duration to everything keeping track of it '''
+
+    started = getattr(context, 'minori_started', None)
+    if started is None:
+        return
+
+    duration = time.perf_counter() - started
+    for hook in _finished_hooks:
+        hook(conn, statement, parameters, executemany, duration)
@@ -0,0 +1,109 @@
+''' incremental maintenance of the library statistics aggregates '''
+# pylint: disable=singleton-comparison
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Iterable
+
+from sqlalchemy import Insert, delete, insert, or_, select, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from minori.core_config import IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH
+from minori.db.models import Image, StatAggregate
+from minori.util import image_format
+
+SCOPE_AUTHOR = 'author'
+
+_COUNTERS = ('album_count', 'image_count', 'original_bytes', 'derivative_bytes')
+
+def _contributions(summary_rows: Iterable[dict[str, Any]]) -> dict[tuple[str, str], dict[str, int]]:
+    ''' Sum up what a set of album_summary rows contribute to each aggregate '''
+
+    totals: dict[tuple[str, str], dict[str, int]] = defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+    for row in summary_rows:
+        album_counters = {
+            'album_count': 1,
+            'image_count': row['image_count'],
+            'original_bytes': row['total_bytes'],
+            'derivative_bytes': row['derivative_bytes']
+        }
+
+        # no library-wide or per-format aggregates: every write would queue on their rows, so those totals are summed
+        # from album_summary when read
+        if row['author_id'] is not None:
+            for counter, value in album_counters.items():
+                totals[(SCOPE_AUTHOR, str(row['author_id']))][counter] += value
+
+    return totals
+
+def _upsert(session: Session, values: dict[str, Any]) -> Insert:
+    ''' An insert of an aggregate row that adds its counters to the existing row instead, when there is one '''
+
+    table = StatAggregate.__table__
+    if session.get_bind().dialect.name == 'sqlite':
+        stmt = sqlite.insert(table).values(values)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.scope_key],
+            set_={counter: table.c[counter] + stmt.excluded[counter] for counter in _COUNTERS}
+        )
+
+    stmt = mysql.insert(table).values(values)
+    return stmt.on_duplicate_key_update({counter: table.c[counter] + stmt.inserted[counter] for counter in _COUNTERS})
+
+def apply_album_summary_changes(session: Session, old_rows: list[dict[str, Any]], new_rows: list[dict[str, Any]]) -> None:
+    ''' Move the aggregates by the difference between the old and new summaries of some albums (synchronous) '''
+
+    old = _contributions(old_rows)
+    new = _contributions(new_rows)
+
+    for scope, scope_key in set(old) | set(new):
+        deltas = {counter: new[(scope, scope_key)][counter] - old[(scope, scope_key)][counter] for counter in _COUNTERS}
+        if not any(deltas.values()):
+            continue
+
+        # relative upserts, so concurrent transactions touching (or creating) the same aggregate don't clobber or collide with each other
+        session.execute(_upsert(session, {'scope': scope, 'scope_key': scope_key, **deltas}))
+
+def reset_stats(session: Session, summary_rows: list[dict[str, Any]]) -> None:
+    ''' Replace every aggregate with totals computed from a complete set of album_summary rows (synchronous) '''
+
+    table = StatAggregate.__table__
+    session.execute(delete(table))
+
+    rows = [
+        {'scope': scope, 'scope_key': scope_key, **counters}
+        for (scope, scope_key), counters in _contributions(summary_rows).items()
+    ]
+    if rows:
+        session.execute(insert(table), rows)
+
+async def backfill_image_file_stats(db: AsyncSession) -> int:
+    ''' Fill in the format and file sizes of uploaded images that predate their tracking, returning the number of images updated '''
+
+    # this module is loaded with the db layer (migration job included), while this is only needed for the occasional backfill
+    import aiofiles.os as aio_os # pylint: disable=import-outside-toplevel
+
+    stmt = select(Image.id, Image.filename).where(
+        Image.uploaded == True,
+        Image.filename != None,
+        or_(Image.file_format == None, Image.file_size == None, Image.thumbnail_size == None)
+    )
+    missing = (await db.execute(stmt)).all()
+
+    file_stats: list[dict[str, Any]] = []
+    for image_id, filename in missing:
+        image_file: Path = IMAGE_UPLOAD_PATH / filename
+        thumbnail_file: Path = IMAGE_THUMBNAIL_PATH / filename
+        file_stats.append({
+            'id': image_id,
+            'file_format': image_format(filename),
+            'file_size': (await aio_os.stat(image_file)).st_size if await aio_os.path.exists(image_file) else None,
+            'thumbnail_size': (await aio_os.stat(thumbnail_file)).st_size if await aio_os.path.exists(thumbnail_file) else None
+        })
+
+    if file_stats:
+        await db.execute(update(Image), file_stats)
+
+    return len(file_stats)
@@ -0,0 +1,212 @@
+''' maintenance of the denormalized album_summary projection used by the album listings and stats '''
+
+from collections import defaultdict
+from datetime import datetime
+import json
+from typing import Any, Iterable, Optional
+
+from pydantic_core import to_json # pylint: disable=no-name-in-module
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, Session
+
+import minori.api_models as models
+from minori.db.models import Album, AlbumSummary, Author, AuthorAlias, Image
+from minori.db.stats import apply_album_summary_changes, reset_stats
+
+_SESSION_INFO_KEY = 'album_summary_pending'
+
+def rebuild_album_summaries(session: Session, album_ids: Optional[Iterable[int]] = None) -> int: # pylint: disable=too-many-locals,too-many-branches
+    ''' Rebuild the summary rows (and move the stats aggregates) for the given albums, or every album, returning the number of rows written (synchronous) '''
+
+    if album_ids is not None:
+        album_ids = set(album_ids)
+        if not album_ids:
+            return 0
+
+
+    # objects already in the session may hold relationships that are stale against their flushed FKs; expire just those,
+    # so the select below reloads them without discarding anything else the caller has loaded
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Album) and (album_ids is None or obj.id in album_ids):
+            session.expire(obj, ['album_cover', 'author_alias', 'tags'])
+        elif isinstance(obj, AuthorAlias):
+            session.expire(obj, ['author'])
+
+    stmt = select(Album).options(
+        selectinload(Album.album_cover),
+        selectinload(Album.author_alias).selectinload(AuthorAlias.author),
+        selectinload(Album.tags)
+    )
+    image_stats_stmt = select(
+        Image.album_id,
+        Image.file_format,
+        func.count(Image.id), # pylint: disable=not-callable
+        func.coalesce(func.sum(Image.file_size), 0),
+        func.coalesce(func.sum(Image.thumbnail_size), 0)
+    ).group_by(Image.album_id, Image.file_format)
+    old_rows_stmt = select(AlbumSummary.__table__).with_for_update()
+
+    if album_ids is not None:
+        stmt = stmt.where(Album.id.in_(album_ids))
+        image_stats_stmt = image_stats_stmt.where(Image.album_id.in_(album_ids))
+        old_rows = [dict(row) for row in session.execute(
+            old_rows_stmt.where(AlbumSummary.__table__.c.album_id.in_(album_ids))
+        ).mappings().all()]
+        session.execute(delete(AlbumSummary.__table__).where(AlbumSummary.__table__.c.album_id.in_(album_ids)))
+    else:
+        old_rows = []
+        session.execute(delete(AlbumSummary.__table__))
+
+    albums = session.execute(stmt).scalars().all()
+
+    # per album: [image count, original bytes, derivative bytes, {format: [image count, original bytes]}]
+    image_stats: dict[int, list[Any]] = defaultdict(lambda: [0, 0, 0, {}])
+    for album_id, file_format, image_count, original_bytes, derivative_bytes in session.execute(image_stats_stmt).all():
+        album_stats = image_stats[album_id]
+        album_stats[0] += image_count
+        album_stats[1] += int(original_bytes)
+        album_stats[2] += int(derivative_bytes)
+        if file_format is not None:
+            album_stats[3][file_format] = [image_count, int(original_bytes)]
+
+    now = datetime.now()
+    rows: list[dict[str, Any]] = []
+    for album in albums:
+        author = album.author_alias.author if album.author_alias is not None else None
+        image_count, total_bytes, derivative_bytes, formats = image_stats[album.id]
+        rows.append({
+            'album_id': album.id,
+            'album_uuid': album.uuid,
+            'disabled': album.disabled,
+            'created_at': album.created_at,
+            'title': album.title,
+            'author_id': author.id if author is not None else None,
+            'author_name': author.name if author is not None else None,
+            'cover_filename': album.album_cover.filename if album.album_cover is not None else None,
+            'tags': json.dumps([tag.to_string() for tag in album.tags]),
+            'image_count': image_count,
+            'total_bytes': total_bytes,
+            'derivative_bytes': derivative_bytes,
+            'formats': json.dumps(formats),
+            'updated_at': now,
+            'album_json': to_json(album.to_full_model()).decode('utf-8')
+        })
+
+    if rows:
+        session.execute(insert(AlbumSummary.__table__), rows)
+
+    if album_ids is not None:
+        apply_album_summary_changes(session, old_rows, rows)
+    else:
+        reset_stats(session, rows)
+
+    return len(rows)
+
+async def get_albums_without_summary(db: AsyncSession, limit: int) -> list[int]:
+    ''' Get the ids of (up to limit) albums missing from the projection, e.g. right after the migration that added it '''
+
+    stmt = select(Album.id).outerjoin(
+        AlbumSummary, AlbumSummary.album_id == Album.id
+    ).where(AlbumSummary.album_id == None).order_by(Album.id).limit(limit) # pylint: disable=singleton-comparison
+    return list((await db.execute(stmt)).scalars().all())
+
+async def get_album_summary_page(db: AsyncSession, criteria: list[Any], page: int, limit: int) -> tuple[list[str], int]:
+    ''' Get one page of pre-rendered album json (newest first) along with the total number of matching albums '''
+
+    # two index-only queries; a window count would need every matching row before the ordered limit could apply
+    stmt = select(AlbumSummary.album_json).where(*criteria).order_by(AlbumSummary.created_at.desc()).limit(limit).offset((page - 1) * limit)
+    album_json = list((await db.execute(stmt)).scalars().all())
+
+    stmt = select(func.count('*')).select_from(AlbumSummary).where(*criteria) # type: ignore # pylint: disable=not-callable
+    return album_json, (await db.execute(stmt)).scalar_one()
+
+async def get_album_page(db: AsyncSession, criteria: list[Any], page: int, limit: int) -> tuple[list[str], int]:
+    ''' Same as get_album_summary_page, rendered from the albums themselves (for while the projection is still being backfilled) '''
+
+    stmt = select(Album).where(*criteria).options(
+        selectinload(Album.album_cover),
+        selectinload(Album.author_alias).selectinload(AuthorAlias.author),
+        selectinload(Album.tags)
+    ).order_by(Album.created_at.desc()).limit(limit).offset((page - 1) * limit)
+    album_json = [to_json(album.to_full_model()).decode('utf-8') for album in (await db.execute(stmt)).scalars().all()]
+
+    stmt = select(func.count('*')).select_from(Album).where(*criteria) # type: ignore # pylint: disable=not-callable
+    return album_json, (await db.execute(stmt)).scalar_one()
+
+def render_album_listing(album_json: list[str], pagination: models.PaginationModel) -> bytes:
+    ''' Splice pre-rendered album json into a PaginatedFullAlbumsResponseModel-shaped response body '''
+
+    return b'{"albums":[' + ','.join(album_json).encode('utf-8') + b'],"pagination":' + to_json(pagination) + b'}'
+
+def _pending(session: Session) -> dict[str, set[int]]:
+    ''' Get the per-session record of what needs its summaries rebuilt '''
+
+    return session.info.setdefault(_SESSION_INFO_KEY, {'albums': set(), 'author_aliases': set(), 'authors': set()})
+
+def release_album_summaries(session: Session, album_ids: list[int]) -> None:
+    ''' Drop the summaries of albums about to be deleted, taking them out of the stats aggregates (synchronous) '''
+
+    table = AlbumSummary.__table__
+    old_rows = [dict(row) for row in session.execute(
+        select(table).where(table.c.album_id.in_(album_ids)).with_for_update()
+    ).mappings().all()]
+    session.execute(delete(table).where(table.c.album_id.in_(album_ids)))
+    apply_album_summary_changes(session, old_rows, [])
+
+def mark_albums_changed(session: Session, album_ids: Iterable[int]) -> None:
+    ''' Queue albums for a summary rebuild at commit, for changes made with bulk SQL that the flush tracking can't see '''
+
+    _pending(session)['albums'].update(album_ids)
+
+@event.listens_for(Session, 'before_flush')
+def _release_deleted_album_summaries(session: Session, flush_context: Any, instances: Any) -> None: # pylint: disable=unused-argument
+    ''' Take albums being deleted out of the stats aggregates while their summaries still exist (the FK cascade would drop them unseen) '''
+
+    album_ids = [obj.id for obj in session.deleted if isinstance(obj, Album) and obj.id is not None]
+    if album_ids:
+        release_album_summaries(session, album_ids)
+
+@event.listens_for(Session, 'after_flush')
+def _track_album_changes(session: Session, flush_context: Any) -> None: # pylint: disable=unused-argument
+    ''' Record every album whose listing data may have been touched by this flush '''
+
+    pending = _pending(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Album) and obj.id is not None:
+            pending['albums'].add(obj.id)
+        elif isinstance(obj, Image) and obj.album_id is not None:
+            pending['albums'].add(obj.album_id)
+        elif isinstance(obj, AuthorAlias) and obj.id is not None:
+            pending['author_aliases'].add(obj.id)
+        elif isinstance(obj, Author) and obj.id is not None:
+            pending['authors'].add(obj.id)
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_album_summaries(session: Session) -> None:
+    ''' Bring the summaries of every album touched in this transaction up to date, as part of the same transaction '''
+
+    session.flush()
+
+    pending = _pending(session)
+    while any(pending.values()):
+        album_ids = set(pending['albums'])
+        if pending['author_aliases']:
+            album_ids.update(session.execute(
+                select(Album.id).where(Album.author_alias_id.in_(pending['author_aliases']))
+            ).scalars().all())
+        if pending['authors']:
+            album_ids.update(session.execute(
+                select(Album.id).join(AuthorAlias, Album.author_alias_id == AuthorAlias.id).where(AuthorAlias.author_id.in_(pending['authors']))
+            ).scalars().all())
+
+        for ids in pending.values():
+            ids.clear()
+
+        rebuild_album_summaries(session, album_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_album_summaries(session: Session) -> None:
+    ''' Forget any pending summary work when the transaction is rolled back '''
+
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -0,0 +1,309 @@
+''' prometheus-style metrics - request, database pool, threadpool and image pipeline instrumentation, exposed in the text format '''
+
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import anyio.to_thread
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from minori.core_config import METRICS_ENABLED
+
+# seconds; wide enough to cover both cached listings and multi-megabyte uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = tuple[str, ...]
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    ''' Format a label set, e.g. {method="GET",route="/api/albums"} '''
+
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value: str) -> str:
+    ''' Escape a label value for the text exposition format '''
+
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    ''' Format a sample value, keeping integral values free of a trailing .0 '''
+
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+class Metric:
+    ''' base for a named metric family with an optional set of labels (safe to update from threadpool workers) '''
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        ''' Constructor '''
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def samples(self) -> Iterator[str]:
+        ''' Render the current samples, one exposition line each '''
+
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        ''' Render the metric family with its HELP and TYPE lines '''
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}', *self.samples()]
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    ''' monotonically increasing count '''
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        ''' Constructor '''
+
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()) -> None:
+        ''' Increase the count for the given label values '''
+
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        ''' Render the current samples '''
+
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+class Gauge(Metric):
+    ''' value that goes up and down, either tracked directly or read through a callback at scrape time '''
+
+    kind = 'gauge'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            callback: Optional[Callable[[], dict[LabelValues, float]]] = None
+        ) -> None:
+        ''' Constructor '''
+
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()) -> None:
+        ''' Increase the value for the given label values '''
+
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, labels: LabelValues = ()) -> None:
+        ''' Decrease the value for the given label values '''
+
+        self.inc(-amount, labels)
+
+    def samples(self) -> Iterator[str]:
+        ''' Render the current samples '''
+
+        if self.callback is not None:
+            values = self.callback()
+        else:
+            with self.lock:
+                values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+class Histogram(Metric):
+    ''' distribution of observed values over fixed, cumulative buckets '''
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        ''' Constructor '''
+
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # per label set: per-bucket (non-cumulative) counts, the +Inf count last, then the sum
+        self.values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        ''' Record an observation for the given label values '''
+
+        with self.lock:
+            counts, total = self.values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, labels: LabelValues = ()) -> Iterator[None]:
+        ''' Observe the duration of a block '''
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, labels)
+
+    def samples(self) -> Iterator[str]:
+        ''' Render the current samples '''
+
+        with self.lock:
+            values = {labels: (list(counts), total[0]) for labels, (counts, total) in self.values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}'
+
+registry: list[Metric] = []
+
+def render_metrics() -> bytes:
+    ''' Render every registered metric in the prometheus text exposition format (call from the event loop thread) '''
+
+    return ('\n'.join(metric.render() for metric in registry) + '\n').encode('utf-8')
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    ''' async queue pool that records how long each connection checkout waited '''
+
+    # the pool label for this pool's metrics, set by the connection setup
+    metrics_name = 'primary'
+    # log alongside sqlalchemy's own pools, rather than under the (info level) minori logger
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.TimedQueuePool'
+
+    def _do_get(self):
+        ''' Check out a connection, timing the wait '''
+
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started, (self.metrics_name,))
+
+    def recreate(self):
+        ''' Create a new pool of the same configuration, keeping the metrics label '''
+
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name # type: ignore
+        return pool
+
+def _pool_stats() -> dict[str, dict[LabelValues, float]]:
+    ''' Read the state of the primary and replica connection pools '''
+
+    from minori.db.connection import dbconn # pylint: disable=import-outside-toplevel,cyclic-import
+
+    stats: dict[str, dict[LabelValues, float]] = {'size': {}, 'checked_out': {}, 'overflow': {}}
+    for engine in (dbconn.engine, *dbconn.replica_engines):
+        if engine is None:
+            continue
+        pool = engine.sync_engine.pool
+        if isinstance(pool, TimedQueuePool):
+            name = pool.metrics_name
+            stats['size'][(name,)] = pool.size()
+            stats['checked_out'][(name,)] = pool.checkedout()
+            stats['overflow'][(name,)] = max(pool.overflow(), 0)
+
+    return stats
+
+def _threadpool_stats() -> dict[str, dict[LabelValues, float]]:
+    ''' Read the state of the threadpool behind run_in_threadpool (anyio's default thread limiter) '''
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        'total': {(): limiter.total_tokens},
+        'busy': {(): limiter.borrowed_tokens},
+        'waiting': {(): limiter.statistics().tasks_waiting},
+    }
+
+HTTP_REQUESTS = Counter('minori_http_requests_total', 'HTTP requests handled.', ('method', 'route', 'status'))
+HTTP_REQUEST_DURATION = Histogram('minori_http_request_duration_seconds', 'HTTP request latency, until the response body is fully sent.', ('method', 'route'))
+HTTP_IN_FLIGHT = Gauge('minori_http_requests_in_flight', 'HTTP requests currently being handled.')
+HTTP_RECEIVED_BYTES = Counter('minori_http_received_bytes_total', 'Request body bytes received.', ('route',))
+HTTP_SENT_BYTES = Counter('minori_http_sent_bytes_total', 'Response body bytes sent (after compression).', ('route',))
+
+DB_POOL_SIZE = Gauge('minori_db_pool_size', 'Configured connection pool size.', ('pool',), callback=lambda: _pool_stats()['size'])
+DB_POOL_CHECKED_OUT = Gauge(
+    'minori_db_pool_checked_out', 'Connections currently checked out of the pool.', ('pool',),
+    callback=lambda: _pool_stats()['checked_out']
+)
+DB_POOL_OVERFLOW = Gauge('minori_db_pool_overflow', 'Connections open beyond the pool size.', ('pool',), callback=lambda: _pool_stats()['overflow'])
+DB_POOL_WAIT = Histogram(
+    'minori_db_pool_wait_seconds', 'Time spent waiting to check a connection out of the pool.', ('pool',),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+
+THREADPOOL_TOTAL = Gauge('minori_threadpool_threads', 'Worker threads available to run_in_threadpool.', callback=lambda: _threadpool_stats()['total'])
+THREADPOOL_BUSY = Gauge('minori_threadpool_busy_threads', 'Worker threads currently running blocking work.', callback=lambda: _threadpool_stats()['busy'])
+THREADPOOL_WAITING = Gauge(
+    'minori_threadpool_waiting_tasks', 'Blocking calls queued for a free worker thread.',
+    callback=lambda: _threadpool_stats()['waiting']
+)
+
+PIPELINE_STAGE_DURATION = Histogram('minori_image_pipeline_stage_seconds', 'Duration of each image processing stage.', ('stage',))
+IMAGES_INGESTED = Counter('minori_images_ingested_total', 'Images stored through uploads and imports.', ('format',))
+IMAGES_INGESTED_BYTES = Counter('minori_images_ingested_bytes_total', 'Bytes of original images stored through uploads and imports.', ('format',))
+
+class MetricsMiddleware:
+    ''' middleware recording latency, status, in-flight count and body bytes of every HTTP request '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        ''' middleware init '''
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        ''' time the request and count the bytes passing through '''
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        status = '500'
+        received = 0
+        sent = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, sent
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            elif message['type'] == 'http.response.body':
+                sent += len(message.get('body', b''))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # label by route template rather than path, so ids don't blow up the series count
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            method = scope['method']
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, (method, route))
+            HTTP_REQUESTS.inc(labels=(method, route, status))
+            if received:
+                HTTP_RECEIVED_BYTES.inc(received, (route,))
+            if sent:
+                HTTP_SENT_BYTES.inc(sent, (route,))
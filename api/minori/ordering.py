@@ -0,0 +1,123 @@
+''' gapped image order keys, so that moving one image only has to rewrite that image's key '''
+
+from typing import Optional, Sequence
+
+from sqlalchemy import case, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from minori.core_config import IMAGE_ORDER_KEY_GAP
+from minori.db.connection import dbconn
+from minori.db.models import Image
+from minori.logger import logger
+
+# rows per UPDATE ... CASE statement when renumbering
+RENUMBER_BATCH_SIZE = 500
+
+# album_order_key is a signed 32-bit integer column
+ORDER_KEY_MIN = -2 ** 31
+ORDER_KEY_MAX = 2 ** 31 - 1
+
+async def get_album_images_in_order(db: AsyncSession, album_pk: int) -> list[Image]:
+    ''' Get an album's images in display order '''
+
+    stmt = select(Image).where(
+        Image.album_id == album_pk
+    ).order_by(Image.album_order_key.asc(), Image.original_filename.asc())
+
+    return list((await db.execute(stmt)).scalars().all())
+
+async def write_album_order(db: AsyncSession, images: Sequence[Image]) -> int:
+    ''' Renumber images (all of one album, in their new order) with evenly gapped keys, writing only the keys that change; returns rows written '''
+
+    changed = {
+        image.id: order * IMAGE_ORDER_KEY_GAP
+        for order, image in enumerate(images, start=1)
+        if image.album_order_key != order * IMAGE_ORDER_KEY_GAP
+    }
+
+    changed_ids = list(changed)
+    for i in range(0, len(changed_ids), RENUMBER_BATCH_SIZE):
+        batch = {image_pk: changed[image_pk] for image_pk in changed_ids[i:i + RENUMBER_BATCH_SIZE]}
+        await db.execute(
+            update(Image)
+                .where(Image.id.in_(batch))
+                .values(album_order_key=case(batch, value=Image.id))
+                .execution_options(synchronize_session=False)
+        )
+
+    # the writes bypass the unit of work, so bring the loaded objects in line without marking them dirty
+    for order, image in enumerate(images, start=1):
+        set_committed_value(image, 'album_order_key', order * IMAGE_ORDER_KEY_GAP)
+
+    return len(changed)
+
+async def rebalance_album_order(db: AsyncSession, album_pk: int) -> list[Image]:
+    ''' Respread an album's keys evenly (keeping the current order), returning its images in order '''
+
+    images = await get_album_images_in_order(db, album_pk)
+    await write_album_order(db, images)
+
+    return images
+
+async def rebalance_album_order_in_background(album_pk: int) -> None:
+    ''' Respread an album's keys after a response has gone out (for when a move used up the gap it landed in) '''
+
+    try:
+        async with dbconn.get_session() as db:
+            written = await write_album_order(db, await get_album_images_in_order(db, album_pk))
+            await db.commit()
+            logger.info(f'Rebalanced image order keys for album {album_pk} ({written} rows)')
+    except Exception as err: # pylint: disable=broad-except
+        # the next move into a full gap will renumber inline instead, so this is never fatal
+        logger.exception(err)
+
+def key_between(lower: Optional[int], upper: Optional[int]) -> Optional[int]:
+    ''' Pick a key strictly between two neighboring keys (None for an open end), or None when there's no room '''
+
+    if lower is None and upper is None:
+        key = IMAGE_ORDER_KEY_GAP
+    elif lower is None:
+        key = upper - IMAGE_ORDER_KEY_GAP # type: ignore
+    elif upper is None:
+        key = lower + IMAGE_ORDER_KEY_GAP
+    elif upper - lower >= 2:
+        key = (lower + upper) // 2
+    else:
+        return None
+
+    return key if ORDER_KEY_MIN <= key <= ORDER_KEY_MAX else None
+
+def gap_exhausted(key: int, lower: Optional[int], upper: Optional[int]) -> bool:
+    ''' Whether a key just placed between two neighbors has left no room for another move next to it '''
+
+    return (lower is not None and key - lower < 2) or (upper is not None and upper - key < 2)
+
+async def has_position_ties(db: AsyncSession, album_pk: int, images: list[Image]) -> bool:
+    ''' Whether another image in the album shares the exact position (key and filename) of any of the given ones, leaving what's adjacent to them undefined '''
+
+    stmt = select(func.count('*')).select_from(Image).where( # type: ignore # pylint: disable=not-callable
+        Image.album_id == album_pk,
+        tuple_(Image.album_order_key, func.coalesce(Image.original_filename, '')).in_(
+            [(image.album_order_key, image.original_filename or '') for image in images]
+        )
+    ).group_by(Image.album_order_key, func.coalesce(Image.original_filename, '')).having(func.count('*') > 1) # pylint: disable=not-callable
+
+    return (await db.execute(stmt)).first() is not None
+
+async def get_adjacent_image(db: AsyncSession, album_pk: int, image: Image, exclude_pk: int, following: bool) -> Optional[Image]:
+    ''' Get the image right after (or before) the given one in display order, skipping the image being moved; None at the album's end '''
+
+    position = tuple_(Image.album_order_key, func.coalesce(Image.original_filename, ''))
+    reference = tuple_(image.album_order_key, image.original_filename or '')
+
+    stmt = select(Image).where(
+        Image.album_id == album_pk,
+        Image.id != exclude_pk,
+        position > reference if following else position < reference
+    ).order_by(
+        *((Image.album_order_key.asc(), func.coalesce(Image.original_filename, '').asc()) if following else
+          (Image.album_order_key.desc(), func.coalesce(Image.original_filename, '').desc()))
+    ).limit(1)
+
+    return (await db.execute(stmt)).scalars().first()
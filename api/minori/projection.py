@@ -0,0 +1,99 @@
+''' sparse field projection and columnar serialization for listing endpoints '''
+
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.interfaces import ORMOption
+
+from minori.db.models import Album, AuthorAlias, Image
+
+T = TypeVar('T')
+
+class ListFormat(str, Enum):
+    ''' Supported representations for listing endpoints '''
+
+    ROWS = 'rows'
+    COLUMNAR = 'columnar'
+
+def _json_value(value: Any) -> Any:
+    ''' Convert a column value into something json-serializable (matches pydantic's datetime output) '''
+
+    return value.isoformat() if isinstance(value, datetime) else value
+
+IMAGE_FIELDS: dict[str, Callable[[Image], Any]] = {
+    'id': lambda image: image.uuid,
+    'filename': lambda image: image.filename,
+    'original_filename': lambda image: image.original_filename,
+    'uploaded': lambda image: image.uploaded,
+    'created_at': lambda image: _json_value(image.created_at),
+    'uploaded_at': lambda image: _json_value(image.uploaded_at),
+    'album_order_key': lambda image: image.album_order_key,
+}
+
+# columns backing each image field, so that unrequested columns are never even loaded
+IMAGE_FIELD_COLUMNS: dict[str, Any] = {
+    'id': Image.uuid,
+    'filename': Image.filename,
+    'original_filename': Image.original_filename,
+    'uploaded': Image.uploaded,
+    'created_at': Image.created_at,
+    'uploaded_at': Image.uploaded_at,
+    'album_order_key': Image.album_order_key,
+}
+
+ALBUM_FIELDS: dict[str, Callable[[Album], Any]] = {
+    'id': lambda album: album.uuid,
+    'disabled': lambda album: album.disabled,
+    'title': lambda album: album.title,
+    'description': lambda album: album.description,
+    'url': lambda album: album.url,
+    'created_at': lambda album: _json_value(album.created_at),
+    'author_alias': lambda album: album.author_alias.to_full_model().model_dump(mode='json') if album.author_alias is not None else None,
+    'cover': lambda album: album.album_cover.to_model().model_dump(mode='json') if album.album_cover is not None else None,
+    'tags': lambda album: [tag.to_model().model_dump(mode='json') for tag in album.tags],
+}
+
+# fields of the album listings that don't include covers or tags (the AlbumModel shape)
+ALBUM_SUMMARY_FIELDS: list[str] = ['id', 'disabled', 'title', 'description', 'url', 'created_at', 'author_alias']
+
+# eager loads required by each relational album field; plain column fields need none
+ALBUM_FIELD_LOADERS: dict[str, Callable[[], ORMOption]] = {
+    'author_alias': lambda: selectinload(Album.author_alias).joinedload(AuthorAlias.author),
+    'cover': lambda: selectinload(Album.album_cover),
+    'tags': lambda: selectinload(Album.tags),
+}
+
+def parse_fields(fields: Optional[str], available: dict[str, Any], default: Optional[list[str]] = None) -> list[str]:
+    ''' Parse a comma-separated fields= parameter, defaulting to the given fields (or every available field) when it names none '''
+
+    requested = list(dict.fromkeys(field.strip() for field in (fields or '').split(',') if field.strip()))
+    if not requested:
+        return default if default is not None else list(available)
+
+    if unknown := [field for field in requested if field not in available]:
+        raise HTTPException(400, f'Unknown fields requested: {", ".join(unknown)}')
+
+    return requested
+
+def album_field_loaders(fields: list[str]) -> list[ORMOption]:
+    ''' Get the eager load options needed to serialize the given album fields '''
+
+    return [ALBUM_FIELD_LOADERS[field]() for field in fields if field in ALBUM_FIELD_LOADERS]
+
+def project(
+    items: Sequence[T],
+    fields: list[str],
+    getters: dict[str, Callable[[T], Any]],
+    list_format: ListFormat = ListFormat.ROWS
+    ) -> list[dict[str, Any]] | dict[str, list[Any]]:
+    ''' Serialize only the requested fields, as a list of objects or as parallel arrays per field '''
+
+    selected = [(field, getters[field]) for field in fields]
+
+    if list_format == ListFormat.COLUMNAR:
+        return {field: [getter(item) for item in items] for field, getter in selected}
+
+    return [{field: getter(item) for field, getter in selected} for item in items]
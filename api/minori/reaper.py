@@ -0,0 +1,139 @@
+''' background removal of deleted images' files, driven by the file_tombstone table '''
+# pylint: disable=singleton-comparison
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import aiofiles.os as aio_os
+from sqlalchemy import delete, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from minori.core_config import (
+    IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH, REAPER_BATCH_SIZE, REAPER_CONCURRENCY, REAPER_INTERVAL, REAPER_MAX_BACKOFF
+)
+from minori.db.connection import dbconn
+from minori.db.models import FileTombstone, Image
+from minori.logger import logger
+
+async def add_tombstones(db: AsyncSession, *criteria: Any) -> None:
+    ''' Queue the files of every uploaded image matching the criteria for removal, in one INSERT ... SELECT (part of the caller's transaction) '''
+
+    now = datetime.now()
+    await db.execute(
+        insert(FileTombstone).from_select(
+            ['filename', 'created_at', 'attempts', 'next_attempt_at'],
+            select(Image.filename, literal(now), literal(0), literal(now)).where(
+                Image.uploaded == True,
+                Image.filename != None,
+                *criteria
+            )
+        )
+    )
+
+async def remove_files(filename: str) -> None:
+    ''' Remove an image and its thumbnail (already being gone counts as success) '''
+
+    for path in (IMAGE_UPLOAD_PATH / filename, IMAGE_THUMBNAIL_PATH / filename):
+        try:
+            await aio_os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+class FileReaper:
+    ''' unlinks tombstoned files in parallel batches, retrying failures with exponential backoff '''
+
+    def __init__(self) -> None:
+        ''' Constructor '''
+
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        ''' Start reaping in the background '''
+
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        ''' Stop reaping (anything unfinished is picked up again on the next start) '''
+
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def notify(self) -> None:
+        ''' Wake the reaper early, as new tombstones were just committed '''
+
+        self.wakeup.set()
+
+    async def run(self) -> None:
+        ''' Reap until cancelled, sleeping between passes unless woken up '''
+
+        while True:
+            try:
+                # keep going while full batches are coming back, there's likely more waiting
+                while await self.reap_batch() >= REAPER_BATCH_SIZE:
+                    pass
+            except Exception as err: # pylint: disable=broad-except
+                logger.exception(err)
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=REAPER_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def reap_batch(self) -> int:
+        ''' Claim one batch of due tombstones and remove their files, returning the batch size '''
+
+        async with dbconn.get_session() as db:
+            # skip locked rows, so that several api workers can share the queue
+            stmt = select(FileTombstone).where(
+                FileTombstone.next_attempt_at <= datetime.now()
+            ).order_by(FileTombstone.next_attempt_at.asc()).limit(REAPER_BATCH_SIZE).with_for_update(skip_locked=True)
+            tombstones = (await db.execute(stmt)).scalars().all()
+
+            if not tombstones:
+                return 0
+
+            semaphore = asyncio.Semaphore(REAPER_CONCURRENCY)
+            async def reap(tombstone: FileTombstone) -> Optional[Exception]:
+                async with semaphore:
+                    try:
+                        await remove_files(tombstone.filename)
+                    except Exception as err: # pylint: disable=broad-except
+                        return err
+                    return None
+
+            results = await asyncio.gather(*[reap(tombstone) for tombstone in tombstones])
+
+            reaped = [tombstone.id for tombstone, err in zip(tombstones, results) if err is None]
+            if reaped:
+                await db.execute(delete(FileTombstone).where(FileTombstone.id.in_(reaped)))
+
+            now = datetime.now()
+            failed = [(tombstone, err) for tombstone, err in zip(tombstones, results) if err is not None]
+            for tombstone, err in failed:
+                attempts = tombstone.attempts + 1
+                backoff = min(REAPER_INTERVAL * 2 ** (attempts - 1), REAPER_MAX_BACKOFF)
+                await db.execute(
+                    update(FileTombstone).where(FileTombstone.id == tombstone.id).values(
+                        attempts=attempts,
+                        next_attempt_at=now + timedelta(seconds=backoff),
+                        last_error=str(err)[:1024]
+                    )
+                )
+                logger.warning(f'Failed to remove {tombstone.filename} (attempt {attempts}): {err}')
+
+            await db.commit()
+
+        return len(tombstones)
+
+reaper = FileReaper()
@@ -0,0 +1,234 @@
+''' library-wide thumbnail rebuild - walks stale thumbnails in image id order, rendering across a process pool, resumable from a checkpoint '''
+# pylint: disable=singleton-comparison
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, Optional
+
+from sqlalchemy import func, or_, select, update
+
+from minori.core_config import ALLOWED_FILE_TYPES, IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_QUALITY, IMAGE_THUMBNAIL_SIZE, TEMP_PATH
+from minori.db.connection import dbconn
+from minori.db.models import Image
+from minori.db.summary import mark_albums_changed
+from minori.logger import logger
+from minori.util import THUMBNAIL_PIPELINE_VERSION, is_thumbnail_current, save_thumbnail, thumbnail_signature
+
+def rebuild_thumbnail(filename: str, recorded: Optional[tuple[Optional[str], Optional[int], Optional[int]]]) -> Optional[dict[str, Any]]:
+    ''' Re-render an image's thumbnail unless its recorded (signature, source mtime, source size) is current, returning the new state (in a pool process) '''
+
+    if recorded is not None and is_thumbnail_current(filename, *recorded):
+        return None
+
+    return save_thumbnail(IMAGE_UPLOAD_PATH / filename, filename.split('/')[0], filename)
+
+class Checkpoint:
+    ''' progress of a rebuild, persisted after every committed batch so an interrupted run picks up where it stopped '''
+
+    def __init__(self, path: Path) -> None:
+        ''' Constructor '''
+
+        self.path = path
+        self.last_id = 0
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.pipeline = [THUMBNAIL_PIPELINE_VERSION, IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_QUALITY]
+
+    def load(self) -> bool:
+        ''' Load a previous run's progress, if there is one for the same thumbnail pipeline '''
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fd:
+                state: dict[str, Any] = json.load(fd)
+        except FileNotFoundError:
+            return False
+
+        if state.get('pipeline') != self.pipeline:
+            logger.warning(f'Ignoring checkpoint {self.path}, it was written for different thumbnail settings')
+            return False
+
+        self.last_id = state['last_id']
+        self.processed = state['processed']
+        self.failed = state['failed']
+        self.skipped = state['skipped']
+        return True
+
+    def save(self) -> None:
+        ''' Persist the current progress (atomically, so a crash mid-write leaves the previous checkpoint intact) '''
+
+        temp_path = self.path.with_name(f'{self.path.name}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as fd:
+            json.dump({
+                'last_id': self.last_id,
+                'processed': self.processed,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'pipeline': self.pipeline,
+            }, fd)
+        os.replace(temp_path, self.path)
+
+    def clear(self) -> None:
+        ''' Remove the checkpoint once the rebuild has finished '''
+
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+def format_duration(seconds: float) -> str:
+    ''' Format a duration as h:mm:ss '''
+
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds % 3600 // 60:02}:{seconds % 60:02}'
+
+def get_criteria(last_id: int, force: bool, check_sources: bool) -> list[Any]:
+    ''' Get the criteria for the images due a rebuild past the checkpoint '''
+
+    criteria: list[Any] = [Image.id > last_id, Image.filename != None]
+    if not (force or check_sources):
+        # without looking at the originals, only thumbnails built with other settings (or never recorded) are known stale
+        criteria.append(or_(
+            Image.thumbnail_signature == None,
+            Image.thumbnail_signature.not_in([thumbnail_signature(file_type) for file_type in ALLOWED_FILE_TYPES])
+        ))
+
+    return criteria
+
+async def count_remaining(last_id: int, force: bool, check_sources: bool) -> int:
+    ''' Count the images due a rebuild past the checkpoint '''
+
+    async with dbconn.get_session(read_only=True) as db:
+        return (await db.execute(
+            select(func.count(Image.id)).where(*get_criteria(last_id, force, check_sources))
+        )).scalar_one()
+
+async def rebuild_batch(executor: ProcessPoolExecutor, checkpoint: Checkpoint, batch_size: int, force: bool, check_sources: bool) -> int:
+    ''' Rebuild the thumbnails of the next batch of images after the checkpoint, returning the batch size '''
+
+    async with dbconn.get_session(read_only=True) as db:
+        rows = (await db.execute(
+            select(
+                Image.id, Image.album_id, Image.filename, Image.thumbnail_signature, Image.thumbnail_source_mtime, Image.thumbnail_source_size
+            ).where(*get_criteria(checkpoint.last_id, force, check_sources)).order_by(Image.id.asc()).limit(batch_size)
+        )).all()
+
+    if not rows:
+        return 0
+
+    # render outside of any transaction, this is the slow part
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                executor,
+                rebuild_thumbnail,
+                row.filename,
+                None if force else (row.thumbnail_signature, row.thumbnail_source_mtime, row.thumbnail_source_size)
+            ) for row in rows
+        ],
+        return_exceptions=True
+    )
+
+    states: list[dict[str, Any]] = []
+    for row, result in zip(rows, results):
+        if isinstance(result, BaseException):
+            checkpoint.failed += 1
+            logger.warning(f'Failed to rebuild the thumbnail of image {row.id} ({row.filename}): {result}')
+        elif result is None:
+            checkpoint.skipped += 1
+        else:
+            states.append({'id': row.id, **result})
+
+    if states:
+        async with dbconn.get_session() as db:
+            # bulk update by primary key - one executemany for the batch
+            await db.execute(update(Image), states)
+            # derivative byte totals live in the album summaries, which bulk updates don't refresh on their own
+            mark_albums_changed(db.sync_session, {row.album_id for row in rows})
+            await db.commit()
+
+    checkpoint.processed += len(states)
+    checkpoint.last_id = rows[-1].id
+    checkpoint.save()
+
+    return len(rows)
+
+async def rebuild( # pylint: disable=too-many-arguments,too-many-positional-arguments
+        workers: int,
+        batch_size: int,
+        checkpoint_path: Path,
+        restart: bool,
+        force: bool,
+        check_sources: bool
+    ) -> int:
+    ''' Rebuild every stale thumbnail (or all of them, when forced), returning how many failed '''
+
+    checkpoint = Checkpoint(checkpoint_path)
+    if not restart and checkpoint.load():
+        logger.info(f'Resuming after image {checkpoint.last_id} ({checkpoint.processed} done, {checkpoint.skipped} current, {checkpoint.failed} failed)')
+
+    await dbconn.start()
+    try:
+        remaining = await count_remaining(checkpoint.last_id, force, check_sources)
+        logger.info(
+            f'Checking {remaining} thumbnails against pipeline v{THUMBNAIL_PIPELINE_VERSION} '
+            f'({IMAGE_THUMBNAIL_SIZE}px, quality {IMAGE_THUMBNAIL_QUALITY}) with {workers} workers'
+        )
+
+        # spawn rather than fork - the event loop and db driver threads must not be inherited by the workers
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            started = time.monotonic()
+            done = 0
+            while count := await rebuild_batch(executor, checkpoint, batch_size, force, check_sources):
+                done += count
+                elapsed = time.monotonic() - started
+                rate = done / elapsed if elapsed else 0
+                eta = format_duration((remaining - done) / rate) if rate else '?'
+                logger.info(f'{done}/{remaining} thumbnails ({rate:.1f}/s, {checkpoint.skipped} current, {checkpoint.failed} failed so far), ETA {eta}')
+    finally:
+        await dbconn.stop()
+
+    logger.info(f'Rebuild finished: {checkpoint.processed} rebuilt, {checkpoint.skipped} already current, {checkpoint.failed} failed')
+    checkpoint.clear()
+
+    return checkpoint.failed
+
+def main() -> int:
+    ''' main method '''
+
+    parser = argparse.ArgumentParser(description='Rebuilds the thumbnail of every uploaded image, skipping the ones already built with the current settings.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Thumbnail rendering processes.')
+    parser.add_argument('--batch-size', type=int, default=500, help='Images claimed from the database (and checkpointed) at a time.')
+    parser.add_argument(
+        '--checkpoint', type=Path, default=TEMP_PATH / 'minori-thumbnail-rebuild.json',
+        help='Progress file to resume from; put it on persistent storage to survive a container restart.'
+    )
+    parser.add_argument('--restart', action='store_true', help='Ignore any existing checkpoint and start over from the first image.')
+    parser.add_argument(
+        '--check-sources', action='store_true',
+        help='Also look for originals changed on disk since their thumbnail was built (stats every image).'
+    )
+    parser.add_argument('--force', action='store_true', help='Rebuild every thumbnail, current or not.')
+    args = parser.parse_args()
+
+    failed = asyncio.run(rebuild(
+        workers=max(args.workers, 1),
+        batch_size=max(args.batch_size, 1),
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        force=args.force,
+        check_sources=args.check_sources
+    ))
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+''' storage reconciliation - finds stored files without an image row (orphans) and image rows without their files (missing) '''
+# pylint: disable=singleton-comparison
+
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from typing import Any, AsyncIterator, Optional
+
+from sqlalchemy import insert, select
+
+from minori.core_config import IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH
+from minori.db.connection import dbconn
+from minori.db.models import FileTombstone, Image
+from minori.logger import logger
+
+class Throttle:
+    ''' caps the number of directory entries read per second, shared by every scanner thread (0 disables it) '''
+
+    def __init__(self, rate: float) -> None:
+        ''' Constructor '''
+
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self, count: int) -> None:
+        ''' Account for count entries just read, sleeping as long as needed to stay under the rate '''
+
+        if self.rate <= 0 or count <= 0:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            # wait for this batch's slot, then push the next slot back by the time the batch is worth at the rate
+            start = max(self.next_at, now)
+            self.next_at = start + count / self.rate
+            delay = start - now
+
+        if delay > 0:
+            time.sleep(delay)
+
+class StorageReport:
+    ''' the outcome of reconciling one storage root against the database '''
+
+    def __init__(self, root: Path) -> None:
+        ''' Constructor '''
+
+        self.root = root
+        self.scanned = 0
+        self.orphans: list[str] = []
+        self.missing: list[str] = []
+        self.unexpected: list[str] = []
+        # orphan files that are already queued for removal, or too new to judge (an upload may still be committing)
+        self.pending_removal = 0
+        self.too_recent = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        ''' Get the report as a plain, JSON serializable dict '''
+
+        return {
+            'root': str(self.root),
+            'scanned': self.scanned,
+            'orphans': self.orphans,
+            'missing': self.missing,
+            'unexpected': self.unexpected,
+            'pending_removal': self.pending_removal,
+            'too_recent': self.too_recent,
+        }
+
+def list_shards(root: Path) -> tuple[list[str], list[str]]:
+    ''' List the shard directories under a storage root, in the order their contents sort in, along with anything else found there '''
+
+    shards: list[str] = []
+    unexpected: list[str] = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shards.append(entry.name)
+            else:
+                unexpected.append(entry.name)
+
+    # sort on the path prefix rather than the bare name, so the stream matches a plain sort of the full relative paths
+    shards.sort(key=lambda shard: f'{shard}/')
+    return shards, sorted(unexpected)
+
+def scan_shard(root: Path, shard: str, throttle: Throttle) -> tuple[list[str], list[str]]:
+    ''' Read one shard directory, returning the sorted relative paths of its files and of anything unexpected in it '''
+
+    files: list[str] = []
+    unexpected: list[str] = []
+    try:
+        with os.scandir(root / shard) as entries:
+            for entry in entries:
+                # d_type answers this without a stat() call per file
+                if entry.is_file(follow_symlinks=False):
+                    files.append(f'{shard}/{entry.name}')
+                else:
+                    unexpected.append(f'{shard}/{entry.name}')
+    except FileNotFoundError:
+        # the shard went away mid-scan
+        pass
+
+    throttle.wait(len(files) + len(unexpected))
+    files.sort()
+    return files, unexpected
+
+async def walk_storage(root: Path, report: StorageReport, workers: int, throttle: Throttle) -> AsyncIterator[str]:
+    ''' Stream the relative paths of every file under a storage root in sorted order, reading a few shards ahead in parallel '''
+
+    shards, unexpected = await asyncio.to_thread(list_shards, root)
+    report.unexpected.extend(unexpected)
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reconcile') as executor:
+        remaining = iter(shards)
+        pending = deque(
+            loop.run_in_executor(executor, scan_shard, root, shard, throttle) for shard in islice(remaining, workers * 2)
+        )
+        while pending:
+            files, unexpected = await pending.popleft()
+            for shard in islice(remaining, 1):
+                pending.append(loop.run_in_executor(executor, scan_shard, root, shard, throttle))
+
+            report.unexpected.extend(unexpected)
+            report.scanned += len(files)
+            for filename in files:
+                yield filename
+
+async def stream_filenames(chunk_size: int) -> AsyncIterator[str]:
+    ''' Stream every stored image filename in sorted order, a keyset-paginated chunk (and short transaction) at a time '''
+
+    last: Optional[str] = None
+    while True:
+        async with dbconn.get_session(read_only=True) as db:
+            stmt = select(Image.filename).where(Image.filename != None)
+            if last is not None:
+                stmt = stmt.where(Image.filename > last)
+            filenames = (await db.execute(stmt.order_by(Image.filename.asc()).limit(chunk_size))).scalars().all()
+
+        for filename in filenames:
+            yield filename # type: ignore
+
+        if len(filenames) < chunk_size:
+            return
+        last = filenames[-1]
+
+async def get_tombstoned_filenames() -> set[str]:
+    ''' Get the filenames already queued for removal by the reaper '''
+
+    async with dbconn.get_session(read_only=True) as db:
+        return set((await db.execute(select(FileTombstone.filename).distinct())).scalars().all())
+
+def get_mtime(path: Path) -> Optional[float]:
+    ''' Get a file's modification time, or None if it's gone already '''
+
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+async def reconcile_root( # pylint: disable=too-many-arguments,too-many-positional-arguments
+        root: Path,
+        tombstoned: set[str],
+        workers: int,
+        throttle: Throttle,
+        chunk_size: int,
+        min_age: float
+    ) -> StorageReport:
+    ''' Merge-join the sorted file listing of a storage root against the sorted image filenames '''
+
+    report = StorageReport(root)
+    cutoff = time.time() - min_age
+
+    files = walk_storage(root, report, workers, throttle)
+    filenames = stream_filenames(chunk_size)
+    file = await anext(files, None)
+    filename = await anext(filenames, None)
+
+    while file is not None or filename is not None:
+        if filename is None or (file is not None and file < filename):
+            if file in tombstoned:
+                report.pending_removal += 1
+            else:
+                # only orphan candidates pay for a stat() call
+                mtime = await asyncio.to_thread(get_mtime, root / file) # type: ignore
+                if mtime is None:
+                    pass
+                elif mtime > cutoff:
+                    report.too_recent += 1
+                else:
+                    report.orphans.append(file) # type: ignore
+            file = await anext(files, None)
+        elif file is None or filename < file:
+            report.missing.append(filename)
+            filename = await anext(filenames, None)
+        else:
+            file = await anext(files, None)
+            filename = await anext(filenames, None)
+
+    return report
+
+async def tombstone_orphans(orphans: set[str], chunk_size: int) -> int:
+    ''' Queue orphaned files for removal by the reaper, re-checking each chunk against the database first; returns how many were queued '''
+
+    queued = 0
+    remaining = sorted(orphans)
+    for start in range(0, len(remaining), chunk_size):
+        chunk = remaining[start:start + chunk_size]
+        async with dbconn.get_session() as db:
+            # an upload can claim a filename between the scan and now; never queue a file that has a row again
+            claimed = set((await db.execute(select(Image.filename).where(Image.filename.in_(chunk)))).scalars().all())
+            now = datetime.now()
+            rows = [
+                {'filename': filename, 'created_at': now, 'attempts': 0, 'next_attempt_at': now}
+                for filename in chunk if filename not in claimed
+            ]
+            if rows:
+                await db.execute(insert(FileTombstone), rows)
+                await db.commit()
+            queued += len(rows)
+
+    return queued
+
+async def reconcile(
+        workers: int,
+        max_rate: float,
+        chunk_size: int,
+        min_age: float,
+        tombstone: bool
+    ) -> dict[str, Any]:
+    ''' Reconcile both the image and thumbnail storage against the database '''
+
+    await dbconn.start()
+    try:
+        throttle = Throttle(max_rate)
+        tombstoned = await get_tombstoned_filenames()
+
+        reports: list[StorageReport] = []
+        for root in (IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH):
+            started = time.monotonic()
+            report = await reconcile_root(root, tombstoned, workers, throttle, chunk_size, min_age)
+            logger.info(
+                f'Reconciled {root}: {report.scanned} files in {time.monotonic() - started:.1f}s, '
+                f'{len(report.orphans)} orphaned, {len(report.missing)} missing, {len(report.unexpected)} unexpected'
+            )
+            reports.append(report)
+
+        queued = 0
+        if tombstone:
+            # the reaper removes both the image and its thumbnail for a filename, so one tombstone covers either root
+            queued = await tombstone_orphans({orphan for report in reports for orphan in report.orphans}, chunk_size)
+            logger.info(f'Queued {queued} orphaned files for removal')
+    finally:
+        await dbconn.stop()
+
+    return {
+        'images': reports[0].to_dict(),
+        'thumbnails': reports[1].to_dict(),
+        'queued_for_removal': queued,
+    }
+
+def main() -> int:
+    ''' main method '''
+
+    parser = argparse.ArgumentParser(description='Reconciles the image and thumbnail storage against the database, reporting orphaned and missing files.')
+    parser.add_argument('--workers', type=int, default=4, help='Shard directories read in parallel.')
+    parser.add_argument('--max-rate', type=float, default=0, help='Cap on directory entries read per second, to go easy on a live volume (0 for no cap).')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Filenames fetched from the database per query.')
+    parser.add_argument(
+        '--min-age', type=float, default=3600,
+        help='Seconds a file without a row must have existed before it counts as orphaned (uploads write files before committing).'
+    )
+    parser.add_argument('--tombstone', action='store_true', help='Queue orphaned files for removal by the api\'s file reaper.')
+    parser.add_argument('--output', type=str, default=None, help='Write the full report as JSON to this path.')
+    args = parser.parse_args()
+
+    result = asyncio.run(reconcile(
+        workers=max(args.workers, 1),
+        max_rate=args.max_rate,
+        chunk_size=max(args.chunk_size, 1),
+        min_age=args.min_age,
+        tombstone=args.tombstone
+    ))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fd:
+            json.dump(result, fd, indent=4)
+
+    for name in ('images', 'thumbnails'):
+        for filename in result[name]['missing']:
+            logger.warning(f'Missing from {name}: {filename}')
+
+    return 1 if result['images']['missing'] or result['thumbnails']['missing'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+''' response classes for the api '''
+
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel # pylint: disable=no-name-in-module
+from pydantic_core import to_json # pylint: disable=no-name-in-module
+
+from minori.timing import span
+
+class TimedORJSONResponse(ORJSONResponse):
+    ''' orjson response that reports its rendering time in the request's Server-Timing breakdown '''
+
+    def render(self, content: Any) -> bytes:
+        ''' render the content, timed as a "render" span '''
+
+        with span('render'):
+            return self.render_content(content)
+
+    def render_content(self, content: Any) -> bytes:
+        ''' serialize the content with orjson '''
+
+        return super().render(content)
+
+class FastJSONResponse(TimedORJSONResponse):
+    ''' JSON response that bypasses fastapi's response validation (the route's response_model still documents it) '''
+
+    def render_content(self, content: Any) -> bytes:
+        ''' serialize pydantic models with pydantic-core, pass pre-rendered json bytes through, and everything else with orjson '''
+
+        if isinstance(content, BaseModel):
+            return to_json(content)
+
+        if isinstance(content, bytes):
+            return content
+
+        return super().render_content(content)
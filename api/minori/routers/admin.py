@@ -0,0 +1,24 @@
+''' operational endpoints '''
+
+from fastapi import APIRouter
+
+from minori.db.slowquery import slow_query_log
+import minori.api_models as models
+
+router = APIRouter(tags=['admin'])
+
+@router.get('/api/admin/slow-queries')
+async def get_slow_queries() -> models.SlowQueriesResponseModel:
+    ''' Get the statements that ran past the slow query threshold since startup (or the last reset), most costly first '''
+
+    return slow_query_log.to_model()
+
+@router.delete('/api/admin/slow-queries')
+async def reset_slow_queries() -> models.OperationResultModel:
+    ''' Clear the slow query log '''
+
+    slow_query_log.reset()
+
+    return models.OperationResultModel(
+        success=True
+    )
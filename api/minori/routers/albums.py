@@ -6,47 +6,75 @@ import json
 import math
 from pathlib import Path
 from typing import Any, Annotated, Optional, Sequence
-import zipfile
 
 import aiofiles.os as aio_os
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
-from natsort import natsorted
-import shortuuid
-from sqlalchemy import select, func
+from sqlalchemy import delete, select, func, update
 from sqlalchemy.orm import selectinload
 from starlette.background import BackgroundTask
-from starlette.concurrency import run_in_threadpool
 
 import minori.api_models as models
-from minori.core_config import FRONTEND_BASE_FQDN, IMAGE_BASE_FQDN, IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH, MINORI_VERSION, TEMP_PATH
+from minori.core_config import FRONTEND_BASE_FQDN, IMAGE_BASE_FQDN, IMAGE_UPLOAD_PATH, MINORI_VERSION, TEMP_PATH
 from minori.db.connection import AsyncSession
-from minori.db.models import Album, Author, AuthorAlias, Image
-from minori.util import save_thumbnail
+from minori.db.models import album_tag_xref_table, generate_uuid, Album, AlbumSummary, Author, AuthorAlias, Image
+from minori.db.stats import backfill_image_file_stats
+from minori.db.summary import get_album_page, get_album_summary_page, rebuild_album_summaries, release_album_summaries, render_album_listing
+from minori.reaper import add_tombstones, reaper
+from minori.summary_backfill import summary_backfill
+from minori.projection import ALBUM_FIELDS, ALBUM_SUMMARY_FIELDS, ListFormat, album_field_loaders, parse_fields, project
+from minori.util import is_thumbnail_current, parse_id_list, save_thumbnail
 from minori.logger import logger
+from minori.timing import run_in_threadpool
+from minori.responses import FastJSONResponse
 
 router = APIRouter(tags=['albums'])
 
-@router.get('/api/albums')
-async def get_albums(db: AsyncSession, page: int = 1, include_disabled: bool = False) -> models.PaginatedFullAlbumsResponseModel:
-    ''' List all albums (excluding disabled by default) '''
+@router.get('/api/albums', response_model=models.PaginatedFullAlbumsResponseModel)
+async def get_albums(
+    db: AsyncSession,
+    page: int = 1,
+    include_disabled: bool = False,
+    fields: Optional[str] = None,
+    list_format: Annotated[ListFormat, Query(alias='format')] = ListFormat.ROWS
+    ) -> FastJSONResponse:
+    ''' List all albums (excluding disabled by default; optionally only the given comma-separated fields, or as parallel arrays per field) '''
 
     page = max((page, 1))
     limit = 16
     offset = (page - 1) * limit
 
+    if fields is None and list_format == ListFormat.ROWS:
+        # the default listing is served entirely out of the album_summary projection (a page query and a count),
+        # or rendered from the albums themselves while missing summaries are still being backfilled
+        if summary_backfill.complete:
+            criteria = [AlbumSummary.disabled == False] if include_disabled is False else []
+            album_json, total_records = await get_album_summary_page(db, criteria, page, limit)
+        else:
+            criteria = [Album.disabled == False] if include_disabled is False else []
+            album_json, total_records = await get_album_page(db, criteria, page, limit)
+        total_pages = math.ceil(total_records / limit)
+
+        return FastJSONResponse(render_album_listing(album_json, models.PaginationModel(
+            first_page=1,
+            previous_page=(False if page <= 1 else (page - 1)), # pylint: disable=superfluous-parens
+            current_page=page,
+            next_page=(False if page >= total_pages else (page + 1)), # pylint: disable=superfluous-parens
+            last_page=total_pages,
+            total_records=total_records
+        )))
+
     stmt = select(Album)
 
     if include_disabled is False:
         stmt = stmt.where(Album.disabled == False)
 
+    # only eager load the relations that are actually going to be serialized
+    selected_fields = parse_fields(fields, ALBUM_FIELDS)
+
     stmt = stmt.order_by(Album.created_at.desc())
     stmt = stmt.limit(limit).offset(offset)
-    stmt = stmt.options(
-        selectinload(Album.album_cover),
-        selectinload(Album.author_alias).joinedload(AuthorAlias.author),
-        selectinload(Album.tags)
-    )
+    stmt = stmt.options(*album_field_loaders(selected_fields))
     albums: Sequence[Album] = (await db.execute(stmt)).scalars().all()
 
     # pyright, it's a select count, THE TYPES DON'T WORK LIKE THAT, IT'S NOT GOING TO BE NONE
@@ -59,34 +87,85 @@ async def get_albums(db: AsyncSession, page: int = 1, include_disabled: bool = F
 
     total_pages = math.ceil(total_records / limit)
 
-    return models.PaginatedFullAlbumsResponseModel(
-        albums=[album.to_full_model() for album in albums],
-        pagination=models.PaginationModel(
-            first_page=1,
-            previous_page=(False if page <= 1 else (page - 1)), # pylint: disable=superfluous-parens
-            current_page=page,
-            next_page=(False if page >= total_pages else (page + 1)), # pylint: disable=superfluous-parens
-            last_page=total_pages,
-            total_records=total_records
-        )
+    pagination = models.PaginationModel(
+        first_page=1,
+        previous_page=(False if page <= 1 else (page - 1)), # pylint: disable=superfluous-parens
+        current_page=page,
+        next_page=(False if page >= total_pages else (page + 1)), # pylint: disable=superfluous-parens
+        last_page=total_pages,
+        total_records=total_records
     )
 
-@router.get('/api/albums/all')
-async def get_all_albums(db: AsyncSession, include_disabled: bool = False) -> models.AlbumsResponseModel:
-    ''' List all albums without covers (excluding disabled by default) '''
+    return FastJSONResponse({
+        'albums': project(albums, selected_fields, ALBUM_FIELDS, list_format),
+        'pagination': pagination.model_dump()
+    })
+
+@router.get('/api/albums/all', response_model=models.AlbumsResponseModel)
+async def get_all_albums(
+    db: AsyncSession,
+    include_disabled: bool = False,
+    fields: Optional[str] = None,
+    list_format: Annotated[ListFormat, Query(alias='format')] = ListFormat.ROWS
+    ) -> FastJSONResponse:
+    ''' List all albums without covers (excluding disabled by default; optionally only the given comma-separated fields, or as parallel arrays per field) '''
 
     stmt = select(Album)
 
     if include_disabled is False:
         stmt = stmt.where(Album.disabled == False)
 
-    stmt = stmt.options(selectinload(Album.author_alias).joinedload(AuthorAlias.author))
+    if fields is not None or list_format != ListFormat.ROWS:
+        selected_fields = parse_fields(fields, ALBUM_FIELDS, ALBUM_SUMMARY_FIELDS)
+        stmt = stmt.options(*album_field_loaders(selected_fields))
+    else:
+        selected_fields = []
+        stmt = stmt.options(selectinload(Album.author_alias).joinedload(AuthorAlias.author))
+
     stmt = stmt.order_by(Album.title.asc())
     albums: Sequence[Album] = (await db.execute(stmt)).scalars().all()
+
+    from natsort import natsorted # pylint: disable=import-outside-toplevel
     albums = natsorted(albums, key=lambda album: album.title)
 
-    return models.AlbumsResponseModel(
+    if selected_fields:
+        return FastJSONResponse({
+            'albums': project(albums, selected_fields, ALBUM_FIELDS, list_format)
+        })
+
+    return FastJSONResponse(models.AlbumsResponseModel(
         albums=[album.to_model(include_author_alias=True) for album in albums],
+    ))
+
+@router.get('/api/albums/-/batch', response_model=models.FullAlbumsResponseModel)
+async def get_albums_batch(db: AsyncSession, ids: Annotated[list[str], Query()]) -> FastJSONResponse:
+    ''' Get multiple albums by id in one request (ids may be repeated or comma-separated; unknown ids are omitted) '''
+
+    album_ids = parse_id_list(ids)
+
+    stmt = select(Album).where(
+        Album.uuid.in_(album_ids)
+    ).options(
+        selectinload(Album.album_cover),
+        selectinload(Album.author_alias).joinedload(AuthorAlias.author),
+        selectinload(Album.tags)
+    )
+    albums: dict[str, Album] = {album.uuid: album for album in (await db.execute(stmt)).scalars().all()}
+
+    return FastJSONResponse(models.FullAlbumsResponseModel(
+        albums=[albums[album_id].to_full_model() for album_id in album_ids if album_id in albums]
+    ))
+
+@router.post('/api/albums/-/rebuild-summaries')
+async def rebuild_album_summary_projection(db: AsyncSession) -> models.OperationResultModel:
+    ''' Rebuild every album's listing summary, backfilling any missing image file sizes first '''
+
+    await backfill_image_file_stats(db)
+    await db.run_sync(rebuild_album_summaries)
+    await db.commit()
+
+    return models.OperationResultModel(
+        success=True
     )
 
 @router.post('/api/albums/-/create')
@@ -123,8 +202,8 @@ async def create_album(db: AsyncSession, album: models.CreateAlbumRequestModel)
         album=new_album.to_model()
     )
 
-@router.get('/api/albums/{album_id}')
-async def get_album(db: AsyncSession, album_id: str) -> models.FullAlbumResponseModel:
+@router.get('/api/albums/{album_id}', response_model=models.FullAlbumResponseModel)
+async def get_album(db: AsyncSession, album_id: str) -> FastJSONResponse:
     ''' Get an album '''
 
     stmt = select(Album).where(
@@ -139,9 +218,9 @@ async def get_album(db: AsyncSession, album_id: str) -> models.FullAlbumResponse
     if album is None:
         raise HTTPException(404, 'Album not found.')
 
-    return models.FullAlbumResponseModel(
+    return FastJSONResponse(models.FullAlbumResponseModel(
         album=album.to_full_model()
-    )
+    ))
 
 @router.patch('/api/albums/{album_id}')
 async def update_album(db: AsyncSession, album_id: str, album_data: models.UpdateAlbumRequestModel) -> models.AlbumResponseModel:
@@ -193,12 +272,10 @@ async def update_album(db: AsyncSession, album_id: str, album_data: models.Updat
 
 @router.delete('/api/albums/{album_id}')
 async def delete_album(db: AsyncSession, album_id: str) -> models.OperationResultModel:
-    ''' Delete an album (if disabled) '''
+    ''' Delete an album (if disabled); its files are removed afterwards, in the background '''
 
-    stmt = select(Album).where(
-        Album.uuid == album_id
-    ).options(selectinload(Album.images))
-    album: Album | None = (await db.execute(stmt)).scalars().first()
+    stmt = select(Album.id, Album.disabled).where(Album.uuid == album_id)
+    album = (await db.execute(stmt)).first()
 
     if album is None:
         raise HTTPException(404, 'Album not found.')
@@ -206,22 +283,16 @@ async def delete_album(db: AsyncSession, album_id: str) -> models.OperationResul
     if album.disabled == False:
         raise HTTPException(403, 'Album not disabled, cannot delete.')
 
-    # need to empty out the album cover reference, otherwise sqlalchemy explodes on the delete due to circular references
-    album.album_cover = None
+    # all set-based, so the cost doesn't scale with loading every image; the cover reference goes first (it's circular)
+    await add_tombstones(db, Image.album_id == album.id)
+    await db.run_sync(release_album_summaries, [album.id])
+    await db.execute(update(Album).where(Album.id == album.id).values(album_cover_id=None))
+    await db.execute(delete(album_tag_xref_table).where(album_tag_xref_table.c.album_id == album.id))
+    await db.execute(delete(Image).where(Image.album_id == album.id))
+    await db.execute(delete(Album).where(Album.id == album.id))
     await db.commit()
 
-    for image in album.images:
-        if image.uploaded == True and image.filename:
-            image_file: Path = IMAGE_UPLOAD_PATH / image.filename
-            thumbnail_file: Path = IMAGE_THUMBNAIL_PATH / image.filename
-            if await aio_os.path.exists(image_file):
-                await aio_os.unlink(image_file)
-
-            if await aio_os.path.exists(thumbnail_file):
-                await aio_os.unlink(thumbnail_file)
-
-    await db.delete(album)
-    await db.commit()
+    reaper.notify()
 
     return models.OperationResultModel(
         success=True
@@ -249,8 +320,8 @@ async def toggle_album_enabled(db: AsyncSession, album_id: str, state: Optional[
     )
 
 @router.post('/api/albums/{album_id}/regen-thumbnails')
-async def regenerate_album_image_thumbnails(db: AsyncSession, album_id: str) -> models.OperationResultModel:
-    ''' Regenerate all album image thumbnails '''
+async def regenerate_album_image_thumbnails(db: AsyncSession, album_id: str, force: bool = False) -> models.OperationResultModel:
+    ''' Regenerate all album image thumbnails that are stale (or all of them, when forced) '''
 
     stmt = select(Album).where(Album.uuid == album_id)
     album: Album | None = (await db.execute(stmt)).scalars().first()
@@ -268,7 +339,14 @@ async def regenerate_album_image_thumbnails(db: AsyncSession, album_id: str) ->
             logger.warning('Skipping image thumbnail regeneration, no image uploaded')
             continue
 
-        await run_in_threadpool(save_thumbnail, (IMAGE_UPLOAD_PATH / image.filename), image.uuid[0:3], image.filename)
+        if not force and await run_in_threadpool(
+            is_thumbnail_current, image.filename, image.thumbnail_signature, image.thumbnail_source_mtime, image.thumbnail_source_size
+        ):
+            continue
+
+        image.set_thumbnail_state(await run_in_threadpool(save_thumbnail, (IMAGE_UPLOAD_PATH / image.filename), image.uuid[0:3], image.filename))
+
+    await db.commit()
 
     return models.OperationResultModel(
         success=True
@@ -276,7 +354,7 @@ async def regenerate_album_image_thumbnails(db: AsyncSession, album_id: str) ->
 
 async def temp_file_handle():
     ''' Create (and in the event of failure, clean up after) a temp file '''
-    tempfile = TEMP_PATH / shortuuid.uuid()
+    tempfile = TEMP_PATH / generate_uuid()
     try:
         yield tempfile
     except: # pylint: disable=bare-except
@@ -298,6 +376,8 @@ async def download_album_as_cbz(
     ) -> FileResponse:
     ''' Serve the album itself as a single cbz archive '''
 
+    import zipfile # pylint: disable=import-outside-toplevel
+
     stmt = select(Album).where(
         Album.uuid == album_id
     ).options(
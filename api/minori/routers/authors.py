@@ -9,9 +9,12 @@ from sqlalchemy import select, and_, func
 from sqlalchemy.orm import selectinload
 
 from minori.db.connection import AsyncSession
-from minori.db.models import Album, Author, AuthorAlias
+from minori.db.models import Album, AlbumSummary, Author, AuthorAlias
+from minori.db.summary import get_album_page, get_album_summary_page, render_album_listing
 import minori.api_models as models
 from minori.logger import logger
+from minori.responses import FastJSONResponse
+from minori.summary_backfill import summary_backfill
 
 router = APIRouter(tags=['authors'])
 
@@ -126,67 +129,42 @@ async def get_author_aliases(db: AsyncSession, author_id: str) -> models.AuthorA
         author_aliases=[author_alias.to_model() for author_alias in author.author_aliases]
     )
 
-@router.get('/api/authors/{author_id}/albums')
-async def get_author_albums(db: AsyncSession, author_id: str, page: int = 1, include_disabled: bool = False) -> models.PaginatedFullAlbumsResponseModel:
+@router.get('/api/authors/{author_id}/albums', response_model=models.PaginatedFullAlbumsResponseModel)
+async def get_author_albums(db: AsyncSession, author_id: str, page: int = 1, include_disabled: bool = False) -> FastJSONResponse:
     ''' List all albums by this author '''
 
     page = max((page, 1))
     limit = 16
-    offset = (page - 1) * limit
-
-    stmt = select(Author).where(Author.uuid == author_id).options(selectinload(Author.author_aliases))
-    author: Author | None = (await db.execute(stmt)).scalars().first()
 
-    if author is None:
-        raise HTTPException(404, 'Author not found.')
-
-    author_alias_ids: list[int] = [author_alias.id for author_alias in author.author_aliases]
-
-    stmt = select(Album)
-
-    if include_disabled is False:
-        stmt = stmt.where(and_(
-            Album.author_alias_id.in_(author_alias_ids),
-            Album.disabled == False
-        ))
+    # served out of the album_summary projection (or the albums themselves, while it's being backfilled);
+    # the author lookup rides along as a subquery
+    author_pk = select(Author.id).where(Author.uuid == author_id).scalar_subquery()
+    if summary_backfill.complete:
+        criteria = [AlbumSummary.author_id == author_pk]
+        if include_disabled is False:
+            criteria.append(AlbumSummary.disabled == False)
+        album_json, total_records = await get_album_summary_page(db, criteria, page, limit)
     else:
-        stmt = stmt.where(Album.author_alias_id.in_(author_alias_ids))
-
-    stmt = stmt.order_by(Album.created_at.desc())
-    stmt = stmt.limit(limit).offset(offset)
-    stmt = stmt.options(
-        selectinload(Album.album_cover),
-        selectinload(Album.author_alias).joinedload(AuthorAlias.author),
-        selectinload(Album.tags)
-    )
-    albums: Sequence[Album] = (await db.execute(stmt)).scalars().all()
-
-    # pyright, it's a select count, THE TYPES DON'T WORK LIKE THAT, IT'S NOT GOING TO BE NONE
-    # and pylint, you shut up, func.count is in fact callable.
-    stmt = select(func.count('*')).select_from(Album) # type: ignore # pylint: disable=not-callable
+        criteria = [Album.author_alias_id.in_(select(AuthorAlias.id).where(AuthorAlias.author_id == author_pk))]
+        if include_disabled is False:
+            criteria.append(Album.disabled == False)
+        album_json, total_records = await get_album_page(db, criteria, page, limit)
 
-    if include_disabled is False:
-        stmt = stmt.where(and_(
-            Album.author_alias_id.in_(author_alias_ids),
-            Album.disabled == False
-        ))
-    else:
-        stmt = stmt.where(Album.author_alias_id.in_(author_alias_ids))
-    (total_records): int = (await db.execute(stmt)).scalars().first() # type: ignore
+    if total_records == 0:
+        stmt = select(Author.id).where(Author.uuid == author_id)
+        if (await db.execute(stmt)).scalars().first() is None:
+            raise HTTPException(404, 'Author not found.')
 
     total_pages = math.ceil(total_records / limit)
 
-    return models.PaginatedFullAlbumsResponseModel(
-        albums=[album.to_full_model() for album in albums],
-        pagination=models.PaginationModel(
-            first_page=1,
-            previous_page=(False if page <= 1 else (page - 1)), # pylint: disable=superfluous-parens
-            current_page=page,
-            next_page=(False if page >= total_pages else (page + 1)), # pylint: disable=superfluous-parens
-            last_page=total_pages,
-            total_records=total_records
-        )
-    )
+    return FastJSONResponse(render_album_listing(album_json, models.PaginationModel(
+        first_page=1,
+        previous_page=(False if page <= 1 else (page - 1)), # pylint: disable=superfluous-parens
+        current_page=page,
+        next_page=(False if page >= total_pages else (page + 1)), # pylint: disable=superfluous-parens
+        last_page=total_pages,
+        total_records=total_records
+    )))
 
 @router.post('/api/authors/{author_id}/merge/{consumed_author_id}')
 async def merge_author_into_author(
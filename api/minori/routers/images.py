@@ -6,27 +6,55 @@ import json
 import os
 from pathlib import Path
 import re
-from typing import Any, Optional, Sequence
+from typing import Annotated, Any, Optional, Sequence
 
 import aiofiles
 import aiofiles.os as aio_os
-from fastapi import APIRouter, HTTPException, UploadFile
-import shortuuid
-from sqlalchemy import select, and_
-from starlette.concurrency import run_in_threadpool
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, UploadFile
+from sqlalchemy import delete, select, and_, func, literal, or_, update
+from sqlalchemy.orm import aliased, load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 import minori.api_models as models
-from minori.core_config import IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH, TEMP_PATH
+from minori.core_config import IMAGE_BASE_FQDN, IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH, READER_MAX_WINDOW, TEMP_PATH
 from minori.db.connection import AsyncSession
-from minori.db.models import Album, Author, AuthorAlias, Image
-from minori.util import extract_zip, process_image, save_thumbnail
+from minori.db.models import generate_uuid, Album, Author, AuthorAlias, Image
+from minori.ordering import (
+    gap_exhausted, get_adjacent_image, get_album_images_in_order, has_position_ties, key_between, rebalance_album_order,
+    rebalance_album_order_in_background, write_album_order
+)
+from minori.db.summary import mark_albums_changed
+from minori.reaper import add_tombstones, reaper
+from minori.projection import IMAGE_FIELDS, IMAGE_FIELD_COLUMNS, ListFormat, parse_fields, project
+from minori.util import extract_zip, get_thumbnail_state, image_format, parse_id_list, process_image, save_thumbnail
 from minori.logger import logger
+from minori.timing import run_in_threadpool
+from minori.metrics import IMAGES_INGESTED, IMAGES_INGESTED_BYTES
+from minori.responses import FastJSONResponse
 
 router = APIRouter(tags=['images'])
 
-@router.get('/api/albums/{album_id}/images')
-async def get_album_images(db: AsyncSession, album_id: str) -> models.ImagesResponseModel:
-    ''' List all images associated with album '''
+@router.get('/api/images/-/batch', response_model=models.ImagesResponseModel)
+async def get_images_batch(db: AsyncSession, ids: Annotated[list[str], Query()]) -> FastJSONResponse:
+    ''' Get multiple images by id in one request (ids may be repeated or comma-separated; unknown ids are omitted) '''
+
+    image_ids = parse_id_list(ids)
+
+    stmt = select(Image).where(Image.uuid.in_(image_ids))
+    images: dict[str, Image] = {image.uuid: image for image in (await db.execute(stmt)).scalars().all()}
+
+    return FastJSONResponse(models.ImagesResponseModel(
+        images=[images[image_id].to_model() for image_id in image_ids if image_id in images]
+    ))
+
+@router.get('/api/albums/{album_id}/images', response_model=models.ImagesResponseModel)
+async def get_album_images(
+    db: AsyncSession,
+    album_id: str,
+    fields: Optional[str] = None,
+    list_format: Annotated[ListFormat, Query(alias='format')] = ListFormat.ROWS
+    ) -> FastJSONResponse:
+    ''' List all images associated with album (optionally only the given comma-separated fields, or as parallel arrays per field) '''
 
     stmt = select(Album).where(Album.uuid == album_id)
     album: Album | None = (await db.execute(stmt)).scalars().first()
@@ -37,10 +65,104 @@ async def get_album_images(db: AsyncSession, album_id: str) -> models.ImagesResp
     stmt = select(Image).where(
         Image.album_id == album.id
     ).order_by(Image.album_order_key.asc(), Image.original_filename.asc())
-    images: Sequence[Image] = (await db.execute(stmt)).scalars().all()
 
-    return models.ImagesResponseModel(
-        images=[image.to_model() for image in images]
+    if fields is None and list_format == ListFormat.ROWS:
+        images: Sequence[Image] = (await db.execute(stmt)).scalars().all()
+
+        return models.ImagesResponseModel(
+            images=[image.to_model() for image in images]
+        )
+
+    selected_fields = parse_fields(fields, IMAGE_FIELDS)
+    stmt = stmt.options(load_only(*[IMAGE_FIELD_COLUMNS[field] for field in selected_fields]))
+    images = (await db.execute(stmt)).scalars().all()
+
+    return FastJSONResponse({
+        'images': project(images, selected_fields, IMAGE_FIELDS, list_format)
+    })
+
+@router.get('/api/albums/{album_id}/reader', response_model=models.ReaderResponseModel)
+async def get_album_reader_page( # pylint: disable=too-many-locals
+    db: AsyncSession,
+    album_id: str,
+    image_id: Optional[str] = None,
+    window: Annotated[int, Query(ge=0, le=READER_MAX_WINDOW)] = 2
+    ) -> FastJSONResponse:
+    ''' Get everything the reader needs for one page: the album, the image, its position and a window of neighbors (defaults to the first image) '''
+
+    stmt = select(Album).where(
+        Album.uuid == album_id
+    ).options(selectinload(Album.author_alias).joinedload(AuthorAlias.author))
+    album: Album | None = (await db.execute(stmt)).scalars().first()
+
+    if album is None:
+        raise HTTPException(404, 'Album not found.')
+
+    # number every image in the album once, then only pull back the rows around the requested image
+    # (plus the first and last, for the pagination links)
+    # both windows share the album ordering, so they're computed in a single pass over the (album_id, album_order_key, original_filename) index
+    album_order = (Image.album_order_key.asc(), Image.original_filename.asc())
+    ranked = select(
+        Image,
+        func.row_number().over(order_by=album_order).label('position'),
+        func.count().over(order_by=album_order, rows=(None, None)).label('total_images') # pylint: disable=not-callable
+    ).where(
+        Image.album_id == album.id
+    ).cte('ranked')
+    ranked_image = aliased(Image, ranked)
+
+    if image_id is not None:
+        target_position = select(ranked.c.position).where(ranked.c.uuid == image_id).scalar_subquery()
+    else:
+        target_position = literal(1)
+
+    # always fetch the immediate neighbors, even with a zero window, for the previous/next links
+    span = max(window, 1)
+    stmt = select(ranked_image, ranked.c.position, ranked.c.total_images).where(
+        or_(
+            ranked.c.position.between(target_position - span, target_position + span),
+            ranked.c.position == 1,
+            ranked.c.position == ranked.c.total_images
+        )
+    )
+    rows = (await db.execute(stmt)).all()
+
+    # rows come back in no particular order (an ORDER BY would cost a sort); they're looked up by position instead
+    positions: dict[int, Image] = {row.position: row[0] for row in rows}
+    # without an image_id the first position is the current page
+    current_image = next((row for row in rows if (row.position == 1 if image_id is None else row[0].uuid == image_id)), None)
+
+    if current_image is None:
+        raise HTTPException(404, 'Image not found.')
+
+    image: Image = current_image[0]
+    position: int = current_image.position
+    total_images: int = current_image.total_images
+    neighbors = [positions[i] for i in range(position - window, position + window + 1) if i != position and i in positions]
+
+    # hint the browser to start fetching the next few pages while this one renders
+    preload_links = [
+        f'<{IMAGE_BASE_FQDN}/images/{positions[i].filename}>; rel=preload; as=image'
+        for i in range(position + 1, position + window + 1)
+        if i in positions and positions[i].filename
+    ]
+    headers = {'Link': ', '.join(preload_links)} if preload_links else None
+
+    return FastJSONResponse(
+        models.ReaderResponseModel(
+            album=album.to_model(include_author_alias=True),
+            image=image.to_model(),
+            position=models.ReaderPositionModel(
+                position=position,
+                total_images=total_images,
+                first_id=(False if position <= 1 else positions[1].uuid), # pylint: disable=superfluous-parens
+                previous_id=(False if position <= 1 else positions[position - 1].uuid), # pylint: disable=superfluous-parens
+                next_id=(False if position >= total_images else positions[position + 1].uuid), # pylint: disable=superfluous-parens
+                last_id=(False if position >= total_images else positions[total_images].uuid) # pylint: disable=superfluous-parens
+            ),
+            neighbors=[neighbor.to_model() for neighbor in neighbors]
+        ),
+        headers=headers
     )
 
 @router.post('/api/albums/{album_id}/images/-/create')
@@ -78,12 +200,17 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
     if album is None:
         raise HTTPException(404, 'Album not found.')
 
+    # end the lookup's transaction, so that the write lock (sqlite's only writer connection) isn't held while the archive
+    # is written, extracted and processed - everything below is written in one short transaction at the end
+    await db.commit()
+
     uploaded_zip: Path = TEMP_PATH / album.uuid
     temp_images_dir: Path = TEMP_PATH / f'{album.uuid}_files'
     files: list[Path] = []
     new_images: list[Image] = []
 
     is_cbz_file: bool = (os.path.splitext(file.filename)[-1].lower() == '.cbz') if file.filename else False
+    cbz: dict[str, Any] = {}
 
     new_album_cover: Optional[Image] = None
     await aio_os.mkdir(temp_images_dir)
@@ -98,28 +225,7 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
         if is_cbz_file:
             if index_file := next((_file for _file in files if _file.name == 'index.json'), None):
                 with index_file.open('r', encoding='utf-8') as fd:
-                    cbz: dict[str, Any] = json.load(fd)
-                    if 'public_url' in cbz:
-                        album.url = cbz['public_url']
-                    if 'author' in cbz:
-                        album.author = cbz['author'] # todo: deprecate and remove
-
-                        author_name = cbz['author'] or 'Unknown author'
-                        stmt = select(AuthorAlias).where(AuthorAlias.name == author_name)
-                        author_alias: Optional[AuthorAlias] = (await db.execute(stmt)).scalars().first()
-
-                        if author_alias is None:
-                            new_author = Author(name=author_name)
-                            new_author_alias = AuthorAlias(name=author_name, author=new_author)
-
-                            db.add(new_author)
-                            db.add(new_author_alias)
-
-                            author_alias = new_author_alias
-
-                        album.author_alias = author_alias
-                    if 'title' in cbz:
-                        album.title = cbz['title']
+                    cbz = json.load(fd)
 
                     if 'id' in cbz and 'chapters' in cbz:
                         cbz_id = str(cbz['id'])
@@ -132,7 +238,7 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
                     # todo: support tag importing
 
         for _file in files:
-            uuid = shortuuid.uuid()
+            uuid = generate_uuid()
             result = await run_in_threadpool(process_image, _file, uuid, raise_on_nonimage=False)
             if result == False:
                 continue
@@ -143,6 +249,8 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
             new_image = Image(
                 uuid=uuid,
                 filename=result,
+                file_format=image_format(result),
+                file_size=(await aio_os.stat(IMAGE_UPLOAD_PATH / result)).st_size,
                 original_filename=re.sub(f'^{filename_prefix}', '', _file.name) if filename_prefix != '' else _file.name, # pylint: disable=consider-using-f-string
                 uploaded=True,
                 created_at=datetime.now(),
@@ -150,6 +258,9 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
                 album=album,
                 album_order_key=0
             )
+            new_image.set_thumbnail_state(await run_in_threadpool(get_thumbnail_state, result))
+            IMAGES_INGESTED.inc(labels=(new_image.file_format,))
+            IMAGES_INGESTED_BYTES.inc(new_image.file_size, (new_image.file_format,))
 
             db.add(new_image)
             new_images.append(new_image)
@@ -177,6 +288,28 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
             await aio_os.unlink(_file)
         await aio_os.rmdir(temp_images_dir)
 
+    if 'public_url' in cbz:
+        album.url = cbz['public_url']
+    if 'author' in cbz:
+        album.author = cbz['author'] # todo: deprecate and remove
+
+        author_name = cbz['author'] or 'Unknown author'
+        stmt = select(AuthorAlias).where(AuthorAlias.name == author_name)
+        author_alias: Optional[AuthorAlias] = (await db.execute(stmt)).scalars().first()
+
+        if author_alias is None:
+            new_author = Author(name=author_name)
+            new_author_alias = AuthorAlias(name=author_name, author=new_author)
+
+            db.add(new_author)
+            db.add(new_author_alias)
+
+            author_alias = new_author_alias
+
+        album.author_alias = author_alias
+    if 'title' in cbz:
+        album.title = cbz['title']
+
     await db.commit()
 
     if new_album_cover:
@@ -191,8 +324,8 @@ async def create_album_images_from_archive(db: AsyncSession, album_id: str, file
         images=[new_image.to_model() for new_image in new_images]
     )
 
-@router.get('/api/albums/{album_id}/images/{image_id}')
-async def get_album_image(db: AsyncSession, album_id: str, image_id: str) -> models.ImageResponseModel:
+@router.get('/api/albums/{album_id}/images/{image_id}', response_model=models.ImageResponseModel)
+async def get_album_image(db: AsyncSession, album_id: str, image_id: str) -> FastJSONResponse:
     ''' Get an album image's metadata '''
 
     stmt = select(Album).where(Album.uuid == album_id)
@@ -212,9 +345,9 @@ async def get_album_image(db: AsyncSession, album_id: str, image_id: str) -> mod
     if image is None:
         raise HTTPException(404, 'Image not found.')
 
-    return models.ImageResponseModel(
+    return FastJSONResponse(models.ImageResponseModel(
         image=image.to_model()
-    )
+    ))
 
 @router.put('/api/albums/{album_id}/images/{image_id}/upload')
 async def upload_album_image(db: AsyncSession, album_id: str, image_id: str, file: UploadFile) -> models.ImageResponseModel:
@@ -237,7 +370,10 @@ async def upload_album_image(db: AsyncSession, album_id: str, image_id: str, fil
     if image is None:
         raise HTTPException(404, 'Image not found.')
 
-    image.original_filename = file.filename
+    # as with archives, the write transaction only starts once the file has been processed
+    await db.commit()
+
+    image.original_filename = file.filename[:255] if file.filename else file.filename
     tempfile: Path = TEMP_PATH / image.uuid
     try:
         async with aiofiles.open(tempfile, 'wb') as fd:
@@ -248,6 +384,11 @@ async def upload_album_image(db: AsyncSession, album_id: str, image_id: str, fil
             raise HTTPException(400, 'Invalid file uploaded.')
 
         image.filename = result
+        image.file_format = image_format(result)
+        image.file_size = (await aio_os.stat(IMAGE_UPLOAD_PATH / result)).st_size
+        image.set_thumbnail_state(await run_in_threadpool(get_thumbnail_state, result))
+        IMAGES_INGESTED.inc(labels=(image.file_format,))
+        IMAGES_INGESTED_BYTES.inc(image.file_size, (image.file_format,))
     except Exception as err: # pylint: disable=broad-except
         logger.error('Image upload failed')
         logger.exception(err)
@@ -293,6 +434,122 @@ async def update_album_image_order(db: AsyncSession, album_id: str, image_id: st
         image=image.to_model()
     )
 
+@router.post('/api/albums/{album_id}/images/-/reorder')
+async def reorder_album_images(db: AsyncSession, album_id: str, payload: models.ReorderImagesRequestModel) -> models.ImagesResponseModel:
+    ''' Reorder many album images at once (all of them, or a subset among the positions they already hold), returning the new ordering '''
+
+    stmt = select(Album.id).where(Album.uuid == album_id)
+    album_pk: int | None = (await db.execute(stmt)).scalars().first()
+
+    if album_pk is None:
+        raise HTTPException(404, 'Album not found.')
+
+    images = await get_album_images_in_order(db, album_pk)
+
+    by_uuid = {image.uuid: image for image in images}
+    if len(set(payload.image_ids)) != len(payload.image_ids):
+        raise HTTPException(400, 'Duplicate image ids in ordering.')
+    if any(image_id not in by_uuid for image_id in payload.image_ids):
+        raise HTTPException(400, 'Unknown image ids in ordering.')
+
+    # slot the given images, in their new order, into the positions they currently occupy
+    reordered = iter(by_uuid[image_id] for image_id in payload.image_ids)
+    moving = set(payload.image_ids)
+    images = [next(reordered) if image.uuid in moving else image for image in images]
+
+    # renumber the whole album (which also bakes in any unordered images), writing only the keys that changed
+    await write_album_order(db, images)
+    await db.commit()
+
+    return models.ImagesResponseModel(
+        images=[image.to_model() for image in images]
+    )
+
+@router.post('/api/albums/{album_id}/images/{image_id}/move')
+async def move_album_image( # pylint: disable=too-many-branches
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    album_id: str,
+    image_id: str,
+    payload: models.MoveImageRequestModel
+    ) -> models.ImageResponseModel:
+    ''' Move an image between two others (or to the start/end of the album), rewriting only that image's order key '''
+
+    stmt = select(Album.id).where(Album.uuid == album_id)
+    album_pk: int | None = (await db.execute(stmt)).scalars().first()
+
+    if album_pk is None:
+        raise HTTPException(404, 'Album not found.')
+
+    if image_id in (payload.after_id, payload.before_id):
+        raise HTTPException(400, 'Cannot move an image next to itself.')
+
+    stmt = select(Image).where(
+        and_(
+            Image.uuid.in_([_id for _id in (image_id, payload.after_id, payload.before_id) if _id is not None]),
+            Image.album_id == album_pk
+        )
+    )
+    by_uuid: dict[str, Image] = {image.uuid: image for image in (await db.execute(stmt)).scalars().all()}
+
+    image = by_uuid.get(image_id)
+    if image is None:
+        raise HTTPException(404, 'Image not found.')
+
+    after = by_uuid.get(payload.after_id) if payload.after_id is not None else None
+    before = by_uuid.get(payload.before_id) if payload.before_id is not None else None
+    if (payload.after_id is not None and after is None) or (payload.before_id is not None and before is None):
+        raise HTTPException(400, 'Neighboring image not found.')
+
+    if after is None and before is None:
+        raise HTTPException(400, 'Either an image to move after or an image to move before is required.')
+
+    if await has_position_ties(db, album_pk, [neighbor for neighbor in (after, before) if neighbor is not None]):
+        # images holding the same key and filename have no defined order among themselves (an album that was never
+        # ordered), so respread the album first; the neighbors are refreshed in place
+        await rebalance_album_order(db, album_pk)
+
+    # the image lands between two images that end up adjacent to it, so whichever side was left out is looked up
+    if after is not None:
+        following = await get_adjacent_image(db, album_pk, after, image.id, following=True)
+        if before is None:
+            before = following
+        elif following is not before:
+            raise HTTPException(400, 'The images to move between must be next to each other.')
+    else:
+        after = await get_adjacent_image(db, album_pk, before, image.id, following=False) # type: ignore
+
+    # any other image sharing a neighbor's key sorts beyond that neighbor (or it wouldn't be adjacent), so a key strictly
+    # between the two places the image exactly between them
+    lower = after.album_order_key if after is not None else None
+    upper = before.album_order_key if before is not None else None
+    key = key_between(lower, upper)
+
+    if key is None:
+        # out of room (or neighbors sharing a key), so respread the album first; the neighbors are refreshed in place
+        await rebalance_album_order(db, album_pk)
+        lower = after.album_order_key if after is not None else None
+        upper = before.album_order_key if before is not None else None
+        key = key_between(lower, upper)
+        if key is None:
+            raise HTTPException(409, 'The album has too many images to order them by key.')
+
+    await db.execute(
+        update(Image)
+            .where(Image.id == image.id)
+            .values(album_order_key=key)
+            .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    set_committed_value(image, 'album_order_key', key)
+
+    if gap_exhausted(key, lower, upper):
+        background_tasks.add_task(rebalance_album_order_in_background, album_pk)
+
+    return models.ImageResponseModel(
+        image=image.to_model()
+    )
+
 @router.post('/api/albums/{album_id}/images/{image_id}/make-cover')
 async def mark_album_image_as_cover(db: AsyncSession, album_id: str, image_id: str) -> models.OperationResultModel:
     ''' Mark an album image as the cover for the album '''
@@ -346,7 +603,8 @@ async def regenerate_image_thumbnail(db: AsyncSession, album_id: str, image_id:
     if not image.uploaded or not image.filename:
         raise HTTPException(400, 'Image not yet uploaded, cannot regenerate thumbnail.')
 
-    await run_in_threadpool(save_thumbnail, (IMAGE_UPLOAD_PATH / image.filename), image.uuid[0:3], image.filename)
+    image.set_thumbnail_state(await run_in_threadpool(save_thumbnail, (IMAGE_UPLOAD_PATH / image.filename), image.uuid[0:3], image.filename))
+    await db.commit()
 
     return models.OperationResultModel(
         success=True
@@ -354,37 +612,31 @@ async def regenerate_image_thumbnail(db: AsyncSession, album_id: str, image_id:
 
 @router.delete('/api/albums/{album_id}/images/{image_id}')
 async def delete_album_image(db: AsyncSession, album_id: str, image_id: str) -> models.OperationResultModel:
-    ''' Delete an album image '''
+    ''' Delete an album image; its files are removed afterwards, in the background '''
 
-    stmt = select(Album).where(Album.uuid == album_id)
-    album: Album | None = (await db.execute(stmt)).scalars().first()
-
-    if album is None:
-        raise HTTPException(404, 'Album not found.')
-
-    stmt = select(Image).where(
+    stmt = select(Image.id, Image.album_id).join(Album, Image.album_id == Album.id).where(
         and_(
-            Image.uuid == image_id,
-            Image.album_id == album.id
+            Album.uuid == album_id,
+            Image.uuid == image_id
         )
     )
-    image: Image | None = (await db.execute(stmt)).scalars().first()
+    image = (await db.execute(stmt)).first()
 
     if image is None:
-        raise HTTPException(404, 'Image not found.')
-
-    if image.uploaded == True and image.filename:
-        image_file: Path = IMAGE_UPLOAD_PATH / image.filename
-        thumbnail_file: Path = IMAGE_THUMBNAIL_PATH / image.filename
-        if await aio_os.path.exists(image_file):
-            await aio_os.unlink(image_file)
+        stmt = select(Album.id).where(Album.uuid == album_id)
+        if (await db.execute(stmt)).first() is None:
+            raise HTTPException(404, 'Album not found.')
 
-        if await aio_os.path.exists(thumbnail_file):
-            await aio_os.unlink(thumbnail_file)
+        raise HTTPException(404, 'Image not found.')
 
-    await db.delete(image)
+    await add_tombstones(db, Image.id == image.id)
+    await db.execute(update(Album).where(Album.album_cover_id == image.id).values(album_cover_id=None))
+    await db.execute(delete(Image).where(Image.id == image.id))
+    mark_albums_changed(db.sync_session, [image.album_id])
     await db.commit()
 
+    reaper.notify()
+
     return models.OperationResultModel(
         success=True
     )
@@ -0,0 +1,119 @@
+''' library statistics endpoints '''
+# pylint: disable=singleton-comparison
+
+from collections import defaultdict
+import json
+
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import select
+
+from minori.db.connection import AsyncSession
+from minori.db.models import Album, AlbumSummary, Author, StatAggregate
+from minori.db.stats import SCOPE_AUTHOR, backfill_image_file_stats
+from minori.db.summary import rebuild_album_summaries
+import minori.api_models as models
+
+router = APIRouter(tags=['stats'])
+
+def empty_stats() -> models.StatsModel:
+    ''' Stats for a scope with nothing in it yet '''
+
+    return models.StatsModel(
+        album_count=0,
+        image_count=0,
+        original_bytes=0,
+        derivative_bytes=0
+    )
+
+@router.get('/api/stats')
+async def get_library_stats(db: AsyncSession) -> models.FullStatsResponseModel:
+    ''' Get storage statistics for the whole library, including a per-format breakdown '''
+
+    # summed from the one summary row per album, rather than kept in shared aggregate rows that every write would have to lock
+    stmt = select(AlbumSummary.image_count, AlbumSummary.total_bytes, AlbumSummary.derivative_bytes, AlbumSummary.formats)
+    album_count = image_count = original_bytes = derivative_bytes = 0
+    formats: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+    for row in (await db.execute(stmt)).all():
+        album_count += 1
+        image_count += row.image_count
+        original_bytes += row.total_bytes
+        derivative_bytes += row.derivative_bytes
+        for file_format, (format_images, format_bytes) in json.loads(row.formats).items():
+            formats[file_format][0] += format_images
+            formats[file_format][1] += format_bytes
+
+    return models.FullStatsResponseModel(
+        stats=models.StatsModel(
+            album_count=album_count,
+            image_count=image_count,
+            original_bytes=original_bytes,
+            derivative_bytes=derivative_bytes
+        ),
+        formats=[
+            models.FormatStatsModel(
+                format=file_format,
+                image_count=format_images,
+                original_bytes=format_bytes
+            ) for file_format, (format_images, format_bytes) in sorted(formats.items()) if format_images > 0
+        ]
+    )
+
+@router.post('/api/stats/-/rebuild')
+async def rebuild_library_stats(db: AsyncSession) -> models.OperationResultModel:
+    ''' Recompute every statistics aggregate from scratch, backfilling any missing image file stats first '''
+
+    await backfill_image_file_stats(db)
+    await db.run_sync(rebuild_album_summaries)
+    await db.commit()
+
+    return models.OperationResultModel(
+        success=True
+    )
+
+@router.get('/api/albums/{album_id}/stats')
+async def get_album_stats(db: AsyncSession, album_id: str) -> models.StatsResponseModel:
+    ''' Get storage statistics for an album '''
+
+    stmt = select(AlbumSummary.image_count, AlbumSummary.total_bytes, AlbumSummary.derivative_bytes).where(
+        AlbumSummary.album_uuid == album_id
+    )
+    summary = (await db.execute(stmt)).first()
+
+    if summary is None:
+        stmt = select(Album.id).where(Album.uuid == album_id)
+        if (await db.execute(stmt)).first() is None:
+            raise HTTPException(404, 'Album not found.')
+
+        # not summarized yet (summaries are refreshed on commit, so this should be short-lived)
+        return models.StatsResponseModel(
+            stats=empty_stats()
+        )
+
+    return models.StatsResponseModel(
+        stats=models.StatsModel(
+            album_count=1,
+            image_count=summary.image_count,
+            original_bytes=summary.total_bytes,
+            derivative_bytes=summary.derivative_bytes
+        )
+    )
+
+@router.get('/api/authors/{author_id}/stats')
+async def get_author_stats(db: AsyncSession, author_id: str) -> models.StatsResponseModel:
+    ''' Get storage statistics for an author's albums '''
+
+    stmt = select(Author.id).where(Author.uuid == author_id)
+    author_pk: int | None = (await db.execute(stmt)).scalars().first()
+
+    if author_pk is None:
+        raise HTTPException(404, 'Author not found.')
+
+    stmt = select(StatAggregate).where(
+        StatAggregate.scope == SCOPE_AUTHOR,
+        StatAggregate.scope_key == str(author_pk)
+    )
+    aggregate: StatAggregate | None = (await db.execute(stmt)).scalars().first()
+
+    return models.StatsResponseModel(
+        stats=aggregate.to_model() if aggregate is not None else empty_stats()
+    )
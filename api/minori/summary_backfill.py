@@ -0,0 +1,77 @@
+''' background backfill of albums missing from the album_summary projection, e.g. on the first start after the migration adding it '''
+
+import asyncio
+from typing import Optional
+
+from minori.core_config import SUMMARY_BACKFILL_BATCH_SIZE
+from minori.db.connection import dbconn
+from minori.db.summary import get_albums_without_summary, rebuild_album_summaries
+from minori.logger import logger
+
+# how long to wait before retrying a failed batch (e.g. another api process summarizing the same albums)
+RETRY_INTERVAL = 5
+
+class SummaryBackfill:
+    ''' summarizes the albums missing from the projection in small transactions; listings stay off the projection until it's complete '''
+
+    def __init__(self) -> None:
+        ''' Constructor '''
+
+        self.task: Optional[asyncio.Task] = None
+        self.complete = False
+
+    async def start(self) -> None:
+        ''' Check for albums without a summary, backfilling them in the background if there are any '''
+
+        async with dbconn.get_session() as db:
+            missing = await get_albums_without_summary(db, 1)
+
+        self.complete = not missing
+        if not self.complete:
+            logger.warning('Some albums have no listing summary, summarizing them in the background; listings are rendered from the albums until done')
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        ''' Stop backfilling (anything unfinished is picked up again on the next start) '''
+
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def run(self) -> None:
+        ''' Summarize batches of albums until none are missing '''
+
+        summarized = 0
+        while True:
+            try:
+                count = await self.backfill_batch()
+            except Exception as err: # pylint: disable=broad-except
+                logger.exception(err)
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+
+            if count == 0:
+                break
+            summarized += count
+
+        self.complete = True
+        logger.info(f'Summarized {summarized} albums, listings are served from the album_summary projection again')
+
+    async def backfill_batch(self) -> int:
+        ''' Summarize one batch of albums missing from the projection, returning the batch size '''
+
+        async with dbconn.get_session() as db:
+            album_ids = await get_albums_without_summary(db, SUMMARY_BACKFILL_BATCH_SIZE)
+            if album_ids:
+                await db.run_sync(rebuild_album_summaries, album_ids)
+                await db.commit()
+
+        return len(album_ids)
+
+summary_backfill = SummaryBackfill()
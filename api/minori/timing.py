@@ -0,0 +1,105 @@
+''' per-request timing breakdown (database, threadpool, rendering), reported in a Server-Timing header '''
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from sqlalchemy.engine import Connection
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from minori.core_config import CORS_DOMAINS_ALLOWED, SERVER_TIMING_ENABLED, SERVER_TIMING_LOG_THRESHOLD
+from minori.db.statement_timing import on_statement_finished
+from minori.logger import logger
+
+T = TypeVar('T')
+
+class RequestTimings:
+    ''' accumulated time and count per span name for one request (shared with threadpool workers through the context) '''
+
+    def __init__(self) -> None:
+        ''' Constructor '''
+
+        self.started = time.perf_counter()
+        self.spans: dict[str, list[float]] = {}
+
+    def add(self, name: str, duration: float) -> None:
+        ''' Add one occurrence of a span '''
+
+        totals = self.spans.setdefault(name, [0.0, 0])
+        totals[0] += duration
+        totals[1] += 1
+
+    def header(self) -> str:
+        ''' Format the spans as a Server-Timing header value, with the total time so far as "app" '''
+
+        entries = [
+            f'{name};dur={duration * 1000:.1f};desc="{int(count)}x"' for name, (duration, count) in self.spans.items()
+        ]
+        entries.append(f'app;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(entries)
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    ''' Time a block into the current request's breakdown (a no-op outside of a request) '''
+
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+async def run_in_threadpool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    ''' starlette's run_in_threadpool, timed as a "threadpool" span (waiting for a free worker thread included) '''
+
+    with span('threadpool'):
+        return await _run_in_threadpool(func, *args, **kwargs)
+
+@on_statement_finished
+def _add_db_span(conn: Connection, statement: str, parameters: Any, executemany: bool, duration: float) -> None: # pylint: disable=unused-argument
+    ''' Add a finished statement to the request's "db" span '''
+
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add('db', duration)
+
+class ServerTimingMiddleware:
+    ''' middleware that collects a request's timing breakdown and sends it along as a Server-Timing header '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        ''' middleware init '''
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        ''' track the request's spans, adding the header as the response starts '''
+        if scope['type'] != 'http' or not SERVER_TIMING_ENABLED:
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                value = timings.header()
+                headers = MutableHeaders(scope=message)
+                headers.append('Server-Timing', value)
+                # lets the allowed (cross-origin) frontends read the breakdown through the resource timing api too
+                headers.append('Timing-Allow-Origin', ', '.join(CORS_DOMAINS_ALLOWED))
+
+                if SERVER_TIMING_LOG_THRESHOLD and time.perf_counter() - timings.started >= SERVER_TIMING_LOG_THRESHOLD:
+                    logger.info(f'{scope["method"]} {scope["path"]} {message["status"]}: {value}')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
@@ -2,15 +2,22 @@
 
 import os
 from pathlib import Path
-from typing import Literal
-import zipfile
+from typing import Any, Literal
 
 from fastapi import HTTPException
-from natsort import natsorted
-from PIL import Image as img
-import shortuuid
 
-from minori.core_config import ALLOWED_FILE_TYPES, IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH, IMAGE_THUMBNAIL_SIZE
+from minori.core_config import (
+    ALLOWED_FILE_TYPES, BATCH_MAX_IDS, IMAGE_UPLOAD_PATH, IMAGE_THUMBNAIL_PATH, IMAGE_THUMBNAIL_QUALITY, IMAGE_THUMBNAIL_SIZE
+)
+from minori.metrics import PIPELINE_STAGE_DURATION
+
+# Pillow, natsort, zipfile and shortuuid are imported where they're used: they're only needed once images are processed,
+# and deferring them keeps them out of startup (and out of the migration job, which imports this module through the db layer)
+
+# bump whenever the way thumbnails are rendered changes, so that every existing thumbnail counts as stale
+THUMBNAIL_PIPELINE_VERSION = 1
+# formats whose thumbnails depend on IMAGE_THUMBNAIL_QUALITY (the rest are saved lossless)
+LOSSY_FILE_TYPES = ('jpg', 'jpeg', 'webp')
 
 def get_env_secret(env_name: str, default: str | None = None) -> str | None:
     ''' Get secrets from env var, preferring _FILE secrets but using directly passed secrets if available '''
@@ -25,11 +32,14 @@ def get_env_secret(env_name: str, default: str | None = None) -> str | None:
 def extract_zip(uploaded_zip: Path, tempdir: Path):
     ''' Extract a zip file of all images and return a list of all files present '''
 
+    import zipfile # pylint: disable=import-outside-toplevel
+    from natsort import natsorted # pylint: disable=import-outside-toplevel
+
     if not zipfile.is_zipfile(uploaded_zip):
         raise HTTPException(400, 'Invalid archive detected.')
 
     files: list[Path] = []
-    with zipfile.ZipFile(uploaded_zip, 'r') as zfd:
+    with PIPELINE_STAGE_DURATION.time(('extract_archive',)), zipfile.ZipFile(uploaded_zip, 'r') as zfd:
         members = zfd.infolist()
         members = natsorted(members, key=lambda member: Path(member.filename).name)
 
@@ -44,9 +54,12 @@ def extract_zip(uploaded_zip: Path, tempdir: Path):
 def process_image(tempfile: Path, image_uuid: str, raise_on_nonimage: bool = True) -> str | Literal[False]:
     ''' Save and generate a thumbnail for a given image (warning: synchronous) '''
 
+    from PIL import Image as img # pylint: disable=import-outside-toplevel
+    import shortuuid # pylint: disable=import-outside-toplevel
+
     filename: str = ''
     try:
-        with img.open(tempfile) as fd:
+        with PIPELINE_STAGE_DURATION.time(('verify',)), img.open(tempfile) as fd:
             fd.verify()
     except Exception as err: # pylint: disable=broad-except
         if raise_on_nonimage is False:
@@ -55,7 +68,7 @@ def process_image(tempfile: Path, image_uuid: str, raise_on_nonimage: bool = Tru
         raise HTTPException(400, 'Invalid image detected.') from err
 
     file_type = ''
-    with img.open(tempfile) as fd:
+    with PIPELINE_STAGE_DURATION.time(('identify',)), img.open(tempfile) as fd:
         file_type = (fd.format or '').lower()
 
         if file_type not in ALLOWED_FILE_TYPES:
@@ -74,7 +87,9 @@ def process_image(tempfile: Path, image_uuid: str, raise_on_nonimage: bool = Tru
 def save_image(original_file: Path, sub_path_slice: str, filename: str) -> None:
     ''' Save the image to the upload path '''
 
-    with img.open(original_file) as fd:
+    from PIL import Image as img # pylint: disable=import-outside-toplevel
+
+    with PIPELINE_STAGE_DURATION.time(('save_image',)), img.open(original_file) as fd:
         (IMAGE_UPLOAD_PATH / sub_path_slice).mkdir(mode=0o775, exist_ok=True)
         image_file_path: Path = IMAGE_UPLOAD_PATH / filename
 
@@ -84,15 +99,72 @@ def save_image(original_file: Path, sub_path_slice: str, filename: str) -> None:
         else:
             fd.save(image_file_path)
 
-def save_thumbnail(original_file: Path, sub_path_slice: str, filename: str) -> None:
-    ''' Generate and save a thumbnail to the thumbnail path '''
+def save_thumbnail(original_file: Path, sub_path_slice: str, filename: str) -> dict[str, Any]:
+    ''' Generate and save a thumbnail to the thumbnail path, returning its state (see get_thumbnail_state) '''
+
+    from PIL import Image as img # pylint: disable=import-outside-toplevel
 
-    with img.open(original_file) as fd:
+    with PIPELINE_STAGE_DURATION.time(('save_thumbnail',)), img.open(original_file) as fd:
         (IMAGE_THUMBNAIL_PATH / sub_path_slice).mkdir(mode=0o775, exist_ok=True)
         thumbnail_file_path: Path = IMAGE_THUMBNAIL_PATH / filename
 
-        if thumbnail_file_path.exists():
-            thumbnail_file_path.unlink()
-
+        # render next to the old thumbnail and swap it in, so it's never missing while being rebuilt
+        temp_file_path = thumbnail_file_path.with_name(f'.{thumbnail_file_path.name}.tmp')
         fd.thumbnail((IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_SIZE))
-        fd.save(thumbnail_file_path)
+        try:
+            fd.save(temp_file_path, format=img.registered_extensions()[thumbnail_file_path.suffix.lower()], quality=IMAGE_THUMBNAIL_QUALITY)
+            os.replace(temp_file_path, thumbnail_file_path)
+        finally:
+            if temp_file_path.exists():
+                temp_file_path.unlink()
+
+    return get_thumbnail_state(filename)
+
+def thumbnail_signature(file_format: str) -> str:
+    ''' Describe the parameters a thumbnail of the given format is currently rendered with '''
+
+    quality = f'/q{IMAGE_THUMBNAIL_QUALITY}' if file_format in LOSSY_FILE_TYPES else ''
+    return f'v{THUMBNAIL_PIPELINE_VERSION}/{IMAGE_THUMBNAIL_SIZE}/{file_format}{quality}'
+
+def get_thumbnail_state(filename: str) -> dict[str, Any]:
+    ''' Get the size of a freshly rendered thumbnail and what it was built from, keyed by the Image columns that record it (warning: synchronous) '''
+
+    source = (IMAGE_UPLOAD_PATH / filename).stat()
+    return {
+        'thumbnail_size': (IMAGE_THUMBNAIL_PATH / filename).stat().st_size,
+        'thumbnail_signature': thumbnail_signature(image_format(filename)),
+        'thumbnail_source_mtime': source.st_mtime_ns,
+        'thumbnail_source_size': source.st_size,
+    }
+
+def is_thumbnail_current(filename: str, signature: str | None, source_mtime: int | None, source_size: int | None) -> bool:
+    ''' Check whether an image's thumbnail was built with the current parameters from the current original (warning: synchronous) '''
+
+    if signature != thumbnail_signature(image_format(filename)):
+        return False
+
+    try:
+        source = (IMAGE_UPLOAD_PATH / filename).stat()
+    except FileNotFoundError:
+        return False
+
+    return source.st_mtime_ns == source_mtime and source.st_size == source_size and (IMAGE_THUMBNAIL_PATH / filename).exists()
+
+def image_format(filename: str) -> str:
+    ''' Get the stored format of an image from its (processed) filename '''
+
+    return Path(filename).suffix[1:].lower()
+
+def parse_id_list(ids: list[str]) -> list[str]:
+    ''' Normalize a list of ids passed as repeated and/or comma-separated query params (deduplicated, order preserved) '''
+
+    parsed: dict[str, None] = {}
+    for entry in ids:
+        for _id in entry.split(','):
+            if _id := _id.strip():
+                parsed[_id] = None
+
+        if len(parsed) > BATCH_MAX_IDS:
+            raise HTTPException(400, f'Too many ids requested; a maximum of {BATCH_MAX_IDS} is allowed.')
+
+    return list(parsed)
@@ -3,15 +3,24 @@
 # pylint: disable=invalid-name
 
 import argparse
+from concurrent.futures import as_completed, ThreadPoolExecutor
 import json
 import logging
+import os
 from pathlib import Path
+import random
 import sys
-import tempfile
-import zipfile
+import threading
+import time
+from typing import Any, Callable, Optional
+import uuid
 
 from natsort import natsorted
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from zipstream import stream_album_zip
 
 # set up logging configuration - only to stdout/stderr for now
 class ErrorLogFilter(logging.Filter):
@@ -41,89 +50,276 @@ logger.addHandler(log_stderr_handler)
 
 logger.setLevel(logging.INFO)
 
-def main( # pylint: disable=too-many-branches
-        import_config: Path,
-        minori_api_url: str,
-    ) -> None:
-    ''' main method '''
+# responses worth another attempt: the server (or a proxy in front of it) is overloaded or restarting
+RETRY_STATUSES = (429, 502, 503, 504)
+# of those, the ones that mean the request was turned away rather than (maybe) processed; a 502/504 may come from a
+# proxy giving up on a server that is still working on the request
+REJECTED_STATUSES = (429, 503)
+MAX_BACKOFF = 60
 
-    if not import_config.exists():
-        raise ValueError('Provided import config file path does not exist')
+class UncertainRequestError(Exception):
+    ''' a request that isn't safe to repeat failed in a way that leaves open whether the server applied it '''
 
-    if not import_config.is_file():
-        raise ValueError('Provided import config file path is not a file')
+def never_sent(err: requests.RequestException) -> bool:
+    ''' Whether a request failed before reaching the server, so that repeating it can't apply it twice '''
 
-    with import_config.open('r') as fd:
-        config = json.load(fd)
+    if isinstance(err, requests.ConnectTimeout):
+        return True
+
+    # connection refused, unresolvable host and the like, wrapped by urllib3's MaxRetryError
+    reason = getattr(err.args[0], 'reason', None) if err.args else None
+    return isinstance(reason, NewConnectionError)
+
+class MinoriClient:
+    ''' pooled, keep-alive HTTP client for the minori api, retrying transient failures with exponential backoff '''
+
+    def __init__(self, api_url: str, workers: int, retries: int, backoff: float) -> None:
+        ''' Constructor '''
+
+        self.api_url = api_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+
+        # one connection per worker, reused across requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, path: str) -> str:
+        ''' Get the full url of an api path '''
+
+        return f'{self.api_url}{path}'
+
+    def request(self, method: str, path: str, timeout: float = 30, idempotent: Optional[bool] = None, **kwargs: Any) -> requests.Response:
+        ''' Send a request, retrying transient failures (only those where it can't have been applied yet, unless it's idempotent) '''
+
+        return self.retry(
+            lambda: self.session.request(method, self.url(path), timeout=timeout, **kwargs),
+            f'{method} {path}',
+            idempotent=method != 'POST' if idempotent is None else idempotent
+        )
+
+    def retry(self, send: Callable[[], requests.Response], description: str, idempotent: bool = True) -> requests.Response:
+        ''' Call send until it gets a response that isn't a transient failure, or the retries run out '''
+
+        for attempt in range(self.retries + 1):
+            delay = min(self.backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.5)
+            try:
+                res = send()
+                if res.status_code in RETRY_STATUSES and not idempotent and res.status_code not in REJECTED_STATUSES:
+                    raise UncertainRequestError(f'{description} failed with status {res.status_code}; it may have been applied anyway')
+                if res.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return res
+                reason = f'status {res.status_code}'
+                if retry_after := res.headers.get('Retry-After', '').strip():
+                    if retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+            except (requests.ConnectionError, requests.Timeout) as err:
+                # a request lost after it was sent may still be applied (or be in progress): only repeat it when that's harmless
+                if not idempotent and not never_sent(err):
+                    raise UncertainRequestError(f'{description} failed ({err}); it may have been applied anyway') from err
+                if attempt == self.retries:
+                    raise
+                reason = str(err)
+
+            logger.warning(f'{description} failed ({reason}), retrying in {delay:.1f}s ({attempt + 1}/{self.retries})')
+            time.sleep(delay)
+
+        raise AssertionError('unreachable')
+
+class ImportState:
+    ''' per-entry import progress, persisted after every step so that a rerun resumes where the last run stopped '''
+
+    def __init__(self, path: Path) -> None:
+        ''' Constructor '''
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict[str, Any]] = {}
+
+        if path.exists():
+            with path.open('r') as fd:
+                self.entries = json.load(fd)
+
+    def get(self, key: str) -> dict[str, Any]:
+        ''' Get a copy of an entry's progress '''
+
+        with self.lock:
+            return dict(self.entries.get(key, {}))
+
+    def update(self, key: str, **progress: Any) -> None:
+        ''' Record progress on an entry and write the state file '''
+
+        with self.lock:
+            self.entries.setdefault(key, {}).update(progress)
+
+            # written next to the state file and swapped in, so a crash mid-write never loses the previous state
+            temp_path = self.path.with_name(f'.{self.path.name}.tmp')
+            with temp_path.open('w') as fd:
+                json.dump(self.entries, fd, indent=4)
+            os.replace(temp_path, self.path)
+
+def upload_album_dir(client: MinoriClient, album_id: str, album_dir: Path, name: str) -> None:
+    ''' Zip an album directory and upload it to an album, streaming the zip as it is built '''
+
+    files = natsorted(seq=album_dir.iterdir(), key=lambda file: file.name)
+
+    def send() -> requests.Response:
+        ''' Upload the zip, building it again from the start '''
+
+        boundary = uuid.uuid4().hex
+        return client.session.post(
+            client.url(f'/api/albums/{album_id}/images/-/bulkcreate'),
+            data=stream_album_zip(files, boundary),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+            timeout=300
+        )
 
-    for entry in config:
-        logger.info(f'Processing entry; path: {json.dumps(entry)}')
+    logger.info(f'[{name}] :: zipping and uploading {len(files)} files from local directory to minori')
+    # an upload lost in flight may still be processed; rather than risk a second copy, the entry fails and the next run
+    # checks for its images before uploading again
+    res = client.retry(send, f'upload {name}', idempotent=False)
+    if res.status_code != 200:
+        raise ValueError('Bulk image upload request failed')
 
-        if ('title' not in entry or entry['title'] == '') or ('author' not in entry or entry['author'] == ''):
-            logger.error('!! Entry missing required data')
-            continue
+def list_image_ids(client: MinoriClient, album_id: str) -> list[str]:
+    ''' Get the ids of an album's images, in album order '''
 
-        album_dir = Path(entry['path'])
-        body = {
-            'title': entry['title'],
-            'author': entry['author']
-        }
-        enabled = entry['enabled'] if 'enabled' in entry else True
+    res = client.request('GET', f'/api/albums/{album_id}/images', params={'fields': 'id'})
+    if res.status_code != 200:
+        raise ValueError('List images request failed')
 
-        try:
-            if not album_dir.exists():
-                raise ValueError('Provided album directory does not exist')
+    return [image['id'] for image in res.json()['images']]
 
-            if not album_dir.is_dir():
-                raise ValueError('Provided album directory is not a directory')
+def import_entry(client: MinoriClient, state: ImportState, entry: dict[str, Any]) -> bool:
+    ''' Import one config entry, skipping whatever an earlier run already did; returns whether it succeeded '''
 
-            logger.info(':: creating album')
-            res = requests.post(f'{minori_api_url}/api/albums/-/create', json=body, timeout=30)
+    album_dir = Path(entry['path'])
+    key = album_dir.as_posix()
+    name = album_dir.name
+
+    if ('title' not in entry or entry['title'] == '') or ('author' not in entry or entry['author'] == ''):
+        logger.error(f'[{name}] !! Entry missing required data')
+        return False
+
+    progress = state.get(key)
+    if progress.get('done'):
+        logger.info(f'[{name}] == Already imported ({progress["album_id"]}), skipping')
+        return True
+
+    body = {
+        'title': entry['title'],
+        'author': entry['author']
+    }
+    enabled = entry['enabled'] if 'enabled' in entry else True
+
+    try:
+        if not album_dir.exists():
+            raise ValueError('Provided album directory does not exist')
+
+        if not album_dir.is_dir():
+            raise ValueError('Provided album directory is not a directory')
+
+        album_id: Optional[str] = progress.get('album_id')
+        if album_id is None and progress.get('create_uncertain'):
+            # albums can't be looked up by title, so there's no telling whether that request created one
+            raise ValueError(
+                'An earlier create album request may have gone through; check for the album and record its id as "album_id" '
+                f'in {state.path}, or remove "create_uncertain" there to create it again'
+            )
+
+        if album_id is None:
+            logger.info(f'[{name}] :: creating album')
+            try:
+                res = client.request('POST', '/api/albums/-/create', json=body)
+            except UncertainRequestError:
+                state.update(key, create_uncertain=True)
+                raise
             if res.status_code != 200:
                 raise ValueError('Create album request failed')
             album_id = res.json()['album']['id']
-            logger.info(f':: album created, album id {album_id}')
-
-            logger.info(':: building zip file from local directory')
-            with tempfile.NamedTemporaryFile('rb+') as fd:
-                archive = zipfile.ZipFile(fd, mode='w') # pylint: disable=consider-using-with
-
-                files = natsorted(seq=album_dir.iterdir(), key=lambda file: file.name)
-                idx = 0
-                for file in files:
-                    archive.write(file, f'{idx:04}{file.suffix}')
-                    idx+=1
-                archive.close()
-                fd.seek(0)
-                logger.info(f':: zip file built with {len(files)} files')
-
-                logger.info(':: uploading zip to minori')
-                res = requests.post(f'{minori_api_url}/api/albums/{album_id}/images/-/bulkcreate', files={'file': fd}, timeout=300)
-                if res.status_code != 200:
-                    raise ValueError('Bulk image upload request failed')
-
-            logger.info(':: requesting album images')
-            res = requests.get(f'{minori_api_url}/api/albums/{album_id}/images', timeout=30)
-            if res.status_code != 200:
-                raise ValueError('List images request failed')
-            cover_image_id = res.json()['images'][0]['id']
+            state.update(key, album_id=album_id, created=True)
+            logger.info(f'[{name}] :: album created, album id {album_id}')
+        else:
+            logger.info(f'[{name}] :: resuming album {album_id}')
+
+        image_ids: list[str] = []
+        if not progress.get('uploaded'):
+            # an earlier run may have been stopped after its upload went through, but before recording it
+            image_ids = list_image_ids(client, album_id)
+            if not image_ids:
+                upload_album_dir(client, album_id, album_dir, name)
+            state.update(key, uploaded=True)
 
-            logger.info(':: setting cover to first image')
-            res = requests.post(f'{minori_api_url}/api/albums/{album_id}/images/{cover_image_id}/make-cover', timeout=30)
+        if not progress.get('cover_set'):
+            logger.info(f'[{name}] :: setting cover to first image')
+            image_ids = image_ids or list_image_ids(client, album_id)
+            if not image_ids:
+                raise ValueError('Album has no images after upload')
+            res = client.request('POST', f'/api/albums/{album_id}/images/{image_ids[0]}/make-cover', idempotent=True)
             if res.status_code != 200:
                 raise ValueError('Set image as cover image request failed')
+            state.update(key, cover_set=True)
+
+        if enabled and not progress.get('enabled'):
+            logger.info(f'[{name}] :: toggling album visibility')
+            res = client.request('POST', f'/api/albums/{album_id}/toggle', params={'state': 'false'}, idempotent=True)
+            if res.status_code != 200:
+                raise ValueError('Toggle album visibility request failed')
+            state.update(key, enabled=True)
+
+        state.update(key, done=True, error=None)
+        logger.info(f'[{name}] == Successfully created new album ({album_id})')
+        return True
+    except Exception as err: # pylint: disable=broad-exception-caught
+        state.update(key, error=str(err))
+        logger.error(f'[{name}] !! Failed to import album')
+        logger.exception(err)
+        return False
+
+def main(
+        import_config: Path,
+        minori_api_url: str,
+        state_file: Optional[Path],
+        workers: int,
+        retries: int,
+        backoff: float,
+    ) -> int:
+    ''' main method '''
+
+    if not import_config.exists():
+        raise ValueError('Provided import config file path does not exist')
 
-            if enabled:
-                logger.info(':: toggling album visibility')
-                res = requests.post(f'{minori_api_url}/api/albums/{album_id}/toggle?state=false', timeout=30)
-                if res.status_code != 200:
-                    raise ValueError('Toggle album visibility request failed')
+    if not import_config.is_file():
+        raise ValueError('Provided import config file path is not a file')
 
-            logger.info(f'== Successfully created new album ({album_id})')
-        except Exception as err: # pylint: disable=broad-exception-caught
-            logger.error('!! Failed to import album')
-            logger.exception(err)
-            continue
+    with import_config.open('r') as fd:
+        config = json.load(fd)
+
+    state = ImportState(state_file or import_config.with_name(f'{import_config.stem}.state.json'))
+    client = MinoriClient(minori_api_url, workers, retries, backoff)
+    logger.info(f'Importing {len(config)} entries with {workers} workers; progress is kept in {state.path}')
+
+    succeeded = 0
+    failed = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(import_entry, client, state, entry) for entry in config]
+        for future in as_completed(futures):
+            if future.result():
+                succeeded += 1
+            else:
+                failed += 1
+    except KeyboardInterrupt:
+        logger.warning('Interrupted; finishing in-flight entries, rerun to resume the rest')
+        executor.shutdown(cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown()
+
+    logger.info(f'== Imported {succeeded} of {len(config)} entries, {failed} failed')
+    return 1 if failed else 0
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Creates and uploads new albums to Minori.')
@@ -131,6 +327,7 @@ if __name__ == '__main__':
         '-c',
         '--import-config',
         type=Path,
+        required=True,
         help='The path to the import config file.'
     )
     parser.add_argument(
@@ -140,5 +337,32 @@ if __name__ == '__main__':
         required=True,
         help='The URL of the Minori API.'
     )
+    parser.add_argument(
+        '-s',
+        '--state-file',
+        type=Path,
+        help='The path to the import state file, used to resume an interrupted import (default: <import config>.state.json).'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=4,
+        help='The number of albums to import concurrently.'
+    )
+    parser.add_argument(
+        '-r',
+        '--retries',
+        type=int,
+        default=5,
+        help='The number of times to retry a request failing with a connection error or a 429/502/503/504 status (creates and uploads only when they cannot have gone through).'
+    )
+    parser.add_argument(
+        '-b',
+        '--backoff',
+        type=float,
+        default=1.0,
+        help='The delay before the first retry in seconds, doubling with every further retry.'
+    )
     args = parser.parse_args()
-    main(**args.__dict__)
+    sys.exit(main(**args.__dict__))
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-''' regen all minori thumbnails '''
+''' regen all minori thumbnails, album by album over the api '''
+# for a whole library, the server-side job is far faster (and resumable): python -m minori.rebuild
 # pylint: disable=invalid-name
 
 import argparse
@@ -41,16 +42,20 @@ def main(
     ) -> None:
     ''' main method '''
 
-    res = requests.get(f'{minori_api_url}/api/albums?include_disabled=true', timeout=30)
-    if res.status_code != 200:
-        raise ValueError('List albums request failed')
+    album_ids: list[str] = []
+    page: int | bool = 1
+    while page:
+        res = requests.get(f'{minori_api_url}/api/albums', params={'include_disabled': 'true', 'page': page}, timeout=30)
+        if res.status_code != 200:
+            raise ValueError('List albums request failed')
 
-    album_ids = [album['id'] for album in res.json()['albums']]
+        album_ids.extend(album['id'] for album in res.json()['albums'])
+        page = res.json()['pagination']['next_page']
 
     logger.info(f'Got {len(album_ids)} album IDs')
     for album_id in album_ids:
         logger.info(f'Regenerating thumbnails for album {album_id}')
-        res = requests.post(f'{minori_api_url}/api/albums/{album_id}/images/-/regen-all-thumbnails', timeout=300)
+        res = requests.post(f'{minori_api_url}/api/albums/{album_id}/regen-thumbnails', timeout=300)
         if res.status_code != 200:
             raise ValueError(f'Regenerate album image thumbnails request failed for album_id "{album_id}"')
 
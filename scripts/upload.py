@@ -5,13 +5,14 @@ import argparse
 import logging
 from pathlib import Path
 import sys
-import tempfile
 from typing import Optional
-import zipfile
+import uuid
 
 from natsort import natsorted
 import requests
 
+from zipstream import stream_album_zip
+
 # set up logging configuration - only to stdout/stderr for now
 class ErrorLogFilter(logging.Filter):
     ''' prevents error logs from making it into stdout '''
@@ -86,23 +87,17 @@ def main( # pylint: disable=too-many-branches
             if res.status_code != 200:
                 raise ValueError('Bulk image upload request failed')
     if album_dir:
-        logger.info(':: building zip file from local directory')
-        with tempfile.NamedTemporaryFile('rb+') as fd:
-            archive = zipfile.ZipFile(fd, mode='w')
-
-            files = natsorted(album_dir.iterdir(), key=lambda file: file.name)
-            idx = 0
-            for file in files:
-                archive.write(file, f'{idx:04}{file.suffix}')
-                idx+=1
-            archive.close()
-            fd.seek(0)
-            logger.info(f':: zip file built with {len(files)} files')
-
-            logger.info(':: uploading zip to minori')
-            res = requests.post(f'{minori_api_url}/api/albums/{album_id}/images/-/bulkcreate', files={'file': fd}, timeout=300)
-            if res.status_code != 200:
-                raise ValueError('Bulk image upload request failed')
+        files = natsorted(album_dir.iterdir(), key=lambda file: file.name)
+        logger.info(f':: zipping and uploading {len(files)} files from local directory to minori')
+        boundary = uuid.uuid4().hex
+        res = requests.post(
+            f'{minori_api_url}/api/albums/{album_id}/images/-/bulkcreate',
+            data=stream_album_zip(files, boundary),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+            timeout=300
+        )
+        if res.status_code != 200:
+            raise ValueError('Bulk image upload request failed')
 
     logger.info(':: requesting album images')
     res = requests.get(f'{minori_api_url}/api/albums/{album_id}/images', timeout=30)
@@ -0,0 +1,62 @@
+''' streamed album zip uploads, shared by the upload scripts '''
+
+from pathlib import Path
+from typing import Iterator
+import zipfile
+
+# files are read and sent in chunks of this size, so that zipping and uploading overlap
+CHUNK_SIZE = 1024 * 1024
+
+class ZipSink:
+    ''' unseekable write target for zipfile, handing out what has been written since it was last drained '''
+
+    def __init__(self) -> None:
+        ''' Constructor '''
+
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        ''' Buffer written data '''
+
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        ''' Get the number of bytes written so far '''
+
+        return self.position
+
+    def flush(self) -> None:
+        ''' Nothing to flush, data is handed out through drain '''
+
+    def drain(self) -> bytes:
+        ''' Take the data written since the last drain '''
+
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+def stream_album_zip(files: list[Path], boundary: str) -> Iterator[bytes]:
+    ''' Generate a multipart form body holding a zip of the given files, zipping them while the body is sent '''
+
+    yield (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="file"; filename="album.zip"\r\n'
+        'Content-Type: application/zip\r\n\r\n'
+    ).encode('utf-8')
+
+    # zipfile writes data descriptors instead of seeking back to fill in sizes when its target can't seek
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, mode='w') as archive:
+        for idx, file in enumerate(files):
+            with file.open('rb') as src, archive.open(zipfile.ZipInfo.from_file(file, f'{idx:04}{file.suffix}'), 'w') as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    # an empty chunk would end the chunked request body
+                    if data := sink.drain():
+                        yield data
+    yield sink.drain()
+
+    yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
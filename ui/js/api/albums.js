@@ -4,7 +4,7 @@ import { Album, FullAlbum, Pagination } from '../models.js';
 
 class MinoriAlbumsAPI extends MinoriBaseAPI {
   async get_page(page = 1, include_disabled = undefined) {
-    const resp = await fetch(this.build_url('/albums', { page, include_disabled }))
+    const resp = await this.fetch(this.build_url('/albums', { page, include_disabled }))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get albums');
@@ -18,7 +18,7 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
   }
 
   async get_all(include_disabled = undefined) {
-    const resp = await fetch(this.build_url('/albums/all', { include_disabled }))
+    const resp = await this.fetch(this.build_url('/albums/all', { include_disabled }))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get albums');
@@ -35,7 +35,7 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
       url: url ?? undefined
     }
 
-    const resp = await fetch(this.build_url('/albums/-/create'), {
+    const resp = await this.fetch(this.build_url('/albums/-/create'), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(args)
@@ -50,7 +50,7 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
 
   async get_one(id) {
     id = encodeURIComponent(id);
-    const resp = await fetch(this.build_url(`/albums/${id}`))
+    const resp = await this.fetch(this.build_url(`/albums/${id}`))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get album');
@@ -59,10 +59,21 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
     return new FullAlbum((await resp.json()).album);
   }
 
+  async get_many(ids) {
+    ids = ids.map(id => encodeURIComponent(id)).join(',');
+    const resp = await this.fetch(this.build_url('/albums/-/batch', { ids }))
+
+    if(!resp.ok) {
+      throw await build_error(resp, 'Failed to get albums');
+    }
+
+    return (await resp.json()).albums.map(i => new FullAlbum(i));
+  }
+
   async update(id, title, author, description, url) {
     id = encodeURIComponent(id);
 
-    const resp = await fetch(this.build_url(`/albums/${id}`), {
+    const resp = await this.fetch(this.build_url(`/albums/${id}`), {
       method: 'PATCH',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ title, author, description, url })
@@ -78,7 +89,7 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
   async regen_thumbnails(id) {
     id = encodeURIComponent(id);
 
-    const resp = await fetch(this.build_url(`/albums/${id}/regen-thumbnails`), {
+    const resp = await this.fetch(this.build_url(`/albums/${id}/regen-thumbnails`), {
       method: 'POST'
     });
 
@@ -89,7 +100,7 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
 
   async toggle(id, state) {
     id = encodeURIComponent(id);
-    const resp = await fetch(this.build_url(`/albums/${id}/toggle`, { state }), {
+    const resp = await this.fetch(this.build_url(`/albums/${id}/toggle`, { state }), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' }
     });
@@ -103,7 +114,7 @@ class MinoriAlbumsAPI extends MinoriBaseAPI {
 
   async delete(id) {
     id = encodeURIComponent(id);
-    const resp = await fetch(this.build_url(`/albums/${id}`), {
+    const resp = await this.fetch(this.build_url(`/albums/${id}`), {
       method: 'DELETE'
     });
 
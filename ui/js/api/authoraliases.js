@@ -4,7 +4,7 @@ import { AuthorAlias, FullAuthorAlias, Pagination } from '../models.js';
 
 class MinoriAuthorAliasesAPI extends MinoriBaseAPI {
   async get_page(page = 1) {
-    const resp = await fetch(this.build_url('/authoraliases', { page }))
+    const resp = await this.fetch(this.build_url('/authoraliases', { page }))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get author aliases');
@@ -19,7 +19,7 @@ class MinoriAuthorAliasesAPI extends MinoriBaseAPI {
 
   async get_one(authoralias_id) {
     authoralias_id = encodeURIComponent(authoralias_id);
-    const resp = await fetch(this.build_url(`/authoraliases/${authoralias_id}`))
+    const resp = await this.fetch(this.build_url(`/authoraliases/${authoralias_id}`))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get author alias');
@@ -30,7 +30,7 @@ class MinoriAuthorAliasesAPI extends MinoriBaseAPI {
 
   async update_name(authoralias_id, name) {
     authoralias_id = encodeURIComponent(authoralias_id);
-    const resp = await fetch(this.build_url(`/authoraliases/${authoralias_id}`), {
+    const resp = await this.fetch(this.build_url(`/authoraliases/${authoralias_id}`), {
       method: 'PATCH',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ name })
@@ -45,7 +45,7 @@ class MinoriAuthorAliasesAPI extends MinoriBaseAPI {
 
   async delete(authoralias_id) {
     authoralias_id = encodeURIComponent(authoralias_id);
-    const resp = await fetch(this.build_url(`/authoraliases/${authoralias_id}`), {
+    const resp = await this.fetch(this.build_url(`/authoraliases/${authoralias_id}`), {
       method: 'DELETE'
     })
 
@@ -57,7 +57,7 @@ class MinoriAuthorAliasesAPI extends MinoriBaseAPI {
   async reassign_author_alias(authoralias_id, new_parent_author_id) {
     authoralias_id = encodeURIComponent(authoralias_id);
     new_parent_author_id = encodeURIComponent(new_parent_author_id);
-    const resp = await fetch(this.build_url(`/authoraliases/${authoralias_id}/reassign/${new_parent_author_id}`), {
+    const resp = await this.fetch(this.build_url(`/authoraliases/${authoralias_id}/reassign/${new_parent_author_id}`), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' }
     });
@@ -4,7 +4,7 @@ import { FullAlbum, Author, FullAuthor, AuthorAlias, Pagination } from '../model
 
 class MinoriAuthorsAPI extends MinoriBaseAPI {
   async get_page(page = 1) {
-    const resp = await fetch(this.build_url('/authors', { page }))
+    const resp = await this.fetch(this.build_url('/authors', { page }))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get authors');
@@ -19,7 +19,7 @@ class MinoriAuthorsAPI extends MinoriBaseAPI {
 
   async get_one(author_id) {
     author_id = encodeURIComponent(author_id);
-    const resp = await fetch(this.build_url(`/authors/${author_id}`))
+    const resp = await this.fetch(this.build_url(`/authors/${author_id}`))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get author');
@@ -30,7 +30,7 @@ class MinoriAuthorsAPI extends MinoriBaseAPI {
 
   async update_name(author_id, name, update_corresponding_authoralias = true) {
     author_id = encodeURIComponent(author_id);
-    const resp = await fetch(this.build_url(`/authors/${author_id}`, { update_corresponding_authoralias }), {
+    const resp = await this.fetch(this.build_url(`/authors/${author_id}`, { update_corresponding_authoralias }), {
       method: 'PATCH',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ name })
@@ -45,7 +45,7 @@ class MinoriAuthorsAPI extends MinoriBaseAPI {
 
   async delete(author_id) {
     author_id = encodeURIComponent(author_id);
-    const resp = await fetch(this.build_url(`/authors/${author_id}`), {
+    const resp = await this.fetch(this.build_url(`/authors/${author_id}`), {
       method: 'DELETE'
     })
 
@@ -56,7 +56,7 @@ class MinoriAuthorsAPI extends MinoriBaseAPI {
 
   async get_aliases(author_id) {
     author_id = encodeURIComponent(author_id);
-    const resp = await fetch(this.build_url(`/authors/${author_id}/aliases`))
+    const resp = await this.fetch(this.build_url(`/authors/${author_id}/aliases`))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get author aliases');
@@ -67,7 +67,7 @@ class MinoriAuthorsAPI extends MinoriBaseAPI {
 
   async get_albums(author_id, page = 1, include_disabled = undefined) {
     author_id = encodeURIComponent(author_id);
-    const resp = await fetch(this.build_url(`/authors/${author_id}/albums`, { page, include_disabled }))
+    const resp = await this.fetch(this.build_url(`/authors/${author_id}/albums`, { page, include_disabled }))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get author albums');
@@ -84,7 +84,7 @@ class MinoriAuthorsAPI extends MinoriBaseAPI {
     author_id = encodeURIComponent(author_id);
     consumed_author_id = encodeURIComponent(consumed_author_id);
 
-    const resp = await fetch(this.build_url(`/authors/${author_id}/merge/${consumed_author_id}`), {
+    const resp = await this.fetch(this.build_url(`/authors/${author_id}/merge/${consumed_author_id}`), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ preserve_consumed_author })
@@ -1,3 +1,5 @@
+const PRIMARY_UNTIL_KEY = 'minori_primary_until';
+
 class MinoriAPIConfig {
   constructor() {
     if (MinoriAPIConfig._instance) {
@@ -6,11 +8,32 @@ class MinoriAPIConfig {
     MinoriAPIConfig._instance = this;
 
     this.api_url = '';
+    // kept in session storage, so that it survives navigating to the next page of a create/edit flow
+    const primary_until = parseFloat(this.storage()?.getItem(PRIMARY_UNTIL_KEY));
+    this.primary_until = Number.isNaN(primary_until) ? null : primary_until;
   }
 
   set_api_url(api_url) {
     this.api_url = api_url;
   }
+
+  set_primary_until(primary_until) {
+    this.primary_until = primary_until;
+    if(primary_until === null) {
+      this.storage()?.removeItem(PRIMARY_UNTIL_KEY);
+    } else {
+      this.storage()?.setItem(PRIMARY_UNTIL_KEY, primary_until);
+    }
+  }
+
+  storage() {
+    // unavailable (throwing on access) when storage is disabled; stickiness then only lasts for this page
+    try {
+      return window.sessionStorage;
+    } catch {
+      return null;
+    }
+  }
 }
 const api_config = new MinoriAPIConfig();
 
@@ -29,6 +52,26 @@ class MinoriBaseAPI {
     return `${api_config.api_url}${base_url}${url.replace(/^\/+/, '')}${suffix}`;
   }
 
+  async fetch(url, options = {}) {
+    // after a write, the api asks us to keep reading from the primary database for a bit (until replicas catch up)
+    if(api_config.primary_until !== null) {
+      if(api_config.primary_until > Date.now() / 1000) {
+        options.headers = { ...options.headers, 'X-Minori-Primary-Until': api_config.primary_until };
+      } else {
+        api_config.set_primary_until(null);
+      }
+    }
+
+    const resp = await fetch(url, options);
+
+    const primary_until = resp.headers.get('X-Minori-Primary-Until');
+    if(primary_until !== null) {
+      api_config.set_primary_until(parseFloat(primary_until));
+    }
+
+    return resp;
+  }
+
   build_qs(args) {
     return Object.entries(args).map(([k, v]) => `${k}=${v}`).join('&');
   }
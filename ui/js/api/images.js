@@ -1,11 +1,11 @@
 import { MinoriBaseAPI } from './base.js'
 import { build_error } from '../common.js';
-import { Image } from '../models.js';
+import { Album, Image } from '../models.js';
 
 class MinoriImagesAPI extends MinoriBaseAPI {
   async get_all(id) {
     id = encodeURIComponent(id);
-    const resp = await fetch(this.build_url(`/albums/${id}/images`))
+    const resp = await this.fetch(this.build_url(`/albums/${id}/images`))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get album images');
@@ -17,7 +17,7 @@ class MinoriImagesAPI extends MinoriBaseAPI {
   async create(id) {
     id = encodeURIComponent(id);
 
-    const resp = await fetch(this.build_url(`/albums/${id}/images/-/create`), {
+    const resp = await this.fetch(this.build_url(`/albums/${id}/images/-/create`), {
       method: 'POST'
     });
 
@@ -35,7 +35,7 @@ class MinoriImagesAPI extends MinoriBaseAPI {
     const form = new FormData();
     form.append('file', file_elem.files[0]);
 
-    const resp = await fetch(this.build_url(`/albums/${album_id}/images/${image_id}/upload`), {
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/${image_id}/upload`), {
       method: 'PUT',
       body: form
     });
@@ -53,7 +53,7 @@ class MinoriImagesAPI extends MinoriBaseAPI {
     const form = new FormData();
     form.append('file', file_elem.files[0]);
 
-    const resp = await fetch(this.build_url(`/albums/${id}/images/-/bulkcreate`), {
+    const resp = await this.fetch(this.build_url(`/albums/${id}/images/-/bulkcreate`), {
       method: 'POST',
       body: form
     });
@@ -68,7 +68,7 @@ class MinoriImagesAPI extends MinoriBaseAPI {
   async get_one(album_id, image_id) {
     album_id = encodeURIComponent(album_id);
     image_id = encodeURIComponent(image_id);
-    const resp = await fetch(this.build_url(`/albums/${album_id}/images/${image_id}`))
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/${image_id}`))
 
     if(!resp.ok) {
       throw await build_error(resp, 'Failed to get album image');
@@ -77,11 +77,43 @@ class MinoriImagesAPI extends MinoriBaseAPI {
     return new Image((await resp.json()).image);
   }
 
+  async get_many(ids) {
+    ids = ids.map(id => encodeURIComponent(id)).join(',');
+    const resp = await this.fetch(this.build_url('/images/-/batch', { ids }))
+
+    if(!resp.ok) {
+      throw await build_error(resp, 'Failed to get images');
+    }
+
+    return (await resp.json()).images.map(i => new Image(i));
+  }
+
+  async get_reader(album_id, image_id = false, window = 2) {
+    album_id = encodeURIComponent(album_id);
+    const qs = { window };
+    if(image_id !== false) {
+      qs.image_id = encodeURIComponent(image_id);
+    }
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/reader`, qs))
+
+    if(!resp.ok) {
+      throw await build_error(resp, 'Failed to get album reader page');
+    }
+
+    const json = await resp.json();
+    return {
+      album: new Album(json.album),
+      image: new Image(json.image),
+      position: json.position,
+      neighbors: json.neighbors.map(i => new Image(i))
+    };
+  }
+
   async update_order(album_id, image_id, order) {
     album_id = encodeURIComponent(album_id);
     image_id = encodeURIComponent(image_id);
 
-    const resp = await fetch(this.build_url(`/albums/${album_id}/images/${image_id}/order`), {
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/${image_id}/order`), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ order })
@@ -94,11 +126,44 @@ class MinoriImagesAPI extends MinoriBaseAPI {
     return new Image((await resp.json()).image);
   }
 
+  async reorder(album_id, image_ids) {
+    album_id = encodeURIComponent(album_id);
+
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/-/reorder`), {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ image_ids })
+    });
+
+    if(!resp.ok) {
+      throw await build_error(resp, 'Failed to reorder album images');
+    }
+
+    return (await resp.json()).images.map(i => new Image(i));
+  }
+
+  async move(album_id, image_id, after_id = null, before_id = null) {
+    album_id = encodeURIComponent(album_id);
+    image_id = encodeURIComponent(image_id);
+
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/${image_id}/move`), {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ after_id, before_id })
+    });
+
+    if(!resp.ok) {
+      throw await build_error(resp, 'Failed to move album image');
+    }
+
+    return new Image((await resp.json()).image);
+  }
+
   async mark_as_cover(album_id, image_id) {
     album_id = encodeURIComponent(album_id);
     image_id = encodeURIComponent(image_id);
 
-    const resp = await fetch(this.build_url(`/albums/${album_id}/images/${image_id}/make-cover`), {
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/${image_id}/make-cover`), {
       method: 'POST'
     });
 
@@ -111,7 +176,7 @@ class MinoriImagesAPI extends MinoriBaseAPI {
     album_id = encodeURIComponent(album_id);
     image_id = encodeURIComponent(image_id);
 
-    const resp = await fetch(this.build_url(`/albums/${album_id}/images/${image_id}`), {
+    const resp = await this.fetch(this.build_url(`/albums/${album_id}/images/${image_id}`), {
       method: 'DELETE'
     });
 
@@ -377,70 +377,30 @@ class MinoriEditAlbumUI extends MinoriUI {
   }
 
   async image_move_up_handler(image_id) {
-    // check to see if we need to bake in the order first
-    const needs_baked = this.images.some((image) => image.album_order_key === 0);
-    if (needs_baked) {
-      await this.bake_in_image_order();
-      this.images = await this.api.images.get_all(this.album_id);
-    }
-
-    let prior_image = null;
-    let image = null;
-    for (const i in this.images) {
-      image = this.images[i];
-
-      if (image_id === image.id) {
-        break;
-      }
-      prior_image = image;
-    }
-
-    if (prior_image === null) {
+    const index = this.images.findIndex((image) => image.id === image_id);
+    if (index < 1) {
       throw new Error('Image cannot be moved up any further.')
     }
 
-    const old_album_order_key = image.album_order_key;
-    const new_album_order_key = prior_image.album_order_key;
-
-    await this.api.images.update_order(this.album_id, image.id, new_album_order_key);
-    await this.api.images.update_order(this.album_id, prior_image.id, old_album_order_key);
-    this.images = await this.api.images.get_all(this.album_id);
+    const after_id = index >= 2 ? this.images[index - 2].id : null;
+    await this.move_image(index, index - 1, after_id, this.images[index - 1].id);
   }
 
   async image_move_down_handler(image_id) {
-    // check to see if we need to bake in the order first
-    const needs_baked = this.images.some((image) => image.album_order_key === 0);
-    if (needs_baked) {
-      await this.bake_in_image_order();
-      this.images = await this.api.images.get_all(this.album_id);
-    }
-
-    let found_image = null;
-    let next_image = null;
-    for (const i in this.images) {
-      let image = this.images[i];
-
-      if (found_image !== null) {
-        next_image = image;
-        break;
-      }
-
-      if (image_id === image.id) {
-        found_image = image;
-      }
-    }
-
-    if (next_image === null) {
+    const index = this.images.findIndex((image) => image.id === image_id);
+    if (index === -1 || index >= this.images.length - 1) {
       throw new Error('Image cannot be moved down any further.')
     }
-    const image = found_image;
 
-    const old_album_order_key = image.album_order_key;
-    const new_album_order_key = next_image.album_order_key;
+    const before_id = index + 2 < this.images.length ? this.images[index + 2].id : null;
+    await this.move_image(index, index + 1, this.images[index + 1].id, before_id);
+  }
 
-    await this.api.images.update_order(this.album_id, image.id, new_album_order_key);
-    await this.api.images.update_order(this.album_id, next_image.id, old_album_order_key);
-    this.images = await this.api.images.get_all(this.album_id);
+  async move_image(from_index, to_index, after_id, before_id) {
+    // only the moved image's order key changes server-side, so the local list can just be spliced to match
+    const image = await this.api.images.move(this.album_id, this.images[from_index].id, after_id, before_id);
+    this.images.splice(from_index, 1);
+    this.images.splice(to_index, 0, image);
   }
 
   async image_delete_handler(image_id) {
@@ -448,18 +408,6 @@ class MinoriEditAlbumUI extends MinoriUI {
     this.images = await this.api.images.get_all(this.album_id);
   }
 
-  async bake_in_image_order() {
-    try {
-      for (const i in this.images) {
-        const image = this.images[i];
-        await this.api.images.update_order(this.album_id, image.id, Number(i)+1);
-      }
-    } catch(err) {
-      this.ui_toast('danger', format_error_msg(err));
-      throw err;
-    }
-  }
-
   toggle_display_dropzone(visible = true) {
     if(visible === true) {
       this.dropzone.classList.remove('collapse');
@@ -17,7 +17,7 @@ class MinoriImageUI extends MinoriUI {
     this.current_image_id = this.extract_id_from_hash(1);
     this.album = null;
     this.images = {};
-    this.images_list = [];
+    this.position = null;
     this.pagination_data = {};
 
     this.load_config()
@@ -39,23 +39,18 @@ class MinoriImageUI extends MinoriUI {
   }
 
   async load() {
-    this.album = await this.api.albums.get_one(this.current_album_id);
-    const images = await this.api.images.get_all(this.current_album_id);
+    const reader = await this.api.images.get_reader(this.current_album_id, this.current_image_id);
+    this.album = reader.album;
+    this.position = reader.position;
     this.images = {};
-    this.images_list = [];
-    images.forEach((image) => {
+    [reader.image, ...reader.neighbors].forEach((image) => {
       this.images[image.id] = image;
-      this.images_list.push(image.id);
     });
 
     if(this.current_image_id === false) {
-      this.current_image_id = this.images_list[0];
+      this.current_image_id = reader.image.id;
       window.location.hash = `${this.current_album_id}:${this.current_image_id}`
     }
-
-    if(!this.images_list.includes(this.current_image_id)) {
-      throw { status: 404 }
-    }
   }
 
   render() {
@@ -167,7 +162,21 @@ class MinoriImageUI extends MinoriUI {
     this.toggle_show_content(false);
     this.toggle_loading_spinner(true);
     this.current_image_id = this.extract_id_from_hash(1);
-    this.render();
+    this.load()
+      .then(this.render.bind(this))
+      .catch(err => {
+        if (err.status === 404) {
+          this.toggle_display_404(true);
+          this.toggle_show_content(false);
+          this.toggle_loading_spinner(false);
+          this.update_page_title();
+
+          return;
+        }
+
+        this.ui_toast('danger', format_error_msg(err));
+        throw err;
+      });
   }
 
   preload_adjacent_images() {
@@ -184,22 +193,20 @@ class MinoriImageUI extends MinoriUI {
 
   get_image_pagination(image_id) {
     // safeguard, this shouldn't get this far
-    if(!this.images_list.includes(image_id)) {
+    if(!(image_id in this.images)) {
       return false;
     }
 
-    const image_index = this.images_list.indexOf(image_id);
-
     return {
       'album_id': this.current_album_id,
       'full_image_uri': this.images[image_id].filename,
-      'current_page': image_index + 1,
-      'total_pages': this.images_list.length,
-      'first_id': image_index !== 0 ? this.images_list[0] : false,
-      'previous_id': image_index !== 0 ? this.images_list[image_index - 1] : false,
+      'current_page': this.position.position,
+      'total_pages': this.position.total_images,
+      'first_id': this.position.first_id,
+      'previous_id': this.position.previous_id,
       'current_id': image_id,
-      'next_id': (image_index + 1) !== this.images_list.length ? this.images_list[image_index + 1] : false,
-      'last_id': (image_index + 1) !== this.images_list.length ? this.images_list[this.images_list.length - 1] : false
+      'next_id': this.position.next_id,
+      'last_id': this.position.last_id
     };
   }
 }